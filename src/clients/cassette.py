@@ -0,0 +1,202 @@
+import gzip
+import re
+from base64 import b64decode, b64encode
+from collections import defaultdict
+from hashlib import sha256
+from json import JSONDecodeError, dumps, loads
+from pathlib import Path
+from threading import Lock
+from time import perf_counter, sleep
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+import requests
+from loguru import logger
+
+from configs.cassette import CassetteConfig
+
+SECRET_KEYS = re.compile(r"token|secret|password|private_key|api_key|assertion|credential", re.IGNORECASE)
+DROPPED_HEADERS = {
+    "authorization",
+    "set-cookie",
+    "cookie",
+    "content-encoding",
+    "content-length",
+    "transfer-encoding",
+}
+REDACTED = "REDACTED"
+
+
+def redact_url(url: str) -> str:
+    parts = urlsplit(url)
+    query = [
+        (key, REDACTED if SECRET_KEYS.search(key) or key == "key" else value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+    ]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def redact_json(value):
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if SECRET_KEYS.search(key) and isinstance(value[key], str) else redact_json(value[key])
+            for key in value
+        }
+    if isinstance(value, list):
+        return [redact_json(item) for item in value]
+    return value
+
+
+def redact_body(body: bytes) -> bytes:
+    try:
+        return dumps(redact_json(loads(body)), ensure_ascii=False).encode("utf-8")
+    except (JSONDecodeError, UnicodeDecodeError):
+        return body
+
+
+def body_hash(body: bytes | str | None) -> str:
+    if body is None:
+        return ""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return sha256(body).hexdigest()[:16]
+
+
+class Cassette:
+    """
+    Records every HTTP request of the GitHub, Sheets and OpenAI clients to a gzipped JSONL cassette,
+    or replays a run from it without network access.
+
+    PyGithub and gspread go through `requests`, OpenAI through `httpx`, so both `send` methods are patched.
+    Request headers are never stored, secrets in URLs and JSON bodies are redacted.
+    Replayed responses are matched by method and URL in recorded order,
+    preferring an entry with the same request body.
+    """
+
+    def __init__(self, mode: str, path: Path, latency_scale: float = 1.0):
+        self.mode = mode
+        self.path = path
+        self.latency_scale = latency_scale
+        self.__lock = Lock()
+        self.__entries: list[dict] = []
+        self.__queues: dict[tuple[str, str], list[dict]] = defaultdict(list)
+        self.__originals: dict = {}
+
+    @classmethod
+    def from_config(cls) -> "Cassette":
+        config = CassetteConfig()
+        return cls(mode=config.MODE, path=config.PATH, latency_scale=config.LATENCY_SCALE)
+
+    def __enter__(self) -> "Cassette":
+        if self.mode == "off":
+            return self
+
+        if self.mode == "replay":
+            with gzip.open(self.path, "rt", encoding="utf-8") as cassette_file:
+                for line in cassette_file:
+                    entry = loads(line)
+                    self.__queues[(entry["method"], entry["url"])].append(entry)
+            logger.info(f"Replaying {sum(map(len, self.__queues.values()))} requests from {self.path}")
+
+        self.__originals = {"requests": requests.Session.send, "httpx": httpx.Client.send}
+        cassette = self
+
+        def requests_send(session, request, **kwargs):
+            return cassette.handle_requests(session, request, **kwargs)
+
+        def httpx_send(client, request, **kwargs):
+            return cassette.handle_httpx(client, request, **kwargs)
+
+        setattr(requests.Session, "send", requests_send)
+        setattr(httpx.Client, "send", httpx_send)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self.mode == "off":
+            return
+
+        setattr(requests.Session, "send", self.__originals["requests"])
+        setattr(httpx.Client, "send", self.__originals["httpx"])
+        if self.mode == "record":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(self.path, "wt", encoding="utf-8") as cassette_file:
+                for entry in self.__entries:
+                    cassette_file.write(dumps(entry, ensure_ascii=False) + "\n")
+            logger.info(f"Recorded {len(self.__entries)} requests to {self.path}")
+        elif any(self.__queues.values()):
+            logger.warning(f"{sum(map(len, self.__queues.values()))} recorded requests were not replayed")
+
+    def __record(self, method: str, url: str, body, status: int, headers, content: bytes, latency: float) -> None:
+        entry = {
+            "method": method,
+            "url": redact_url(url),
+            "body": body_hash(body),
+            "status": status,
+            "headers": {key: value for key, value in headers.items() if key.lower() not in DROPPED_HEADERS},
+            "content": b64encode(redact_body(content)).decode("ascii"),
+            "latency": round(latency, 4),
+        }
+        with self.__lock:
+            self.__entries.append(entry)
+
+    def __replay(self, method: str, url: str, body) -> dict:
+        key = (method, redact_url(url))
+        with self.__lock:
+            queue = self.__queues.get(key)
+            if not queue:
+                raise RuntimeError(f"No recorded response for {method} {key[1]}")
+            digest = body_hash(body)
+            index = next((i for i, entry in enumerate(queue) if entry["body"] == digest), 0)
+            entry = queue.pop(index)
+
+        if self.latency_scale:
+            sleep(entry["latency"] * self.latency_scale)
+        return entry
+
+    def handle_requests(
+            self,
+            session: requests.Session,
+            request: requests.PreparedRequest,
+            **kwargs
+    ) -> requests.Response:
+        # A prepared request always has both, a missing one can't be matched to a recording
+        if request.method is None or request.url is None:
+            raise ValueError("Can't record or replay a request without a method or URL")
+        method, url = request.method, request.url
+        if self.mode == "record":
+            started = perf_counter()
+            response = self.__originals["requests"](session, request, **kwargs)
+            latency = perf_counter() - started
+            self.__record(method, url, request.body, response.status_code, response.headers, response.content, latency)
+            return response
+
+        entry = self.__replay(method, url, request.body)
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.headers = requests.structures.CaseInsensitiveDict(entry["headers"])
+        response._content = b64decode(entry["content"])
+        response.url = url
+        response.request = request
+        response.encoding = "utf-8"
+        return response
+
+    def handle_httpx(self, client: httpx.Client, request: httpx.Request, **kwargs) -> httpx.Response:
+        body = request.read()
+        if self.mode == "record":
+            started = perf_counter()
+            response = self.__originals["httpx"](client, request, **kwargs)
+            content = response.read()
+            latency = perf_counter() - started
+            self.__record(
+                request.method, str(request.url), body,
+                response.status_code, response.headers, content, latency
+            )
+            return response
+
+        entry = self.__replay(request.method, str(request.url), body)
+        return httpx.Response(
+            status_code=entry["status"],
+            headers=entry["headers"],
+            content=b64decode(entry["content"]),
+            request=request,
+        )
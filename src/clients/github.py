@@ -1,4 +1,7 @@
+from datetime import datetime, timedelta, timezone
+
 from github import GithubIntegration, Auth
+from github.InstallationAuthorization import InstallationAuthorization
 from github.Repository import Repository
 
 from configs.github import GitHubConfig
@@ -17,10 +20,15 @@ class GithubClient:
         self.__app_client = GithubIntegration(auth=self.__auth)
 
         self.__installation_id = self.get_installation_id()
+        self.__token: InstallationAuthorization | None = None
         self.__client = self.__app_client.get_github_for_installation(
             installation_id=self.__installation_id
         )
 
+    @property
+    def config(self) -> GitHubConfig:
+        return self.__config
+
     def get_installation_id(self) -> int:
         installations = self.__app_client.get_installations()
         for installation in installations:
@@ -36,6 +44,15 @@ class GithubClient:
 
         raise RuntimeError("Installation not found")
 
+    def get_installation_token(self) -> str:
+        """
+        Get an installation access token for git over HTTPS, reused until it is about to expire.
+        """
+        now = datetime.now(timezone.utc)
+        if self.__token is None or self.__token.expires_at - now < timedelta(minutes=5):
+            self.__token = self.__app_client.get_access_token(self.__installation_id)
+        return self.__token.token
+
     def get_repo(self, owner: str, repo_name: str) -> Repository:
         text = f"{owner}/{repo_name}"
         return self.__client.get_repo(text)
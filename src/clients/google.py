@@ -1,12 +1,11 @@
-from time import sleep
 
 import gspread
 import pandas as pd
 from gspread import Worksheet
+from gspread.utils import absolute_range_name, rowcol_to_a1
 from loguru import logger
 
 from configs.google import GoogleSheetsConfig
-from utils.enums.sheets import SheetsNamingEnum
 
 
 class GoogleSheetsClient:
@@ -19,6 +18,7 @@ class GoogleSheetsClient:
         self.__spreadsheet = self.__client.open_by_url(
             self.__config.SPREADSHEET_URL
         )
+        self.__headers: dict[str, list[str]] = {}
 
     @property
     def config(self):
@@ -50,40 +50,124 @@ class GoogleSheetsClient:
                 raise
             return pd.DataFrame()
 
-    def duplicate_sheet(self, source_sheet_id: int, new_sheet_name: str) -> None:
+    def get_headers(self, sheet_names: list[str]) -> dict[str, list[str]]:
         """
-        Duplicate a sheet within the spreadsheet.
+        Get header rows of several sheets, headers that are not cached yet are read in one request.
         """
-        try:
-            source_sheet = self.__spreadsheet.get_worksheet_by_id(source_sheet_id)
-            if not source_sheet:
-                raise ValueError(f"Source sheet with ID {source_sheet_id} not found")
+        missing = [name for name in dict.fromkeys(sheet_names) if name not in self.__headers]
+        if missing:
+            response = self.__spreadsheet.values_batch_get(
+                [absolute_range_name(name, "1:1") for name in missing]
+            )
+            for name, value_range in zip(missing, response.get("valueRanges", [])):
+                values = value_range.get("values") or [[]]
+                self.__headers[name] = [str(value).strip() for value in values[0]]
+        return {name: self.__headers[name] for name in sheet_names}
 
-            source_sheet.duplicate(new_sheet_name=new_sheet_name)
-            logger.info(f"Sheet duplicated successfully: {new_sheet_name}")
-        except Exception as e:
-            logger.error(f"An error occurred while duplicating sheet: {e}")
-            raise
+    def invalidate_header(self, sheet_name: str) -> None:
+        self.__headers.pop(sheet_name, None)
 
-    def copy_template_to_new_sheet(self, new_sheet_name: str) -> Worksheet:
+    def get_columns(self, sheet_name: str, columns: dict[str, str]) -> list[dict[str, str]]:
         """
-        Copy a template sheet to a new sheet with the specified name.
-        If template doesn't exist, create a basic sheet structure.
+        Read only the given columns of a sheet in one request.
+        Header positions are resolved once and cached.
+        :param columns: Field names of the returned rows mapped to header names
+        :return: Rows from the second sheet row on, as column values by field name,
+            missing columns and cells are empty strings
         """
-        try:
-            template_sheet = self.get_sheet_data(SheetsNamingEnum.TEMPLATE, convert_to_pd=False)
-            self.duplicate_sheet(source_sheet_id=template_sheet.id, new_sheet_name=new_sheet_name)
-            sleep(2)
-            return self.__spreadsheet.worksheet(new_sheet_name)
-        except Exception as e:
-            logger.error(f"An error occurred while copying template sheet: {e}")
-            logger.info(f"Creating new sheet {new_sheet_name} without template")
+        header = self.get_headers([sheet_name])[sheet_name]
+        ranges = {}
+        for field, name in columns.items():
+            if name not in header:
+                logger.warning(f"Column {name} not found in sheet {sheet_name}")
+                continue
+            letter = rowcol_to_a1(1, header.index(name) + 1)[:-1]
+            ranges[field] = absolute_range_name(sheet_name, f"{letter}2:{letter}")
+        if not ranges:
+            return []
+
+        response = self.__spreadsheet.values_batch_get(
+            list(ranges.values()),
+            params={"majorDimension": "COLUMNS"}
+        )
+        values = {
+            field: (value_range.get("values") or [[]])[0]
+            for field, value_range in zip(ranges, response.get("valueRanges", []))
+        }
+        row_count = max(map(len, values.values()), default=0)
+        return [
+            {
+                field: str(values[field][index]) if field in values and index < len(values[field]) else ""
+                for field in columns
+            }
+            for index in range(row_count)
+        ]
+
+    def provision_sheets(self, sheet_names: list[str], template_name: str, header: list[str]) -> list[str]:
+        """
+        Create missing sheets as copies of the template with one batch update.
+        Idempotent: existing sheets are kept. If another run created one of the sheets in the meantime,
+        the whole batch is rejected and retried with the sheets that are still missing.
+        Without the template, empty sheets with the given header are created.
+        :return: Names of the created sheets
+        """
+        for attempt in range(2):
+            worksheets = {sheet.title: sheet for sheet in self.__spreadsheet.worksheets()}
+            missing = [name for name in dict.fromkeys(sheet_names) if name not in worksheets]
+            if not missing:
+                return []
+
+            template = worksheets.get(template_name)
+            if template is not None:
+                requests = [
+                    {"duplicateSheet": {
+                        "sourceSheetId": template.id,
+                        "newSheetName": name,
+                        "insertSheetIndex": len(worksheets) + index,
+                    }}
+                    for index, name in enumerate(missing)
+                ]
+            else:
+                logger.warning(f"Template sheet {template_name} not found, creating sheets with a header only")
+                requests = [
+                    {"addSheet": {"properties": {
+                        "title": name,
+                        "gridProperties": {"rowCount": 100, "columnCount": len(header)},
+                    }}}
+                    for name in missing
+                ]
+
             try:
-                new_sheet = self.__spreadsheet.add_worksheet(title=new_sheet_name, rows=100, cols=10)
-                return new_sheet
-            except Exception as create_error:
-                logger.error(f"Failed to create new sheet: {create_error}")
-                raise
+                self.__spreadsheet.batch_update({"requests": requests})
+            except gspread.exceptions.APIError as e:
+                if attempt:
+                    raise
+                logger.warning(f"Sheet provisioning was rejected, retrying: {e}")
+                continue
+
+            if template is None:
+                self.__spreadsheet.values_batch_update({
+                    "valueInputOption": "RAW",
+                    "data": [{"range": absolute_range_name(name, "A1"), "values": [header]} for name in missing],
+                })
+            for name in missing:
+                self.invalidate_header(name)
+            logger.info(f"Created sheets: {missing}")
+            return missing
+        return []
+
+    def get_or_create_sheet(self, sheet_name: str, header: list[str]) -> Worksheet:
+        """
+        Get a worksheet by name, creating it with the given header row if it doesn't exist.
+        """
+        try:
+            return self.__spreadsheet.worksheet(sheet_name)
+        except gspread.exceptions.WorksheetNotFound:
+            logger.info(f"Sheet {sheet_name} not found, creating a new one")
+            sheet = self.__spreadsheet.add_worksheet(title=sheet_name, rows=1, cols=len(header))
+            sheet.update([header])
+            self.invalidate_header(sheet_name)
+            return sheet
 
     def write_dataframe_to_sheet(self, sheet_name: str, dataframe: pd.DataFrame) -> None:
         """
@@ -91,6 +175,7 @@ class GoogleSheetsClient:
         """
         try:
             sheet = self.spreadsheet.worksheet(sheet_name)
+            self.invalidate_header(sheet_name)
             dataframe = dataframe.fillna('').infer_objects(copy=False)
             sheet.clear()
             sheet.update([dataframe.columns.values.tolist()] + dataframe.values.tolist())
@@ -1,52 +1,129 @@
 from json import loads, JSONDecodeError
+from time import perf_counter
 
 from loguru import logger
-from openai import OpenAI
-from openai.types.chat import ChatCompletion
+from openai import OpenAI, omit
+from openai.types.chat import ChatCompletion, ChatCompletionMessageFunctionToolCall
 
-from configs.openai import OpenAIConfig
-from models.llm.tools import BaseTool, LLMResponse, ToolCall
+from configs.openai import OpenAIConfig, OpenAIBackend
+from models.llm.tools import BaseTool, LLMResponse, ToolCall, TokenUsage
+from utils.helpers.json_repair import repair_json
+
+
+class ToolCallParseError(RuntimeError):
+    """
+    Raised when the tool call arguments of a response can't be parsed, even after repair.
+    """
+
+    def __init__(self, message: str, raw: str, usage: TokenUsage | None = None):
+        super().__init__(message)
+        self.raw = raw
+        self.usage = usage
 
 
 class OpenAIClient:
-    def __init__(self):
+    def __init__(self, backend: OpenAIBackend | None = None):
         self.__config = OpenAIConfig()  # type: ignore
+        self.__backend = backend or OpenAIBackend(name="openai")
 
         self.__client = OpenAI(
-            api_key=self.__config.API_KEY
+            api_key=self.__backend.api_key or self.__config.API_KEY,
+            base_url=self.__backend.base_url,
+            timeout=self.__config.REQUEST_TIMEOUT,
         )
 
-    def send_message(self, messages: list, tools: list[type[BaseTool]] | None = None) -> LLMResponse:
+    @property
+    def name(self) -> str:
+        return self.__backend.name
+
+    def send_message(
+            self,
+            messages: list,
+            tools: list[type[BaseTool]] | None = None,
+            cache_key: str | None = None,
+            model: str | None = None
+    ) -> LLMResponse:
         prepared_tools = [tool.to_openai_tool_definition() for tool in tools]
+        # A backend bound to its own model ignores the requested one
+        model = self.__backend.model or model or self.__config.MODEL
+        started = perf_counter()
         response = self.__client.chat.completions.create(
-            model=self.__config.MODEL,
+            model=model,
             messages=messages,
-            tools=prepared_tools
+            tools=prepared_tools,
+            prompt_cache_key=cache_key or omit,
         )
+        latency = perf_counter() - started
 
-        return self.__parse_response(response)
+        parsed = self.__parse_response(response, tool_name=tools[0].__name__ if tools else None)
+        parsed.model = model
+        parsed.latency = latency
+        parsed.backend = self.name
+        return parsed
 
     @staticmethod
-    def __parse_response(response: ChatCompletion) -> LLMResponse:
+    def __parse_usage(response: ChatCompletion) -> TokenUsage | None:
+        if response.usage is None:
+            return None
+
+        details = response.usage.prompt_tokens_details
+        usage = TokenUsage(
+            prompt_tokens=response.usage.prompt_tokens,
+            completion_tokens=response.usage.completion_tokens,
+            cached_tokens=(details.cached_tokens or 0) if details else 0,
+        )
+        logger.info(
+            f"Token usage: prompt={usage.prompt_tokens}, cached={usage.cached_tokens}, "
+            f"completion={usage.completion_tokens}"
+        )
+        return usage
+
+    @classmethod
+    def __parse_response(cls, response: ChatCompletion, tool_name: str | None = None) -> LLMResponse:
         if not response.choices:
             raise ValueError("No choices in OpenAI API response")
 
         choice = response.choices[0]
+        usage = cls.__parse_usage(response)
         tool_calls = []
 
         if not choice.message.tool_calls:
-            raise ValueError("No tool calls in OpenAI API response")
+            content = choice.message.content or ""
+            if tool_name and content:
+                # Some models put the tool arguments into the message text instead of a tool call
+                try:
+                    arguments = repair_json(content)
+                    logger.warning("No tool calls in OpenAI API response, arguments recovered from message text")
+                    return LLMResponse(
+                        text=content,
+                        tool_calls=[ToolCall(tool_name=tool_name, tool_input=arguments, tool_id="content")],
+                        usage=usage,
+                    )
+                except ValueError:
+                    pass
+            raise ToolCallParseError("No tool calls in OpenAI API response", raw=content, usage=usage)
 
         for call in choice.message.tool_calls:
+            # Only function tools are sent, custom tool calls have no arguments to parse
+            if not isinstance(call, ChatCompletionMessageFunctionToolCall):
+                logger.warning(f"Skipping {call.type} tool call {call.id}")
+                continue
             try:
                 if isinstance(call.function.arguments, str):
                     arguments = loads(call.function.arguments)
                 else:
                     arguments = call.function.arguments
             except JSONDecodeError as e:
-                logger.warning(f"Error decoding JSON in tool call arguments: {e}")
-                logger.debug(f"Raw arguments: {call.function.arguments}")
-                raise RuntimeError("Couldn't decode tool call arguments") from e
+                logger.warning(f"Error decoding JSON in tool call arguments, repairing: {e}")
+                logger.debug("Raw arguments: {}", call.function.arguments)
+                try:
+                    arguments = repair_json(call.function.arguments)
+                except ValueError:
+                    raise ToolCallParseError(
+                        "Couldn't decode tool call arguments",
+                        raw=call.function.arguments,
+                        usage=usage
+                    ) from e
 
             tool_calls.append(
                 ToolCall(
@@ -55,8 +132,15 @@ class OpenAIClient:
                     tool_id=call.id,
                 )
             )
+        if not tool_calls:
+            raise ToolCallParseError(
+                "No function tool calls in OpenAI API response",
+                raw=choice.message.content or "",
+                usage=usage
+            )
 
         return LLMResponse(
             text=choice.message.content or "",
             tool_calls=tool_calls,
+            usage=usage,
         )
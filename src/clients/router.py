@@ -0,0 +1,250 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from json import dumps
+from threading import Lock
+from typing import Callable, Protocol
+
+from loguru import logger
+from pydantic import ValidationError
+
+from clients.openai import OpenAIClient, ToolCallParseError
+from configs.openai import OpenAIConfig
+from models.llm.tools import BaseTool, LLMResponse, TokenUsage
+
+
+class LLMBackend(Protocol):
+    name: str
+
+    def send_message(
+            self,
+            messages: list,
+            tools: list[type[BaseTool]] | None = None,
+            cache_key: str | None = None,
+            model: str | None = None
+    ) -> LLMResponse:
+        ...
+
+
+class LLMRouter:
+    """
+    Routes LLM requests over ordered backends.
+    A backend that errors or returns a response that doesn't validate into the requested tool
+    is replaced by the next one. With hedging enabled, the next backend is also started
+    once the current request is slower than the configured latency percentile.
+
+    Latencies and worker threads are shared by all routers of the process,
+    so the hedging window fills across reviews and routers created per review don't leak threads.
+    A hedged request that loses keeps running, its response is passed to `on_discarded` when it finishes,
+    so its tokens can still be recorded.
+    """
+    LATENCY_WINDOW = 50
+    __latencies: dict[str, deque[float]] = {}
+    __executor: ThreadPoolExecutor | None = None
+    __shared_lock = Lock()
+
+    def __init__(self, backends: list[LLMBackend] | None = None):
+        self.__config = OpenAIConfig()  # type: ignore
+        if backends is None:
+            backends = [OpenAIClient()]
+            backends.extend(OpenAIClient(backend) for backend in self.__config.BACKENDS)
+        if not backends:
+            raise ValueError("At least one LLM backend is required")
+
+        self.__backends = backends
+        with LLMRouter.__shared_lock:
+            for backend in backends:
+                LLMRouter.__latencies.setdefault(backend.name, deque(maxlen=self.LATENCY_WINDOW))
+            if LLMRouter.__executor is None:
+                LLMRouter.__executor = ThreadPoolExecutor(
+                    max_workers=self.__config.MAX_PARALLEL_REQUESTS,
+                    thread_name_prefix="llm-backend"
+                )
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        executor = LLMRouter.__executor
+        assert executor is not None, "The executor is created by the first router"
+        return executor
+
+    @property
+    def name(self) -> str:
+        return "+".join(backend.name for backend in self.__backends)
+
+    def get_hedge_delay(self, backend: LLMBackend) -> float | None:
+        """
+        Get the latency percentile of a backend after which the next backend is started.
+        :return: Delay in seconds, or None if hedging is disabled or there are too few samples
+        """
+        percentile = self.__config.HEDGE_PERCENTILE
+        with LLMRouter.__shared_lock:
+            latencies = sorted(LLMRouter.__latencies[backend.name])
+        if percentile is None or len(latencies) < self.__config.HEDGE_MIN_SAMPLES:
+            return None
+
+        index = min(int(len(latencies) * percentile), len(latencies) - 1)
+        return latencies[index]
+
+    @staticmethod
+    def __validate(response: LLMResponse, tools: list[type[BaseTool]]) -> None:
+        if not response.tool_calls:
+            raise ToolCallParseError("No tool calls in response", raw=response.text)
+        tool = next((tool for tool in tools if tool.__name__ == response.tool_calls[0].tool_name), tools[0])
+        tool.model_validate(response.tool_calls[0].tool_input)
+
+    @staticmethod
+    def __add_usage(first: TokenUsage | None, second: TokenUsage | None) -> TokenUsage | None:
+        if first is None or second is None:
+            return first or second
+        return TokenUsage(
+            prompt_tokens=first.prompt_tokens + second.prompt_tokens,
+            completion_tokens=first.completion_tokens + second.completion_tokens,
+            cached_tokens=first.cached_tokens + second.cached_tokens,
+        )
+
+    @staticmethod
+    def __repair(
+            backend: LLMBackend,
+            raw: str,
+            error: Exception,
+            tools: list[type[BaseTool]],
+            model: str | None
+    ) -> LLMResponse:
+        """
+        Ask the backend to fix its previous reply.
+        Only the previous reply and the error are sent, not the original prompt.
+        """
+        tool_name = tools[0].__name__
+        messages = [
+            {
+                "role": "system",
+                "content": f"Your previous reply could not be parsed as arguments of the {tool_name} tool. "
+                           f"Call {tool_name} again with the same content as valid JSON arguments. "
+                           f"Do not change the meaning of the reply.",
+            },
+            {
+                "role": "user",
+                "content": f"Previous reply:\n{raw}\n\nError:\n{error}",
+            },
+        ]
+        logger.info(f"Sending repair turn to backend {backend.name}")
+        return backend.send_message(messages, tools=tools, model=model)
+
+    def __repair_until_valid(
+            self,
+            backend: LLMBackend,
+            error: ToolCallParseError | ValidationError,
+            response: LLMResponse | None,
+            tools: list[type[BaseTool]],
+            model: str | None
+    ) -> LLMResponse:
+        spent = response.usage if response is not None else getattr(error, "usage", None)
+        for attempt in range(self.__config.REPAIR_ATTEMPTS):
+            if isinstance(error, ToolCallParseError) or response is None:
+                raw = getattr(error, "raw", str(error))
+            else:
+                raw = dumps(response.tool_calls[0].tool_input, ensure_ascii=False)
+            logger.warning(f"Unparsable response from backend {backend.name} (repair {attempt + 1}): {error}")
+
+            try:
+                response = self.__repair(backend, raw, error, tools, model)
+                spent = self.__add_usage(spent, response.usage)
+                self.__validate(response, tools)
+                response.usage = spent
+                return response
+            except ToolCallParseError as e:
+                error = e
+                spent = self.__add_usage(spent, e.usage)
+            except ValidationError as e:
+                error = e
+        raise error
+
+    def __call_backend(
+            self,
+            backend: LLMBackend,
+            messages: list,
+            tools: list[type[BaseTool]] | None,
+            cache_key: str | None,
+            model: str | None
+    ) -> LLMResponse:
+        response = None
+        try:
+            response = backend.send_message(messages, tools=tools, cache_key=cache_key, model=model)
+            if tools:
+                self.__validate(response, tools)
+        except (ToolCallParseError, ValidationError) as e:
+            if not tools or self.__config.REPAIR_ATTEMPTS < 1:
+                raise
+            response = self.__repair_until_valid(backend, e, response, tools, model)
+
+        if response.latency is not None:
+            with LLMRouter.__shared_lock:
+                LLMRouter.__latencies[backend.name].append(response.latency)
+        response.backend = response.backend or backend.name
+        return response
+
+    @staticmethod
+    def __discarded_callback(on_discarded: Callable[[LLMResponse], None]) -> Callable[[Future], None]:
+        def callback(future: Future) -> None:
+            if future.cancelled() or future.exception() is not None:
+                return
+            try:
+                on_discarded(future.result())
+            except Exception as e:
+                logger.error(f"Error handling a discarded hedged response: {e}")
+        return callback
+
+    def send_message(
+            self,
+            messages: list,
+            tools: list[type[BaseTool]] | None = None,
+            cache_key: str | None = None,
+            model: str | None = None,
+            on_discarded: Callable[[LLMResponse], None] | None = None
+    ) -> LLMResponse:
+        """
+        Send a request, falling back and hedging over the backends.
+        :param on_discarded: Called with the response of every hedged request that finishes after the winner
+        """
+        pending: dict[Future, LLMBackend] = {}
+        remaining = list(self.__backends)
+        errors: list[str] = []
+
+        def start_next() -> bool:
+            if not remaining:
+                return False
+            backend = remaining.pop(0)
+            logger.debug("Starting LLM request on backend {}", backend.name)
+            future = self.executor.submit(self.__call_backend, backend, messages, tools, cache_key, model)
+            pending[future] = backend
+            return True
+
+        start_next()
+        while pending:
+            newest = list(pending.values())[-1]
+            timeout = self.get_hedge_delay(newest) if remaining else None
+            done, _ = wait(pending.keys(), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                start_next()
+                logger.warning(
+                    f"Backend {newest.name} is slower than usual, hedging with {list(pending.values())[-1].name}"
+                )
+                continue
+
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    logger.warning(f"Backend {backend.name} failed: {e}")
+                    errors.append(f"{backend.name}: {e}")
+                    start_next()
+                    continue
+
+                logger.info(f"Response from backend {backend.name} in {response.latency or 0:.2f}s")
+                for other in pending:
+                    if not other.cancel() and on_discarded is not None:
+                        other.add_done_callback(self.__discarded_callback(on_discarded))
+                return response
+
+        raise RuntimeError(f"All LLM backends failed: {'; '.join(errors)}")
@@ -0,0 +1,181 @@
+"""
+This module contains tests for the LLM router and the HTTP cassette
+"""
+
+import gzip
+import os
+import tempfile
+import threading
+import time
+import unittest
+from base64 import b64encode
+from json import dumps
+from pathlib import Path
+from uuid import uuid4
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("OPENAI_MODEL", "test-model")
+
+import requests
+
+from clients.cassette import Cassette
+from clients.router import LLMRouter
+from models.llm.tools import LLMResponse, ReviewCodeTool, ToolCall
+
+REVIEW = {"comment": "ok", "suggestions": "none", "rating": 5}
+
+
+class FakeBackend:
+    """
+    Backend that answers after a delay with a fixed tool input, or raises
+    """
+
+    def __init__(self, delay: float = 0.0, tool_input: dict | None = None, error: Exception | None = None):
+        self.name = f"fake-{uuid4().hex[:8]}"
+        self.delay = delay
+        self.tool_input = tool_input if tool_input is not None else REVIEW
+        self.error = error
+        self.calls = 0
+
+    def send_message(self, messages, tools=None, cache_key=None, model=None) -> LLMResponse:
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return LLMResponse(
+            text="",
+            tool_calls=[ToolCall(tool_name="ReviewCodeTool", tool_input=self.tool_input, tool_id="1")],
+            latency=self.delay,
+        )
+
+
+class LLMRouterTest(unittest.TestCase):
+    """
+    Testing fallback and hedging of the router
+    """
+
+    def setUp(self):
+        """
+        Disable repair turns, so an invalid reply goes straight to the next backend
+        :return:
+        """
+        os.environ["OPENAI_REPAIR_ATTEMPTS"] = "0"
+        os.environ.pop("OPENAI_HEDGE_PERCENTILE", None)
+
+    def tearDown(self):
+        os.environ.pop("OPENAI_REPAIR_ATTEMPTS", None)
+        os.environ.pop("OPENAI_HEDGE_PERCENTILE", None)
+
+    def test_falls_back_on_error(self):
+        """
+        A failing backend is replaced by the next one
+        :return:
+        """
+        failing, working = FakeBackend(error=RuntimeError("down")), FakeBackend()
+        response = LLMRouter([failing, working]).send_message([], tools=[ReviewCodeTool])
+        self.assertEqual(response.backend, working.name)
+
+    def test_falls_back_on_invalid_tool_input(self):
+        """
+        A reply that doesn't validate into the tool is replaced by the next backend
+        :return:
+        """
+        invalid, working = FakeBackend(tool_input={"rating": "bad"}), FakeBackend()
+        response = LLMRouter([invalid, working]).send_message([], tools=[ReviewCodeTool])
+        self.assertEqual(response.backend, working.name)
+
+    def test_all_backends_fail(self):
+        """
+        The error names every backend
+        :return:
+        """
+        backends = [FakeBackend(error=RuntimeError("down")) for _ in range(2)]
+        with self.assertRaises(RuntimeError):
+            LLMRouter(backends).send_message([], tools=[ReviewCodeTool])
+
+    def test_latencies_are_shared_between_routers(self):
+        """
+        Routers created per review fill one latency window per backend
+        :return:
+        """
+        os.environ["OPENAI_HEDGE_PERCENTILE"] = "0.5"
+        backend = FakeBackend(delay=0.01)
+        for _ in range(5):
+            LLMRouter([backend, FakeBackend()]).send_message([], tools=[ReviewCodeTool])
+        self.assertIsNotNone(LLMRouter([backend]).get_hedge_delay(backend))
+
+    def test_hedges_slow_backend(self):
+        """
+        Once the window is full, a request slower than the percentile starts the next backend
+        :return:
+        """
+        os.environ["OPENAI_HEDGE_PERCENTILE"] = "0.5"
+        slow, fast = FakeBackend(delay=0.01), FakeBackend()
+        router = LLMRouter([slow, fast])
+        for _ in range(5):
+            router.send_message([], tools=[ReviewCodeTool])
+        slow.delay = 1.0
+        response = router.send_message([], tools=[ReviewCodeTool])
+        self.assertEqual(response.backend, fast.name)
+        self.assertEqual(fast.calls, 1)
+
+    def test_discarded_hedge_is_reported(self):
+        """
+        The response of a hedged request that lost is passed to on_discarded when it finishes
+        :return:
+        """
+        os.environ["OPENAI_HEDGE_PERCENTILE"] = "0.5"
+        slow, fast = FakeBackend(delay=0.01), FakeBackend()
+        router = LLMRouter([slow, fast])
+        for _ in range(5):
+            router.send_message([], tools=[ReviewCodeTool])
+        slow.delay = 0.3
+        discarded = []
+        finished = threading.Event()
+
+        def on_discarded(response: LLMResponse) -> None:
+            discarded.append(response.backend)
+            finished.set()
+
+        response = router.send_message([], tools=[ReviewCodeTool], on_discarded=on_discarded)
+        self.assertEqual(response.backend, fast.name)
+        self.assertTrue(finished.wait(5))
+        self.assertEqual(discarded, [slow.name])
+
+
+class CassetteTest(unittest.TestCase):
+    """
+    Testing replay of recorded HTTP traffic
+    """
+
+    def setUp(self):
+        """
+        Write a cassette with one GitHub response
+        :return:
+        """
+        self.path = Path(tempfile.mkdtemp()) / "cassette.jsonl.gz"
+        entry = {
+            "method": "GET",
+            "url": "https://api.github.com/repos/org/lab?token=REDACTED",
+            "body": "",
+            "status": 200,
+            "headers": {"Content-Type": "application/json"},
+            "content": b64encode(b'{"name": "lab"}').decode("ascii"),
+            "latency": 0.1,
+        }
+        with gzip.open(self.path, "wt", encoding="utf-8") as cassette_file:
+            cassette_file.write(dumps(entry) + "\n")
+
+    def test_replay(self):
+        """
+        A recorded request is answered from the cassette with secrets in the URL redacted for matching
+        :return:
+        """
+        original = requests.Session.send
+        with Cassette("replay", self.path, latency_scale=0):
+            response = requests.Session().get("https://api.github.com/repos/org/lab?token=secret")
+            with self.assertRaises(RuntimeError):
+                requests.Session().get("https://api.github.com/repos/org/other")
+        self.assertEqual(response.json(), {"name": "lab"})
+        self.assertIs(requests.Session.send, original)
+
@@ -0,0 +1,31 @@
+from pydantic import Field, AliasChoices
+from pydantic_settings import SettingsConfigDict
+
+from .base import BaseApplicationConfig
+
+
+class AnalysisConfig(BaseApplicationConfig):
+    ENABLED: bool = Field(
+        default=False,
+        description="Run local static analysis before the model review",
+        validation_alias=AliasChoices("ANALYSIS_ENABLED")
+    )
+    FAIL_ON_ERRORS: bool = Field(
+        default=False,
+        description="Skip the model review if any file fails to compile, not only when nothing compiles",
+        validation_alias=AliasChoices("ANALYSIS_FAIL_ON_ERRORS")
+    )
+    WORKERS: int | None = Field(
+        default=None,
+        description="Number of analysis threads, CPU count if None",
+        validation_alias=AliasChoices("ANALYSIS_WORKERS")
+    )
+    CHECK_TIMEOUT: float = Field(
+        default=15.0,
+        description="Timeout of a single compiler check in seconds",
+        validation_alias=AliasChoices("ANALYSIS_CHECK_TIMEOUT")
+    )
+
+    model_config = SettingsConfigDict(
+        env_prefix=""  # Без префіксу, бо використовуємо AliasChoices
+    )
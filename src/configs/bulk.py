@@ -0,0 +1,42 @@
+from pathlib import Path
+
+from pydantic import Field, AliasChoices
+from pydantic_settings import SettingsConfigDict
+
+from .base import BaseApplicationConfig
+from .storage import StorageConfig
+
+
+class BulkConfig(BaseApplicationConfig):
+    WORKERS: int = Field(
+        default=1,
+        description="Number of worker processes of a bulk run, each one owns one lab sheet at a time",
+        validation_alias=AliasChoices("BULK_WORKERS")
+    )
+    SHARD_DIR: Path | None = Field(
+        default=None,
+        description="Directory with shard leases and the checkpoint journal, shared between machines",
+        validation_alias=AliasChoices("BULK_SHARD_DIR")
+    )
+    LEASE_TTL: float = Field(
+        default=900.0,
+        description="Seconds without a heartbeat after which a shard lease is taken over",
+        validation_alias=AliasChoices("BULK_LEASE_TTL")
+    )
+    SHARD_ATTEMPTS: int = Field(
+        default=3,
+        description="Attempts of a shard that raises, it isn't claimed again in the run after that",
+        validation_alias=AliasChoices("BULK_SHARD_ATTEMPTS")
+    )
+
+    model_config = SettingsConfigDict(
+        env_prefix=""  # Без префіксу, бо використовуємо AliasChoices
+    )
+
+    def get_shard_root(self) -> Path:
+        """
+        Get the directory of shard leases and the checkpoint journal, creating it.
+        """
+        shard_root = self.SHARD_DIR or StorageConfig().CACHE_DIR / "bulk"
+        shard_root.mkdir(parents=True, exist_ok=True)
+        return shard_root
@@ -0,0 +1,29 @@
+from pathlib import Path
+from typing import Literal
+
+from pydantic import Field, AliasChoices
+from pydantic_settings import SettingsConfigDict
+
+from .base import BaseApplicationConfig
+
+
+class CassetteConfig(BaseApplicationConfig):
+    MODE: Literal["off", "record", "replay"] = Field(
+        default="off",
+        description="Record all HTTP traffic of a run to a cassette or replay a run from one",
+        validation_alias=AliasChoices("CASSETTE_MODE")
+    )
+    PATH: Path = Field(
+        default=Path("../.cache/cassette.jsonl.gz"),
+        description="Cassette file",
+        validation_alias=AliasChoices("CASSETTE_PATH")
+    )
+    LATENCY_SCALE: float = Field(
+        default=1.0,
+        description="Replayed latency multiplier, 0 replays without delays",
+        validation_alias=AliasChoices("CASSETTE_LATENCY_SCALE")
+    )
+
+    model_config = SettingsConfigDict(
+        env_prefix=""  # Без префіксу, бо використовуємо AliasChoices
+    )
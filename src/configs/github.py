@@ -25,6 +25,21 @@ class GitHubConfig(BaseApplicationConfig):
         description="GitHub Private Key",
         validation_alias=AliasChoices("GIT_PRIVATE_KEY", "PRIVATE_KEY")
     )
+    MAX_FILE_SIZE: int = Field(
+        default=200_000,
+        description="Files larger than this number of bytes are listed but not read",
+        validation_alias=AliasChoices("GIT_MAX_FILE_SIZE")
+    )
+    MAX_TOTAL_SIZE: int = Field(
+        default=2_000_000,
+        description="Maximum number of bytes read from one repository",
+        validation_alias=AliasChoices("GIT_MAX_TOTAL_SIZE")
+    )
+    MIRROR_ENABLED: bool = Field(
+        default=False,
+        description="Read repositories from local bare clones refreshed with incremental fetches",
+        validation_alias=AliasChoices("GIT_MIRROR_ENABLED")
+    )
 
     model_config = SettingsConfigDict(
         env_prefix=""  # Без префіксу, бо використовуємо AliasChoices
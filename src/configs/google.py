@@ -24,6 +24,21 @@ class GoogleSheetsConfig(BaseApplicationConfig):
         description="Google Sheets naming",
         validation_alias=AliasChoices("GOOGLE_SHEETS_NAMING", "SHEETS_NAMING")
     )
+    WRITE_BUFFER_SIZE: int = Field(
+        default=25,
+        description="Buffered student rows of a sheet that trigger a flush in bulk runs",
+        validation_alias=AliasChoices("GOOGLE_WRITE_BUFFER_SIZE")
+    )
+    WRITE_BUFFER_INTERVAL: float = Field(
+        default=120.0,
+        description="Seconds after the first buffered row that trigger a flush in bulk runs",
+        validation_alias=AliasChoices("GOOGLE_WRITE_BUFFER_INTERVAL")
+    )
+    WRITE_RETRIES: int = Field(
+        default=3,
+        description="Attempts of a buffered flush before the rows are kept for the next flush",
+        validation_alias=AliasChoices("GOOGLE_WRITE_RETRIES")
+    )
 
     model_config = SettingsConfigDict(
         env_prefix=""  # Без префіксу, бо використовуємо AliasChoices
@@ -46,8 +61,8 @@ class GoogleSheetsConfig(BaseApplicationConfig):
                     raise
         return values
 
-    def get_sheet_name(self, key: SheetsNamingEnum) -> str:
-        name = self.SHEETS_NAMING.get(key.value, None)
+    def get_sheet_name(self, key: SheetsNamingEnum, default: str | None = None) -> str:
+        name = self.SHEETS_NAMING.get(key.value, default)
         if name is None:
             raise ValueError(f"Sheet name for {key} not found")
         return name
@@ -0,0 +1,39 @@
+from pathlib import Path
+from typing import Literal
+
+from pydantic import Field, AliasChoices
+from pydantic_settings import SettingsConfigDict
+
+from .base import BaseApplicationConfig
+
+
+class LoggingConfig(BaseApplicationConfig):
+    LEVEL: str = Field(
+        default="INFO",
+        description="Minimal level of logged records, messages below it are never formatted",
+        validation_alias=AliasChoices("LOG_LEVEL")
+    )
+    FORMAT: Literal["text", "json"] = Field(
+        default="text",
+        description="Human readable lines or one JSON record per line",
+        validation_alias=AliasChoices("LOG_FORMAT")
+    )
+    ENQUEUE: bool = Field(
+        default=True,
+        description="Write records from a background thread instead of the logging call",
+        validation_alias=AliasChoices("LOG_ENQUEUE")
+    )
+    FILE: Path | None = Field(
+        default=None,
+        description="Additional file sink, always JSON",
+        validation_alias=AliasChoices("LOG_FILE")
+    )
+    BULK_DEBUG_SAMPLE: int = Field(
+        default=10,
+        description="In bulk runs only every N-th debug record of each call site is written",
+        validation_alias=AliasChoices("LOG_BULK_DEBUG_SAMPLE")
+    )
+
+    model_config = SettingsConfigDict(
+        env_prefix=""  # Без префіксу, бо використовуємо AliasChoices
+    )
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from pydantic import Field, AliasChoices
+from pydantic_settings import SettingsConfigDict
+
+from .base import BaseApplicationConfig
+
+
+class MemoConfig(BaseApplicationConfig):
+    ENABLED: bool = Field(
+        default=False,
+        description="Send summaries instead of the full text of files already seen in the lab",
+        validation_alias=AliasChoices("FILE_MEMO_ENABLED")
+    )
+    MAX_ENTRIES: int = Field(
+        default=20000,
+        description="Summaries kept in the memo, the least recently used ones are evicted",
+        validation_alias=AliasChoices("FILE_MEMO_MAX_ENTRIES")
+    )
+    MIN_SIZE: int = Field(
+        default=1500,
+        description="Files shorter than this many characters are always sent in full",
+        validation_alias=AliasChoices("FILE_MEMO_MIN_SIZE")
+    )
+    PATH: Path | None = Field(
+        default=None,
+        description="SQLite database of the memo, CACHE_DIR/memo/files.sqlite if None",
+        validation_alias=AliasChoices("FILE_MEMO_PATH")
+    )
+    SUMMARY_MODEL: str | None = Field(
+        default=None,
+        description="Model that summarises reused files, a static outline is used if None",
+        validation_alias=AliasChoices("FILE_MEMO_SUMMARY_MODEL")
+    )
+
+    model_config = SettingsConfigDict(
+        env_prefix=""  # Без префіксу, бо використовуємо AliasChoices
+    )
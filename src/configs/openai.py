@@ -1,9 +1,18 @@
-from pydantic import Field, AliasChoices
+from pathlib import Path
+
+from pydantic import BaseModel, Field, AliasChoices
 from pydantic_settings import SettingsConfigDict
 
 from .base import BaseApplicationConfig
 
 
+class OpenAIBackend(BaseModel):
+    name: str = Field(..., description="Backend name used in logs and the usage ledger")
+    base_url: str | None = Field(default=None, description="OpenAI-compatible endpoint, OpenAI if None")
+    api_key: str | None = Field(default=None, description="API key, OPENAI_API_KEY if None")
+    model: str | None = Field(default=None, description="Model, OPENAI_MODEL if None")
+
+
 class OpenAIConfig(BaseApplicationConfig):
     API_KEY: str = Field(
         ..., 
@@ -15,6 +24,76 @@ class OpenAIConfig(BaseApplicationConfig):
         description="OpenAI Model",
         validation_alias=AliasChoices("OPENAI_MODEL", "MODEL")
     )
+    FALLBACK_MODEL: str | None = Field(
+        default=None,
+        description="Cheaper model used once a lab is about to exceed its token budget",
+        validation_alias=AliasChoices("OPENAI_FALLBACK_MODEL", "FALLBACK_MODEL")
+    )
+    LAB_TOKEN_BUDGET: int | None = Field(
+        default=None,
+        description="Maximum number of tokens per lab before falling back to FALLBACK_MODEL",
+        validation_alias=AliasChoices("OPENAI_LAB_TOKEN_BUDGET", "LAB_TOKEN_BUDGET")
+    )
+    LAB_TOKEN_BUDGET_WINDOW: float | None = Field(
+        default=None,
+        description="Only tokens spent in the last N hours count towards LAB_TOKEN_BUDGET, all tokens if None",
+        validation_alias=AliasChoices("OPENAI_LAB_TOKEN_BUDGET_WINDOW", "LAB_TOKEN_BUDGET_WINDOW")
+    )
+    USAGE_LEDGER: Path | None = Field(
+        default=None,
+        description="Token usage ledger that budgets are counted from, CACHE_DIR/usage.jsonl if None",
+        validation_alias=AliasChoices("OPENAI_USAGE_LEDGER", "USAGE_LEDGER")
+    )
+    PRICING: dict[str, dict[str, float]] = Field(
+        default_factory=dict,
+        description='USD per 1M tokens, e.g. {"gpt-5-mini": {"input": 0.25, "cached_input": 0.025, "output": 2.0}}',
+        validation_alias=AliasChoices("OPENAI_PRICING", "PRICING")
+    )
+    BACKENDS: list[OpenAIBackend] = Field(
+        default_factory=list,
+        description="Ordered fallback backends tried after the primary one",
+        validation_alias=AliasChoices("OPENAI_BACKENDS", "BACKENDS")
+    )
+    HEDGE_PERCENTILE: float | None = Field(
+        default=None,
+        description="Start the next backend once a request is slower than this latency percentile, e.g. 0.9",
+        validation_alias=AliasChoices("OPENAI_HEDGE_PERCENTILE", "HEDGE_PERCENTILE")
+    )
+    HEDGE_MIN_SAMPLES: int = Field(
+        default=5,
+        description="Number of observed latencies required before requests are hedged",
+        validation_alias=AliasChoices("OPENAI_HEDGE_MIN_SAMPLES", "HEDGE_MIN_SAMPLES")
+    )
+    MAX_PARALLEL_REQUESTS: int = Field(
+        default=32,
+        description="LLM requests in flight per process across all reviews, rubric criteria and hedges",
+        validation_alias=AliasChoices("OPENAI_MAX_PARALLEL_REQUESTS", "MAX_PARALLEL_REQUESTS")
+    )
+    REQUEST_TIMEOUT: float = Field(
+        default=600.0,
+        description="Timeout of a single LLM request in seconds",
+        validation_alias=AliasChoices("OPENAI_REQUEST_TIMEOUT", "REQUEST_TIMEOUT")
+    )
+    REPAIR_ATTEMPTS: int = Field(
+        default=1,
+        description="Short repair turns sent when a response can't be parsed into the requested tool",
+        validation_alias=AliasChoices("OPENAI_REPAIR_ATTEMPTS", "REPAIR_ATTEMPTS")
+    )
+    TRIAGE_MODEL: str | None = Field(
+        default=None,
+        description="Small model that classifies submissions before the full review, cascade disabled if None",
+        validation_alias=AliasChoices("OPENAI_TRIAGE_MODEL", "TRIAGE_MODEL")
+    )
+    TRIAGE_THRESHOLD: float = Field(
+        default=0.8,
+        description="Minimal triage confidence to skip the full review",
+        validation_alias=AliasChoices("OPENAI_TRIAGE_THRESHOLD", "TRIAGE_THRESHOLD")
+    )
+    RUBRIC_CONCURRENCY: int = Field(
+        default=8,
+        description="Rubric criteria evaluated at the same time",
+        validation_alias=AliasChoices("OPENAI_RUBRIC_CONCURRENCY", "RUBRIC_CONCURRENCY")
+    )
 
     model_config = SettingsConfigDict(
         env_prefix=""  # Без префіксу, бо використовуємо AliasChoices
@@ -0,0 +1,53 @@
+from typing import Literal
+
+from pydantic import Field, AliasChoices
+from pydantic_settings import SettingsConfigDict
+
+from .base import BaseApplicationConfig
+
+
+class PromptConfig(BaseApplicationConfig):
+    CACHE_FRIENDLY_LAYOUT: bool = Field(
+        default=False,
+        description="Put the stable part of the prompt first so provider-side prompt caching can hit",
+        validation_alias=AliasChoices("PROMPT_CACHE_FRIENDLY_LAYOUT", "CACHE_FRIENDLY_LAYOUT")
+    )
+    SELECTION_SEED: Literal["random", "lab", "student"] = Field(
+        default="random",
+        description="How the teacher prompt is selected: at random, per lab or per student",
+        validation_alias=AliasChoices("PROMPT_SELECTION_SEED", "SELECTION_SEED")
+    )
+    TEMPLATE_BASELINE: bool = Field(
+        default=False,
+        description="Drop files identical to the lab template and send near-identical ones as a diff",
+        validation_alias=AliasChoices("PROMPT_TEMPLATE_BASELINE", "TEMPLATE_BASELINE")
+    )
+    TEMPLATE_DIFF_THRESHOLD: float = Field(
+        default=0.6,
+        description="Minimal similarity to the template file for a file to be sent as a diff",
+        validation_alias=AliasChoices("PROMPT_TEMPLATE_DIFF_THRESHOLD", "TEMPLATE_DIFF_THRESHOLD")
+    )
+    RANK_FILES: bool = Field(
+        default=False,
+        description="Order files by BM25 relevance to the assignment and teacher prompts",
+        validation_alias=AliasChoices("PROMPT_RANK_FILES", "RANK_FILES")
+    )
+    CONTEXT_BUDGET: int | None = Field(
+        default=None,
+        description="Maximum number of file characters sent to the model, the least relevant files are left out",
+        validation_alias=AliasChoices("PROMPT_CONTEXT_BUDGET", "CONTEXT_BUDGET")
+    )
+    COMPACT_SOURCES: bool = Field(
+        default=False,
+        description="Compact whitespace, repeated blocks, literal data and generated files in the prompt",
+        validation_alias=AliasChoices("PROMPT_COMPACT_SOURCES", "COMPACT_SOURCES")
+    )
+    RUBRIC_MODE: bool = Field(
+        default=False,
+        description="Evaluate every teacher prompt as a rubric criterion instead of picking one",
+        validation_alias=AliasChoices("PROMPT_RUBRIC_MODE", "RUBRIC_MODE")
+    )
+
+    model_config = SettingsConfigDict(
+        env_prefix=""  # Без префіксу, бо використовуємо AliasChoices
+    )
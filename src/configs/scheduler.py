@@ -0,0 +1,58 @@
+from pathlib import Path
+
+from pydantic import Field, AliasChoices
+from pydantic_settings import SettingsConfigDict
+
+from .base import BaseApplicationConfig
+from .storage import StorageConfig
+
+
+class SchedulerConfig(BaseApplicationConfig):
+    LIVE_CONCURRENCY: int = Field(
+        default=4,
+        description="Live pull request reviews running at the same time in processes sharing the scheduler directory",
+        validation_alias=AliasChoices("SCHEDULER_LIVE_CONCURRENCY")
+    )
+    BULK_CONCURRENCY: int = Field(
+        default=1,
+        description="Bulk re-grade reviews running at the same time in one bulk process",
+        validation_alias=AliasChoices("SCHEDULER_BULK_CONCURRENCY")
+    )
+    DEADLINE_HORIZON: float = Field(
+        default=168.0,
+        description="Deadline distance in hours above which jobs are not prioritised, also used for passed deadlines",
+        validation_alias=AliasChoices("SCHEDULER_DEADLINE_HORIZON")
+    )
+    AGING_RATE: float = Field(
+        default=24.0,
+        description="Hours of priority a queued job gains per hour of waiting",
+        validation_alias=AliasChoices("SCHEDULER_AGING_RATE")
+    )
+    MAX_YIELD: float = Field(
+        default=300.0,
+        description="Seconds bulk work yields to live reviews before one bulk job is started anyway",
+        validation_alias=AliasChoices("SCHEDULER_MAX_YIELD")
+    )
+    SLOT_TTL: float = Field(
+        default=3600.0,
+        description="Seconds after which a live slot of a crashed process is taken over",
+        validation_alias=AliasChoices("SCHEDULER_SLOT_TTL")
+    )
+    DIR: Path | None = Field(
+        default=None,
+        description="Directory with live slots shared between processes and runners, live slots are disabled if None",
+        validation_alias=AliasChoices("SCHEDULER_DIR")
+    )
+
+    model_config = SettingsConfigDict(
+        env_prefix=""  # Без префіксу, бо використовуємо AliasChoices
+    )
+
+    def get_scheduler_dir(self) -> Path:
+        """
+        Get the directory of live slots and metrics, creating it.
+        Without SCHEDULER_DIR only the metrics snapshot is written, to the local cache.
+        """
+        scheduler_dir = self.DIR or StorageConfig().CACHE_DIR / "scheduler"
+        scheduler_dir.mkdir(parents=True, exist_ok=True)
+        return scheduler_dir
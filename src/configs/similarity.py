@@ -0,0 +1,21 @@
+from pydantic import Field, AliasChoices
+from pydantic_settings import SettingsConfigDict
+
+from .base import BaseApplicationConfig
+
+
+class SimilarityConfig(BaseApplicationConfig):
+    ENABLED: bool = Field(
+        default=False,
+        description="Add every reviewed submission to the lab similarity index",
+        validation_alias=AliasChoices("SIMILARITY_ENABLED")
+    )
+    THRESHOLD: float = Field(
+        default=0.5,
+        description="Minimal estimated similarity of a pair to be reported",
+        validation_alias=AliasChoices("SIMILARITY_THRESHOLD")
+    )
+
+    model_config = SettingsConfigDict(
+        env_prefix=""  # Без префіксу, бо використовуємо AliasChoices
+    )
@@ -0,0 +1,26 @@
+from pathlib import Path
+
+from pydantic import Field, AliasChoices
+from pydantic_settings import SettingsConfigDict
+
+from .base import BaseApplicationConfig
+
+
+class StorageConfig(BaseApplicationConfig):
+    CACHE_DIR: Path = Field(
+        default=Path("../.cache"),
+        description="Directory for local caches and ledgers",
+        validation_alias=AliasChoices("AGENT_CACHE_DIR", "CACHE_DIR")
+    )
+
+    model_config = SettingsConfigDict(
+        env_prefix=""  # Без префіксу, бо використовуємо AliasChoices
+    )
+
+    def get_path(self, *parts: str) -> Path:
+        """
+        Get a path inside the cache directory, creating parent directories.
+        """
+        path = self.CACHE_DIR.joinpath(*parts)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
@@ -0,0 +1,29 @@
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+
+class AnalysisFinding(BaseModel):
+    path: str | None = Field(default=None)
+    check: str = Field()
+    severity: Literal["info", "warning", "error"] = Field()
+    message: str = Field()
+
+    def to_line(self) -> str:
+        location = f"{self.path}: " if self.path else ""
+        return f"[{self.severity}] {location}{self.message}"
+
+
+class AnalysisReport(BaseModel):
+    findings: list[AnalysisFinding] = Field(default_factory=list)
+    hard_failure: str | None = Field(default=None, description="Reason to skip the model review")
+
+    @property
+    def errors(self) -> list[AnalysisFinding]:
+        return [finding for finding in self.findings if finding.severity == "error"]
+
+    def summary(self, limit: int = 30) -> str:
+        lines = [finding.to_line() for finding in self.findings[:limit]]
+        if len(self.findings) > limit:
+            lines.append(f"... {len(self.findings) - limit} more findings")
+        return "\n".join(lines)
@@ -0,0 +1,62 @@
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel, Field, field_validator
+
+
+class BulkTarget(BaseModel):
+    lab_name: str = Field()
+    owner: str = Field()
+    repository: str = Field()
+    student: str | None = Field(default=None, description="GitHub nickname from the lab sheet")
+    attempt_time: str | None = Field(default=None, description="Time of the last attempt from the lab sheet")
+    reviewed: bool = Field(default=False, description="The lab sheet already has a bot comment")
+
+    @property
+    def key(self) -> str:
+        return f"{self.owner}/{self.repository}"
+
+
+class BulkFilter(BaseModel):
+    labs: list[str] | None = Field(default=None)
+    students: list[str] | None = Field(default=None)
+    since: datetime | None = Field(default=None, description="Only repositories attempted at or after this time")
+    only: Literal["failed", "unreviewed"] | None = Field(default=None)
+    force: bool = Field(default=False, description="Review even if the head SHA was already reviewed")
+
+    @field_validator("since")
+    @classmethod
+    def check_since(cls, value: datetime | None) -> datetime | None:
+        # Attempt times in the lab sheets are local and have no timezone
+        if value is not None and value.tzinfo is not None:
+            raise ValueError("since must be a local time without a timezone, like the lab sheets")
+        return value
+
+
+class CheckpointEntry(BaseModel):
+    timestamp: str = Field()
+    key: str = Field(description="owner/repository")
+    lab_name: str = Field()
+    head_sha: str | None = Field(default=None)
+    status: Literal["done", "failed"] = Field()
+
+
+class ShardMetrics(BaseModel):
+    lab_name: str = Field()
+    worker: str = Field()
+    started: float = Field(description="Unix time")
+    finished: float = Field(description="Unix time")
+    done: int = Field(default=0)
+    failed: int = Field(default=0)
+    skipped: int = Field(default=0)
+
+    @property
+    def duration(self) -> float:
+        return self.finished - self.started
+
+
+class ShardFailure(BaseModel):
+    lab_name: str = Field()
+    worker: str = Field(description="Worker of the last attempt")
+    attempts: int = Field(default=1)
+    error: str = Field(description="Error of the last attempt")
@@ -0,0 +1,13 @@
+from pydantic import BaseModel, Field
+
+
+class SourceFile(BaseModel):
+    path: str = Field()
+    sha: str | None = Field(default=None, description="Git blob SHA")
+    size: int = Field(default=0, description="Size in bytes")
+    content: str | None = Field(default=None, description="Decoded content, None if the file was skipped")
+    encoding: str | None = Field(default=None)
+    skipped: str | None = Field(default=None, description="Reason the content was not read")
+
+    def summary(self) -> str:
+        return f"{self.path} ({self.skipped}, {self.size} bytes)"
@@ -1,4 +1,9 @@
-from pydantic import BaseModel, Field
+from datetime import datetime, time
+
+from pydantic import BaseModel, Field, field_validator
+
+DEADLINE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H:%M")
+DEADLINE_DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y")
 
 
 class ReviewModel(BaseModel):
@@ -27,3 +32,36 @@ class ReviewModel(BaseModel):
             "Кнопка перевірки ще раз": [self.retry_button]
         }
         return data
+
+
+class LabSettingsModel(BaseModel):
+    lab_name: str = Field()
+    prompts: list[str] = Field(default_factory=list)
+    triage_model: str | None = Field(default=None)
+    review_model: str | None = Field(default=None)
+    triage_threshold: float | None = Field(default=None)
+    compact_sources: bool | None = Field(default=None)
+    deadline: datetime | None = Field(default=None)
+    rubric_mode: bool | None = Field(default=None)
+
+    @field_validator("deadline", mode="before")
+    @classmethod
+    def parse_deadline(cls, value):
+        """Дати з таблиці: ISO або 20.10.2026 23:59, дата без часу означає кінець дня"""
+        if value is None or isinstance(value, datetime):
+            return value
+        value = str(value).strip()
+        for deadline_format in DEADLINE_FORMATS:
+            try:
+                return datetime.strptime(value, deadline_format)
+            except ValueError:
+                continue
+        for deadline_format in DEADLINE_DATE_FORMATS:
+            try:
+                return datetime.combine(datetime.strptime(value, deadline_format), time.max)
+            except ValueError:
+                continue
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"Unknown deadline format: {value}") from None
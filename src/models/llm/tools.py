@@ -1,4 +1,5 @@
-from typing import Any
+import re
+from typing import Any, Literal
 
 import jsonref
 from pydantic import BaseModel, Field
@@ -18,9 +19,23 @@ class ToolCall(BaseModel):
         }
 
 
+class TokenUsage(BaseModel):
+    prompt_tokens: int = Field(default=0)
+    completion_tokens: int = Field(default=0)
+    cached_tokens: int = Field(default=0)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
 class LLMResponse(BaseModel):
     text: str = Field()
     tool_calls: list[ToolCall] = Field(default_factory=list)
+    usage: TokenUsage | None = Field(default=None)
+    model: str | None = Field(default=None)
+    backend: str | None = Field(default=None)
+    latency: float | None = Field(default=None, description="Request latency in seconds")
 
     @property
     def has_tool_calls(self) -> bool:
@@ -65,3 +80,62 @@ class ReviewCodeTool(BaseTool):
     @property
     def message(self) -> str:
         return f"# Коментар\n{self.comment}\n\n# Пропозиції\n{self.suggestions}\n\n# Оцінка: {self.rating}"
+
+
+class CriterionScoreTool(BaseTool):
+    """
+    Evaluate the student submission against the given rubric criterion only.
+    """
+    score: float = Field(..., description="How well the criterion is met. On a scale from 1 to 5")
+    comment: str = Field(..., description="One or two sentences about the criterion")
+    suggestion: str = Field(
+        default="", description="The most important improvement for the criterion, empty if none"
+    )
+
+
+class FileSummaryTool(BaseTool):
+    """
+    Summarise a source file for a reviewer who won't see its full text.
+    """
+    summary: str = Field(
+        ..., description="What the file does, its public functions and classes and notable problems, in 3-5 sentences"
+    )
+
+
+class RubricCriterion(BaseModel):
+    text: str = Field()
+    weight: float = Field(default=1.0)
+
+    @classmethod
+    def parse(cls, prompt: str) -> "RubricCriterion":
+        """
+        Parse a teacher prompt, a leading weight in brackets like `[2] ...` sets the weight of the criterion.
+        """
+        match = re.match(r"\s*\[(\d+(?:\.\d+)?)]\s*", prompt)
+        if match:
+            return cls(text=prompt[match.end():].strip(), weight=float(match.group(1)))
+        return cls(text=prompt.strip())
+
+    @property
+    def title(self) -> str:
+        line = self.text.splitlines()[0] if self.text else ""
+        return line if len(line) <= 80 else f"{line[:77]}..."
+
+    def to_message(self) -> dict[str, str]:
+        return {
+            "role": "system",
+            "content": f"Rubric criterion: {self.text}",
+        }
+
+
+class TriageTool(BaseTool):
+    """
+    Classify a student submission before the full review.
+    Use "empty" when there is no meaningful code, "off_topic" when the code doesn't address the assignment,
+    "incomplete" when the solution is obviously unfinished and "full_review" otherwise.
+    """
+    verdict: Literal["empty", "off_topic", "incomplete", "full_review"] = Field(
+        ..., description="Submission class"
+    )
+    confidence: float = Field(..., description="Confidence in the verdict. On a scale from 0 to 1")
+    reason: str = Field(..., description="Short explanation of the verdict for the student")
@@ -0,0 +1,20 @@
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+
+
+class ReviewJob(BaseModel):
+    key: str = Field(description="owner/repository")
+    lab_name: str | None = Field(default=None)
+    deadline: datetime | None = Field(default=None, description="Deadline of the lab")
+    enqueued: float = Field(default=0.0, description="Monotonic time the job was queued")
+
+
+class QueueMetrics(BaseModel):
+    queued: int = Field(default=0, description="Current queue depth")
+    running: int = Field(default=0)
+    max_queued: int = Field(default=0)
+    completed: int = Field(default=0)
+    mean_wait: float = Field(default=0.0, description="Seconds between queueing and start")
+    p95_wait: float = Field(default=0.0)
+    max_wait: float = Field(default=0.0)
@@ -0,0 +1,18 @@
+from pydantic import BaseModel, Field
+
+
+class UsageRecord(BaseModel):
+    timestamp: str = Field()
+    lab_name: str | None = Field(default=None)
+    student: str | None = Field(default=None)
+    model: str = Field()
+    backend: str | None = Field(default=None)
+    prompt_tokens: int = Field(default=0)
+    completion_tokens: int = Field(default=0)
+    cached_tokens: int = Field(default=0)
+    latency: float = Field(default=0.0, description="Request latency in seconds")
+    cost: float = Field(default=0.0, description="Estimated cost in USD")
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
@@ -1,103 +1,357 @@
 """
 This is the main runner file that will be executed by the GitHub action.
 """
+import argparse
+from datetime import datetime
+from pathlib import Path
+
 import pandas as pd
 from loguru import logger
 
+from clients.cassette import Cassette
+from configs.analysis import AnalysisConfig
+from configs.bulk import BulkConfig
+from configs.cassette import CassetteConfig
 from configs.github import GitHubConfig
+from configs.memo import MemoConfig
+from configs.prompt import PromptConfig
+from configs.similarity import SimilarityConfig
 from services.ai.service import AiRequest
+from services.bulk.service import BulkRunner
+from services.bulk.shard import ShardCoordinator
+from services.analysis.service import StaticAnalyzer
 from services.git.service import GitHub
+from services.memo.service import FileMemo
 from services.google.service import GoogleSheet
 from services.prompt.service import PromptGenerator
+from services.scheduler.service import LiveSlots
+from services.similarity.service import SimilarityIndex
 from services.student_variant.service import StudentVariant
+from services.template.service import TemplateBaseline, fingerprint
+from services.usage.service import UsageLedger
+from models.analysis.entity import AnalysisReport
+from models.bulk.entity import BulkFilter
 from models.llm.tools import ReviewCodeTool
+from utils.helpers.logging import log_summary, measure_overhead, setup_logging
+from utils.helpers.stages import StageGraph
 
 
-def run(owner: str, repository: str) -> bool:
+def run(owner: str, repository: str, google_client: GoogleSheet | None = None) -> bool:
     """
     This function is the main entry point for the application.
     :param owner: GitHub repository owner
     :param repository: GitHub repository name
+    :param google_client: Shared Google Sheets service of a bulk run, a new one if None
     :return: True if the process completes successfully, False otherwise
     """
-    try:
-        git_client = GitHub(owner=owner, repo=repository)
-        files = git_client.get_pr_files_content()
-
-        google_client = GoogleSheet()
-        students_variant: pd.DataFrame = google_client.get_variants_sheet()
-        students_roster: pd.DataFrame = google_client.get_roster_sheet()
-
-        lab_name = git_client.get_lab_name(all_lab_names=google_client.get_all_lab_names())
-        pr_creator = git_client.get_student(lab_name=lab_name)
-        if pr_creator not in google_client.get_all_nicknames():
-            logger.error(f"Student with nickname {pr_creator} not found in the roster sheet.")
-            git_client.comment_pr(
-                comment="Будь ласка, підв'яжіть свій акаунт на GitHub classroom та зверніться до адміністатора для оновлення інформації. Дякую!",
-                pull_number=git_client.get_last_pr_number())
-            return False
+    with logger.contextualize(repo=f"{owner}/{repository}"):
+        try:
+            google_client = google_client or GoogleSheet()
+            prompt_config = PromptConfig()
 
-        student = StudentVariant(
-            student_username=pr_creator,
-            readme_variants=files.get("README.md", ""),
-            variants_sheet=students_variant,
-            roster_sheet=students_roster
-        )
+            def get_lab_name(git_client: GitHub, _prompts: pd.DataFrame) -> str:
+                return git_client.get_lab_name(all_lab_names=google_client.get_all_lab_names())
 
-        files.pop("README.md", None)
+            def provision_sheet(lab_name: str, _prompts: pd.DataFrame, registered: bool) -> None:
+                # Pull requests of unregistered students or unknown labs must not create sheets
+                if not registered:
+                    return
+                if lab_name not in google_client.get_all_lab_names():
+                    logger.warning(f"Lab {lab_name} is not in the prompts sheet, its sheet is not provisioned")
+                    return
+                try:
+                    google_client.provision_lab_sheets([lab_name])
+                except Exception as e:
+                    logger.error(f"An error occurred while provisioning the lab sheet: {e}")
 
-        lab_prompt = google_client.get_teacher_prompts(name=lab_name)
+            def analyze(sources: dict[str, str], registered: bool) -> AnalysisReport | None:
+                if not registered or not AnalysisConfig().ENABLED:
+                    return None
+                return StaticAnalyzer().analyze(sources)
 
-        prompt_service = PromptGenerator(
-            student_assignment=student.student_assignment,
-            context_prompt=files,
-            teacher_prompts=lab_prompt
-        )
+            def get_template(git_client: GitHub, registered: bool) -> dict[str, dict[str, str]] | None:
+                if not registered or not (prompt_config.TEMPLATE_BASELINE or MemoConfig().ENABLED):
+                    return None
+                try:
+                    return TemplateBaseline(git_client).get_template_files()
+                except Exception as e:
+                    logger.warning(f"Couldn't load the template repository, sending all files: {e}")
+                    return None
 
-        context = prompt_service.get_prompt()
+            def subtract_template(
+                    git_client: GitHub,
+                    sources: dict[str, str],
+                    template_files: dict[str, dict[str, str]] | None
+            ) -> tuple[dict[str, str], list[str] | None]:
+                if not template_files or not prompt_config.TEMPLATE_BASELINE:
+                    return sources, None
+                baseline = TemplateBaseline(git_client)
+                return baseline.subtract(sources, template_files), baseline.unchanged_files
 
-        ai_client = AiRequest()
-        response: ReviewCodeTool = ai_client.send_message(context=context)
+            def summarize_files(
+                    git_client: GitHub,
+                    sources: dict[str, str],
+                    template_files: dict[str, dict[str, str]] | None,
+                    lab_name: str,
+                    pr_creator: str,
+                    registered: bool
+            ) -> dict[str, str]:
+                memo_config = MemoConfig()
+                if not registered or not memo_config.ENABLED:
+                    return {}
+                summarize = None
+                if memo_config.SUMMARY_MODEL:
+                    ai_client = AiRequest()
 
-        git_client.comment_pr(
-            comment=response.message,
-            pull_number=git_client.get_last_pr_number()
-        )
+                    def summarize(path: str, content: str) -> str:
+                        return ai_client.summarize_file(
+                            path, content, model=memo_config.SUMMARY_MODEL, lab_name=lab_name, student=pr_creator
+                        )
+                template_files = template_files or {}
+                template_paths = {
+                    path for path, content in sources.items()
+                    if path in template_files and template_files[path]["hash"] == fingerprint(content)
+                }
+                try:
+                    return FileMemo(lab_name).get_summaries(
+                        pr_creator, sources, git_client.blob_shas, summarize, template_paths
+                    )
+                except Exception as e:
+                    logger.error(f"An error occurred while reading the file memo: {e}")
+                    return {}
 
-        google_client.leave_response(
-            student_variant=student,
-            student_name=student.student_real_name,
-            sheet_name=lab_name,
-            ai_response=response.message,
-            last_pr_link=git_client.get_last_pr_link(),
-            prompt=prompt_service.context,
-            summary=f"{response.rating}/5.0"
-        )
-        return True
+            # The GitHub fetch and the sheet reads don't depend on each other and run concurrently
+            stages = StageGraph()
+            stages.add("git_client", lambda: GitHub(owner=owner, repo=repository))
+            stages.add("files", lambda git_client: git_client.get_pr_files_content(), "git_client")
+            stages.add("variants", google_client.get_variants_sheet)
+            stages.add("roster", google_client.get_roster_sheet)
+            stages.add("nicknames", google_client.get_all_nicknames)
+            stages.add("prompts", google_client.get_prompts_sheet)
+            stages.add("lab_name", get_lab_name, "git_client", "prompts")
+            stages.add(
+                "pr_creator",
+                lambda git_client, lab_name: git_client.get_student(lab_name=lab_name),
+                "git_client", "lab_name"
+            )
+            stages.add("registered", lambda pr_creator, nicknames: pr_creator in nicknames, "pr_creator", "nicknames")
+            stages.add("sheet_ready", provision_sheet, "lab_name", "prompts", "registered")
+            stages.add(
+                "lab_settings",
+                lambda lab_name, _prompts: google_client.get_lab_settings(name=lab_name),
+                "lab_name", "prompts"
+            )
+            stages.add(
+                "sources",
+                lambda files: {path: content for path, content in files.items() if path != "README.md"},
+                "files"
+            )
+            stages.add("report", analyze, "sources", "registered")
+            # Loaded once for both the baseline and the file memo
+            stages.add("template", get_template, "git_client", "registered")
+            stages.add("baseline", subtract_template, "git_client", "sources", "template")
+            stages.add(
+                "summaries", summarize_files,
+                "git_client", "sources", "template", "lab_name", "pr_creator", "registered"
+            )
+            results = stages.run()
 
-    except Exception as e:
-        logger.exception(f"An error occurred: {e}")
-        return False
+            git_client: GitHub = results["git_client"]
+            lab_name: str = results["lab_name"]
+            pr_creator: str = results["pr_creator"]
+            if not results["registered"]:
+                logger.error(f"Student with nickname {pr_creator} not found in the roster sheet.")
+                git_client.comment_pr(
+                    comment="Будь ласка, підв'яжіть свій акаунт на GitHub classroom та зверніться до адміністатора для оновлення інформації. Дякую!",
+                    pull_number=git_client.last_pr_number)
+                return False
 
+            student = StudentVariant(
+                student_username=pr_creator,
+                readme_variants=results["files"].get("README.md", ""),
+                variants_sheet=results["variants"],
+                roster_sheet=results["roster"]
+            )
 
-def bulk_update():
-    google_client = GoogleSheet()
-    lab_names = google_client.get_all_lab_names()
-    repositories = []
-    for name in lab_names:
-        repositories.extend(google_client.get_all_repositories(sheet_name=name))
+            report: AnalysisReport | None = results["report"]
+            files, unchanged_files = results["baseline"]
+            lab_settings = results["lab_settings"]
 
-    for owner, repository in repositories:
-        run(owner=owner, repository=repository)
+            seeds = {"lab": lab_name, "student": f"{lab_name}/{pr_creator}"}
+            prompt_service = PromptGenerator(
+                student_assignment=student.student_assignment,
+                context_prompt=files,
+                teacher_prompts=lab_settings.prompts,
+                seed=seeds.get(prompt_config.SELECTION_SEED),
+                cache_friendly=prompt_config.CACHE_FRIENDLY_LAYOUT,
+                unchanged_files=unchanged_files,
+                rank_files=prompt_config.RANK_FILES,
+                context_budget=prompt_config.CONTEXT_BUDGET,
+                analysis_summary=report.summary() if report else None,
+                skipped_files=[file.summary() for file in git_client.skipped_files],
+                compact_sources=(
+                    prompt_config.COMPACT_SOURCES if lab_settings.compact_sources is None
+                    else lab_settings.compact_sources
+                ),
+                file_summaries=results["summaries"]
+            )
 
+            rubric_mode = prompt_config.RUBRIC_MODE if lab_settings.rubric_mode is None else lab_settings.rubric_mode
+            # A single teacher prompt is reviewed as before, the rubric needs several criteria
+            rubric = prompt_service.get_rubric() if rubric_mode else []
+            if len(rubric) < 2:
+                rubric = []
+            context = prompt_service.get_prompt(rubric=rubric)
 
-if __name__ == "__main__":
-    # To run the process for all repositories, uncomment the line below
-    # bulk_update()
+            if report and report.hard_failure:
+                logger.warning(f"Skipping the model review: {report.hard_failure}")
+                response: ReviewCodeTool = StaticAnalyzer.get_failure_review(report)
+            else:
+                ai_client = AiRequest()
+                response = ai_client.review(
+                    context=context,
+                    lab_settings=lab_settings,
+                    cache_key=lab_name if prompt_config.CACHE_FRIENDLY_LAYOUT else None,
+                    lab_name=lab_name,
+                    student=pr_creator,
+                    rubric=rubric
+                )
+
+            def update_similarity() -> None:
+                try:
+                    SimilarityIndex(lab_name).update(pr_creator, files)
+                except Exception as e:
+                    logger.error(f"An error occurred while updating the similarity index: {e}")
+
+            # The PR comment, the sheet write-back and the similarity index are independent
+            stages = StageGraph()
+            stages.add("comment", lambda: git_client.comment_pr(
+                comment=response.message,
+                pull_number=git_client.last_pr_number
+            ))
+            stages.add("sheet", lambda: google_client.leave_response(
+                student_variant=student,
+                student_name=student.student_real_name,
+                sheet_name=lab_name,
+                ai_response=response.message,
+                last_pr_link=git_client.get_last_pr_link(),
+                prompt=prompt_service.context,
+                summary=f"{response.rating}/5.0"
+            ))
+            if SimilarityConfig().ENABLED:
+                stages.add("similarity", update_similarity)
+            stages.run()
+            return True
+
+        except Exception as e:
+            logger.exception(f"An error occurred: {e}")
+            return False
+
+
+def bulk_update(
+        bulk_filter: BulkFilter | None = None,
+        workers: int | None = None,
+        shard_dir: Path | None = None,
+        run_id: str | None = None
+) -> dict[str, int]:
+    """
+    Re-grade repositories of all labs, resuming from the checkpoint journal.
+    With more than one worker the labs are sharded across processes, see ShardCoordinator.
+    :param bulk_filter: Labs, students, date and state filters
+    :param workers: Number of worker processes, BULK_WORKERS if None
+    :param shard_dir: Directory shared between machines, BULK_SHARD_DIR if None
+    :param run_id: Identifier shared by the machines of one run, a new run if None
+    :return: Number of done, failed and skipped repositories
+    """
+    bulk_filter = bulk_filter or BulkFilter()
+    workers = workers or BulkConfig().WORKERS
+    sharded = workers > 1 or shard_dir is not None or run_id is not None
+    # The cassette patches HTTP clients of this process only, spawned workers would go to the network
+    if sharded and CassetteConfig().MODE != "off":
+        raise ValueError("Sharded bulk runs can't be recorded or replayed, run them with CASSETTE_MODE=off")
 
-    _owner, _repo = GitHubConfig().REPOSITORY.split("/")
-    success = run(owner=_owner, repository=_repo)
+    google_client = GoogleSheet(buffered=True)
+    bulk_runner = BulkRunner(run=run, google_client=google_client)
+    lab_names = bulk_runner.get_lab_names(bulk_filter)
+    google_client.provision_lab_sheets(lab_names)
+
+    if sharded:
+        coordinator = ShardCoordinator(workers=workers, shard_dir=shard_dir, run_id=run_id)
+        metrics = coordinator.run(run=run, bulk_filter=bulk_filter, lab_names=lab_names)
+        stats = {
+            status: sum(getattr(shard, status) for shard in metrics)
+            for status in ("done", "failed", "skipped")
+        }
+        # A shard that used up its attempts counts as one failure, so the run exits as failed
+        stats["failed"] += len(coordinator.failures)
+    else:
+        stats = bulk_runner.run(bulk_filter)
+
+    google_client.write_usage_summary(UsageLedger().summarize())
+
+    if SimilarityConfig().ENABLED:
+        for name in lab_names:
+            google_client.write_similarity(name, SimilarityIndex(name).best_matches())
+    return stats
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pull Request agent")
+    subparsers = parser.add_subparsers(dest="command")
+
+    bulk = subparsers.add_parser("bulk", help="Re-grade repositories listed in the lab sheets")
+    bulk.add_argument("--lab", action="append", dest="labs", help="Lab name, can be repeated")
+    bulk.add_argument("--student", action="append", dest="students", help="GitHub nickname, can be repeated")
+    bulk.add_argument(
+        "--since",
+        type=datetime.fromisoformat,
+        help="Only repositories with the last attempt at or after this date, e.g. 2025-09-01 or 2025-09-01T12:00"
+    )
+    bulk.add_argument("--only", choices=["failed", "unreviewed"], help="Only failed or unreviewed repositories")
+    bulk.add_argument("--force", action="store_true", help="Review even if the head SHA was already reviewed")
+    bulk.add_argument("--workers", type=int, help="Number of worker processes, one lab sheet per worker at a time")
+    bulk.add_argument("--shard-dir", type=Path, help="Directory with shard leases shared between machines")
+    bulk.add_argument(
+        "--run-id",
+        help="Identifier shared by the machines of one run, pass the id of an interrupted run to resume it"
+    )
+
+    subparsers.add_parser("migrate-prompts", help="Move full prompts from lab sheets into the prompt registry")
+    subparsers.add_parser("provision-sheets", help="Create missing lab sheets from the template sheet")
+    subparsers.add_parser("log-overhead", help="Measure the time of logging calls with the configured sinks")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    setup_logging(run_id=getattr(args, "run_id", None), bulk=args.command == "bulk")
+    # CASSETTE_MODE=record|replay captures or replays all HTTP traffic of the run
+    with Cassette.from_config():
+        if args.command == "bulk":
+            bulk_stats = bulk_update(BulkFilter(
+                labs=args.labs,
+                students=args.students,
+                since=args.since,
+                only=args.only,
+                force=args.force
+            ), workers=args.workers, shard_dir=args.shard_dir, run_id=args.run_id)
+            success = not bulk_stats["failed"]
+        elif args.command == "migrate-prompts":
+            GoogleSheet().migrate_prompts()
+            success = True
+        elif args.command == "provision-sheets":
+            GoogleSheet().provision_lab_sheets()
+            success = True
+        elif args.command == "log-overhead":
+            measure_overhead()
+            success = True
+        else:
+            _owner, _repo = GitHubConfig().REPOSITORY.split("/")
+            # Waits for a live slot, bulk runs sharing SCHEDULER_DIR yield to it
+            with LiveSlots().hold(GitHubConfig().REPOSITORY):
+                success = run(owner=_owner, repository=_repo)
     if success:
         logger.info("Process completed successfully.")
     else:
         logger.error("Process failed.")
+    log_summary()
@@ -1,15 +1,113 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
 from loguru import logger
 
-from clients.openai import OpenAIClient
-from models.llm.tools import ReviewCodeTool
+from clients.router import LLMRouter
+from configs.openai import OpenAIConfig
+from models.google.entity import LabSettingsModel
+from models.llm.tools import (
+    CriterionScoreTool,
+    FileSummaryTool,
+    LLMResponse,
+    ReviewCodeTool,
+    RubricCriterion,
+    TokenUsage,
+    TriageTool,
+)
+from services.usage.service import UsageLedger
+from utils.helpers.tokens import estimate_tokens
 
 
 class AiRequest:
-    def __init__(self):
-        self.client = OpenAIClient()
+    TRIAGE_CONTEXT_LIMIT = 4000
+    SUMMARY_CONTEXT_LIMIT = 20000
+    RUBRIC_RETRIES = 1
+    TRIAGE_REVIEWS = {
+        "empty": ReviewCodeTool(
+            comment="Pull Request не містить коду для перевірки.",
+            suggestions="Додайте розв'язок завдання в репозиторій та оновіть Pull Request.",
+            rating=1,
+        ),
+        "off_topic": ReviewCodeTool(
+            comment="Код не відповідає завданню вашого варіанту.",
+            suggestions="Перевірте номер варіанту та умову завдання і оновіть Pull Request.",
+            rating=1,
+        ),
+        "incomplete": ReviewCodeTool(
+            comment="Розв'язок очевидно неповний.",
+            suggestions="Завершіть реалізацію всіх пунктів завдання та оновіть Pull Request.",
+            rating=2,
+        ),
+    }
+
+    def __init__(self, ledger: UsageLedger | None = None):
+        self.client = LLMRouter()
+        self.config = OpenAIConfig()  # type: ignore
+        self.ledger = ledger or UsageLedger()
+        self.last_usage: TokenUsage | None = None
+
+    def record_usage(self, response: LLMResponse, lab_name: str | None, student: str | None) -> None:
+        try:
+            self.ledger.record(response, lab_name=lab_name, student=student)
+        except Exception as e:
+            logger.error(f"Error recording token usage: {e}")
+
+    def get_discarded_handler(self, lab_name: str | None, student: str | None) -> Callable[[LLMResponse], None]:
+        """
+        Record responses of hedged requests that lost, their tokens count towards the lab budget too.
+        """
+        return lambda response: self.record_usage(response, lab_name, student)
+
+    def select_model(
+            self,
+            context: list[dict[str, str]],
+            lab_name: str | None = None,
+            model: str | None = None
+    ) -> str:
+        """
+        Select the model for a request, falling back to the cheaper model
+        when the request would push the lab over its token budget.
+        """
+        model = model or self.config.MODEL
+        budget = self.config.LAB_TOKEN_BUDGET
+        if not budget or not lab_name:
+            return model
+
+        estimated_tokens = sum(estimate_tokens(message["content"]) for message in context)
+        spent = self.ledger.get_lab_tokens(lab_name)
+        if spent + estimated_tokens <= budget:
+            return model
+
+        if not self.config.FALLBACK_MODEL:
+            logger.warning(f"Lab {lab_name} is over its token budget ({spent}/{budget}) and no fallback model is set")
+            return model
+
+        logger.warning(
+            f"Lab {lab_name} would exceed its token budget ({spent}+{estimated_tokens}/{budget}), "
+            f"falling back to {self.config.FALLBACK_MODEL}"
+        )
+        return self.config.FALLBACK_MODEL
+
+    def send_message(
+            self,
+            context: list[dict[str, str]],
+            cache_key: str | None = None,
+            lab_name: str | None = None,
+            student: str | None = None,
+            model: str | None = None
+    ) -> ReviewCodeTool:
+        model = self.select_model(context, lab_name=lab_name, model=model)
+        response = self.client.send_message(
+            context,
+            tools=[ReviewCodeTool],
+            cache_key=cache_key,
+            model=model,
+            on_discarded=self.get_discarded_handler(lab_name, student)
+        )
+        self.last_usage = response.usage
+        self.record_usage(response, lab_name, student)
 
-    def send_message(self, context: list[dict[str, str]]) -> ReviewCodeTool:
-        response = self.client.send_message(context, tools=[ReviewCodeTool])
         tool_call = response.tool_calls[0].tool_input
 
         try:
@@ -17,3 +115,218 @@ class AiRequest:
         except Exception as e:
             logger.error(f"Error parsing review: {e}")
             raise
+
+    def triage(
+            self,
+            context: list[dict[str, str]],
+            model: str,
+            lab_name: str | None = None,
+            student: str | None = None
+    ) -> TriageTool:
+        """
+        Classify a submission with a small model.
+        Long messages are truncated, the verdict doesn't need the full code.
+        """
+        limit = self.TRIAGE_CONTEXT_LIMIT
+        truncated = [
+            {**message, "content": message["content"][:limit]}
+            for message in context
+        ]
+        response = self.client.send_message(
+            truncated,
+            tools=[TriageTool],
+            model=model,
+            on_discarded=self.get_discarded_handler(lab_name, student)
+        )
+        self.record_usage(response, lab_name, student)
+
+        triage = TriageTool.model_validate(response.tool_calls[0].tool_input)
+        logger.info(f"Triage verdict: {triage.verdict} ({triage.confidence:.2f}) - {triage.reason}")
+        return triage
+
+    def summarize_file(
+            self,
+            path: str,
+            content: str,
+            model: str,
+            lab_name: str | None = None,
+            student: str | None = None
+    ) -> str:
+        """
+        Summarise a file for the file memo, long files are truncated.
+        """
+        response = self.client.send_message(
+            [{"role": "user", "content": f"File: {path}\n{content[:self.SUMMARY_CONTEXT_LIMIT]}"}],
+            tools=[FileSummaryTool],
+            model=model,
+            on_discarded=self.get_discarded_handler(lab_name, student)
+        )
+        self.record_usage(response, lab_name, student)
+        return FileSummaryTool.model_validate(response.tool_calls[0].tool_input).summary
+
+    def score_criterion(
+            self,
+            context: list[dict[str, str]],
+            criterion: RubricCriterion,
+            model: str,
+            cache_key: str | None = None,
+            lab_name: str | None = None,
+            student: str | None = None
+    ) -> tuple[CriterionScoreTool, TokenUsage | None]:
+        response = self.client.send_message(
+            [*context, criterion.to_message()],
+            tools=[CriterionScoreTool],
+            cache_key=cache_key,
+            model=model,
+            on_discarded=self.get_discarded_handler(lab_name, student)
+        )
+        self.record_usage(response, lab_name, student)
+        return CriterionScoreTool.model_validate(response.tool_calls[0].tool_input), response.usage
+
+    @staticmethod
+    def aggregate_rubric(
+            scores: list[tuple[RubricCriterion, CriterionScoreTool]],
+            missing: list[RubricCriterion] | None = None
+    ) -> ReviewCodeTool:
+        """
+        Merge criterion scores into one review with the weighted mean rating.
+        :param missing: Criteria that couldn't be scored, the review says the rating leaves them out
+        """
+        total_weight = sum(criterion.weight for criterion, _ in scores) or 1.0
+        rating = sum(criterion.weight * min(max(score.score, 1.0), 5.0) for criterion, score in scores) / total_weight
+        comment = "\n".join(
+            f"- **{criterion.title}** ({score.score:g}/5): {score.comment}" for criterion, score in scores
+        )
+        if missing:
+            titles = ", ".join(f"**{criterion.title}**" for criterion in missing)
+            comment += f"\n\nНе вдалося оцінити критерії: {titles}. Оцінка враховує лише оцінені критерії."
+        return ReviewCodeTool(
+            comment=comment,
+            suggestions="\n".join(
+                f"- **{criterion.title}**: {score.suggestion}"
+                for criterion, score in scores if score.suggestion.strip()
+            ) or "-",
+            rating=round(rating, 1),
+        )
+
+    def evaluate_rubric(
+            self,
+            context: list[dict[str, str]],
+            rubric: list[RubricCriterion],
+            cache_key: str | None = None,
+            lab_name: str | None = None,
+            student: str | None = None,
+            model: str | None = None
+    ) -> ReviewCodeTool:
+        """
+        Score every rubric criterion concurrently.
+        All requests share the same context prefix and the criterion goes last,
+        so the provider caches the prefix and the wall time stays close to a single request.
+        A failed criterion is retried RUBRIC_RETRIES times, one that still fails is left out of the rating
+        and named in the review.
+        :param context: Shared prefix built by PromptGenerator.get_prompt(rubric=...)
+        """
+        model = self.select_model(context, lab_name=lab_name, model=model)
+        # Requests of one student share the prefix, the key routes them to the same cache
+        cache_key = cache_key or f"{lab_name}/{student}"
+        workers = max(1, min(len(rubric), self.config.RUBRIC_CONCURRENCY))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rubric") as executor:
+            futures = [
+                executor.submit(self.score_criterion, context, criterion, model, cache_key, lab_name, student)
+                for criterion in rubric
+            ]
+
+        results: dict[int, tuple[CriterionScoreTool, TokenUsage | None]] = {}
+        errors: dict[int, Exception] = {}
+        for index, future in enumerate(futures):
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                errors[index] = e
+
+        # Every backend was already tried by the router, what is left is mostly transient
+        for attempt in range(1, self.RUBRIC_RETRIES + 1):
+            for index in list(errors):
+                logger.warning(f"Rubric criterion '{rubric[index].title}' failed, retry {attempt}: {errors[index]}")
+                try:
+                    results[index] = self.score_criterion(context, rubric[index], model, cache_key, lab_name, student)
+                    del errors[index]
+                except Exception as e:
+                    errors[index] = e
+
+        missing = [rubric[index] for index in sorted(errors)]
+        for index in sorted(errors):
+            logger.error(f"Rubric criterion '{rubric[index].title}' failed: {errors[index]}")
+        if not results:
+            raise RuntimeError(f"All {len(rubric)} rubric criteria failed")
+
+        scores = []
+        usage = TokenUsage()
+        for index in sorted(results):
+            score, criterion_usage = results[index]
+            scores.append((rubric[index], score))
+            if criterion_usage:
+                usage = TokenUsage(
+                    prompt_tokens=usage.prompt_tokens + criterion_usage.prompt_tokens,
+                    completion_tokens=usage.completion_tokens + criterion_usage.completion_tokens,
+                    cached_tokens=usage.cached_tokens + criterion_usage.cached_tokens,
+                )
+
+        self.last_usage = usage
+        review = self.aggregate_rubric(scores, missing)
+        log = logger.warning if missing else logger.info
+        log(
+            f"Rubric: {len(scores)}/{len(rubric)} criteria scored, rating {review.rating}, "
+            f"{usage.cached_tokens}/{usage.prompt_tokens} prompt tokens cached"
+            + (f", missing: {[criterion.title for criterion in missing]}" if missing else "")
+        )
+        return review
+
+    def review(
+            self,
+            context: list[dict[str, str]],
+            lab_settings: LabSettingsModel | None = None,
+            cache_key: str | None = None,
+            lab_name: str | None = None,
+            student: str | None = None,
+            rubric: list[RubricCriterion] | None = None
+    ) -> ReviewCodeTool:
+        """
+        Review a submission with the model cascade.
+        A small model triages the submission first, and only submissions that need a full review
+        are sent to the review model. The rest get a templated review.
+        Models and the threshold come from the lab settings, falling back to the global configuration.
+        :param rubric: Evaluate these criteria concurrently instead of one review request
+        """
+        lab_settings = lab_settings or LabSettingsModel(lab_name=lab_name or "")
+        triage_model = lab_settings.triage_model or self.config.TRIAGE_MODEL
+        threshold = lab_settings.triage_threshold
+        if threshold is None:
+            threshold = self.config.TRIAGE_THRESHOLD
+
+        if triage_model:
+            try:
+                triage = self.triage(context, model=triage_model, lab_name=lab_name, student=student)
+                if triage.verdict in self.TRIAGE_REVIEWS and triage.confidence >= threshold:
+                    template = self.TRIAGE_REVIEWS[triage.verdict]
+                    return template.model_copy(update={"comment": f"{template.comment}\n\n{triage.reason}"})
+            except Exception as e:
+                logger.error(f"Triage failed, falling back to the full review: {e}")
+
+        if rubric:
+            return self.evaluate_rubric(
+                context,
+                rubric,
+                cache_key=cache_key,
+                lab_name=lab_name,
+                student=student,
+                model=lab_settings.review_model
+            )
+
+        return self.send_message(
+            context,
+            cache_key=cache_key,
+            lab_name=lab_name,
+            student=student,
+            model=lab_settings.review_model
+        )
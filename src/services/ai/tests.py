@@ -1,3 +1,89 @@
 """
 Implement tests for the AI service. It might cost money to run the tests, so be careful.
+The tests below use a fake LLM client and make no requests.
 """
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("OPENAI_MODEL", "test-model")
+
+from models.llm.tools import LLMResponse, RubricCriterion, ToolCall
+from services.ai.service import AiRequest
+from services.usage.service import UsageLedger
+
+
+class FakeClient:
+    """
+    LLM client that scores criteria by their text and fails the given number of times per criterion
+    """
+
+    def __init__(self, failures: dict[str, int]):
+        self.failures = dict(failures)
+
+    def send_message(self, messages, tools=None, cache_key=None, model=None, on_discarded=None) -> LLMResponse:
+        criterion = messages[-1]["content"]
+        for text, count in self.failures.items():
+            if text in criterion and count:
+                self.failures[text] -= 1
+                raise RuntimeError("All LLM backends failed")
+        score = 5 if "tests" in criterion else 3
+        tool_input = {"score": score, "comment": "ok", "suggestion": ""}
+        tool_call = ToolCall(tool_name="CriterionScoreTool", tool_input=tool_input, tool_id="1")
+        return LLMResponse(text="", tool_calls=[tool_call])
+
+
+class RubricTest(unittest.TestCase):
+    """
+    Testing rubric evaluation with failing criteria
+    """
+
+    def setUp(self):
+        """
+        Setup the rubric
+        :return:
+        """
+        self.rubric = [RubricCriterion(text="Code has tests"), RubricCriterion(text="Code is readable")]
+        self.ledger = UsageLedger(Path(tempfile.mkdtemp()) / "usage.jsonl")
+
+    def evaluate(self, failures: dict[str, int]):
+        ai_request = AiRequest(ledger=self.ledger)
+        ai_request.client = FakeClient(failures)
+        return ai_request.evaluate_rubric([{"role": "user", "content": "code"}], self.rubric, lab_name="lab1")
+
+    def test_all_criteria_scored(self):
+        """
+        The rating is the mean of the criterion scores
+        :return:
+        """
+        review = self.evaluate({})
+        self.assertEqual(review.rating, 4.0)
+        self.assertNotIn("Не вдалося", review.comment)
+
+    def test_failed_criterion_is_retried(self):
+        """
+        A criterion that fails once is scored by the retry
+        :return:
+        """
+        review = self.evaluate({"readable": 1})
+        self.assertEqual(review.rating, 4.0)
+
+    def test_missing_criterion_is_reported(self):
+        """
+        A criterion that keeps failing is left out of the rating and named in the review
+        :return:
+        """
+        review = self.evaluate({"readable": 5})
+        self.assertEqual(review.rating, 5.0)
+        self.assertIn("Не вдалося оцінити критерії: **Code is readable**", review.comment)
+
+    def test_all_criteria_failed(self):
+        """
+        A rubric without any scored criterion is an error
+        :return:
+        """
+        with self.assertRaises(RuntimeError):
+            self.evaluate({"tests": 5, "readable": 5})
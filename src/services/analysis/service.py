@@ -0,0 +1,252 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+from typing import Callable
+
+from loguru import logger
+
+from configs.analysis import AnalysisConfig
+from models.analysis.entity import AnalysisFinding, AnalysisReport
+from models.llm.tools import ReviewCodeTool
+
+Check = Callable[[str, str, float], list[AnalysisFinding]]
+
+SOURCE_LANGUAGES = {
+    ".py": "Python",
+    ".c": "C",
+    ".h": "C",
+    ".cpp": "C++",
+    ".cc": "C++",
+    ".cxx": "C++",
+    ".hpp": "C++",
+    ".java": "Java",
+    ".cs": "C#",
+    ".js": "JavaScript",
+    ".ts": "TypeScript",
+    ".go": "Go",
+    ".rs": "Rust",
+    ".kt": "Kotlin",
+    ".php": "PHP",
+    ".rb": "Ruby",
+    ".swift": "Swift",
+    ".html": "HTML",
+    ".css": "CSS",
+    ".sql": "SQL",
+}
+COMMENT_PATTERN = re.compile(r"//.*?$|/\*.*?\*/|#.*?$", re.DOTALL | re.MULTILINE)
+# Diagnostics that only mean the file depends on other files of the project
+INCONCLUSIVE_PATTERN = re.compile(
+    r"No such file or directory|cannot find symbol|package .+ does not exist|"
+    r"should be declared in a file named",
+)
+
+CHECKS: dict[str, list[Check]] = {}
+
+
+def register_check(*extensions: str) -> Callable[[Check], Check]:
+    """
+    Register a per-file check for the given extensions.
+    Checks run in worker threads, so they must be thread-safe.
+    """
+
+    def decorator(check: Check) -> Check:
+        for extension in extensions:
+            CHECKS.setdefault(extension, []).append(check)
+        return check
+
+    return decorator
+
+
+@register_check(".py")
+def check_python_syntax(path: str, content: str, timeout: float) -> list[AnalysisFinding]:
+    try:
+        compile(content, path, "exec", dont_inherit=True)
+    except SyntaxError as e:
+        return [AnalysisFinding(
+            path=path,
+            check="python_syntax",
+            severity="error",
+            message=f"line {e.lineno}: {e.msg}",
+        )]
+    except ValueError as e:
+        return [AnalysisFinding(path=path, check="python_syntax", severity="error", message=str(e))]
+    return []
+
+
+def run_compiler(command: list[str], path: str, content: str, timeout: float, check: str) -> list[AnalysisFinding]:
+    """
+    Write the file to a temporary directory and run a compiler on it.
+    Only diagnostics that don't depend on other project files are reported.
+    """
+    if not shutil.which(command[0]):
+        return []
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, PurePosixPath(path).name)
+        with open(file_path, "w", encoding="utf-8") as source_file:
+            source_file.write(content)
+        try:
+            result = subprocess.run(
+                [*command, file_path],
+                cwd=directory,
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired:
+            return [AnalysisFinding(path=path, check=check, severity="info", message="compiler check timed out")]
+
+    if result.returncode == 0:
+        return []
+
+    output = result.stderr.replace(file_path, path).replace(directory + os.sep, "")
+    errors = [line.strip() for line in output.splitlines() if "error" in line]
+    if not errors or any(INCONCLUSIVE_PATTERN.search(line) for line in errors):
+        return []
+    return [
+        AnalysisFinding(path=path, check=check, severity="error", message=error)
+        for error in errors[:5]
+    ]
+
+
+@register_check(".c")
+def check_c_syntax(path: str, content: str, timeout: float) -> list[AnalysisFinding]:
+    return run_compiler(["gcc", "-fsyntax-only", "-x", "c"], path, content, timeout, "c_syntax")
+
+
+@register_check(".cpp", ".cc", ".cxx")
+def check_cpp_syntax(path: str, content: str, timeout: float) -> list[AnalysisFinding]:
+    return run_compiler(["g++", "-fsyntax-only", "-x", "c++"], path, content, timeout, "cpp_syntax")
+
+
+@register_check(".java")
+def check_java_syntax(path: str, content: str, timeout: float) -> list[AnalysisFinding]:
+    return run_compiler(["javac", "-proc:none", "-d", "."], path, content, timeout, "java_syntax")
+
+
+def run_checks(path: str, content: str, timeout: float) -> list[AnalysisFinding]:
+    extension = PurePosixPath(path).suffix.lower()
+    findings = []
+    for check in CHECKS.get(extension, []):
+        try:
+            findings.extend(check(path, content, timeout))
+        except Exception as e:
+            findings.append(
+                AnalysisFinding(path=path, check=check.__name__, severity="info", message=f"check failed: {e}")
+            )
+    return findings
+
+
+class StaticAnalyzer:
+    """
+    Local analysis of a submission before it is sent to the model:
+    file inventory, emptiness detection and language-appropriate syntax checks.
+    """
+    POOL_THRESHOLD = 4
+
+    def __init__(self):
+        self.__config = AnalysisConfig()
+
+    @staticmethod
+    def is_empty(content: str) -> bool:
+        return not COMMENT_PATTERN.sub("", content).strip()
+
+    @staticmethod
+    def get_inventory(files: dict[str, str]) -> AnalysisFinding:
+        languages: Counter = Counter()
+        lines: Counter = Counter()
+        for path, content in files.items():
+            language = SOURCE_LANGUAGES.get(PurePosixPath(path).suffix.lower(), "other")
+            languages[language] += 1
+            lines[language] += content.count("\n") + 1
+        inventory = ", ".join(
+            f"{language}: {count} files / {lines[language]} lines"
+            for language, count in languages.most_common()
+        )
+        return AnalysisFinding(check="inventory", severity="info", message=inventory or "no files")
+
+    def run_syntax_checks(self, files: dict[str, str]) -> list[AnalysisFinding]:
+        checkable = [
+            (path, content) for path, content in files.items()
+            if PurePosixPath(path).suffix.lower() in CHECKS
+        ]
+        timeout = self.__config.CHECK_TIMEOUT
+        if len(checkable) < self.POOL_THRESHOLD:
+            results = [run_checks(path, content, timeout) for path, content in checkable]
+        else:
+            # Threads, not processes: compilers run as subprocesses anyway,
+            # and forking from a stage thread next to the logging thread can deadlock
+            with ThreadPoolExecutor(
+                    max_workers=self.__config.WORKERS or os.cpu_count(),
+                    thread_name_prefix="analysis"
+            ) as executor:
+                results = list(executor.map(
+                    run_checks,
+                    [path for path, _ in checkable],
+                    [content for _, content in checkable],
+                    [timeout] * len(checkable),
+                ))
+        return [finding for findings in results for finding in findings]
+
+    def analyze(self, files: dict[str, str]) -> AnalysisReport:
+        """
+        Analyze the submitted files.
+        A hard failure is set when there is nothing to review: no text files or only empty ones,
+        or every non-empty file in a known language has a check and fails it.
+        With FAIL_ON_ERRORS any compile error is a hard failure, otherwise errors are findings for the prompt.
+        Files in languages missing from SOURCE_LANGUAGES are still code, they only get a warning.
+        """
+        report = AnalysisReport(findings=[self.get_inventory(files)])
+        # Binary and oversized files are skipped by the reader, whatever is left is treated as source text
+        sources = files
+        if not sources:
+            report.hard_failure = "Pull Request не містить файлів з кодом."
+            return report
+
+        if not any(PurePosixPath(path).suffix.lower() in SOURCE_LANGUAGES for path in sources):
+            report.findings.append(AnalysisFinding(
+                check="languages",
+                severity="warning",
+                message="no files in a known language, syntax checks were skipped",
+            ))
+
+        empty = [path for path, content in sources.items() if self.is_empty(content)]
+        report.findings.extend(
+            AnalysisFinding(path=path, check="empty", severity="warning", message="file has no code")
+            for path in empty
+        )
+        if len(empty) == len(sources):
+            report.hard_failure = "Усі файли з кодом порожні."
+            return report
+
+        report.findings.extend(self.run_syntax_checks(sources))
+        failed = {finding.path for finding in report.errors}
+        code = [
+            path for path in sources
+            if PurePosixPath(path).suffix.lower() in SOURCE_LANGUAGES and path not in empty
+        ]
+        # Files without a check may compile, their errors are left to the model review
+        all_failed = bool(code) and all(
+            PurePosixPath(path).suffix.lower() in CHECKS and path in failed for path in code
+        )
+        if failed and (self.__config.FAIL_ON_ERRORS or all_failed):
+            report.hard_failure = "Код не компілюється."
+
+        logger.info(f"Static analysis: {len(report.findings)} findings, hard failure: {report.hard_failure}")
+        return report
+
+    @staticmethod
+    def get_failure_review(report: AnalysisReport) -> ReviewCodeTool:
+        """
+        Templated review for a submission that is not sent to the model.
+        """
+        return ReviewCodeTool(
+            comment=f"{report.hard_failure}\n\n```\n{report.summary()}\n```",
+            suggestions="Виправте зазначені проблеми та оновіть Pull Request.",
+            rating=1,
+        )
@@ -0,0 +1,73 @@
+"""
+This module contains tests for the static analysis service
+"""
+
+import unittest
+
+from services.analysis.service import StaticAnalyzer
+
+
+class StaticAnalyzerTest(unittest.TestCase):
+    """
+    Testing hard failures of the static analysis
+    """
+
+    def setUp(self):
+        """
+        Setup the analyzer
+        :return:
+        """
+        self.analyzer = StaticAnalyzer()
+
+    def test_no_files(self):
+        """
+        A pull request without files is not reviewed
+        :return:
+        """
+        self.assertIsNotNone(self.analyzer.analyze({}).hard_failure)
+
+    def test_only_empty_files(self):
+        """
+        Files with only whitespace or comments are not reviewed
+        :return:
+        """
+        report = self.analyzer.analyze({"main.py": "# TODO\n", "notes.txt": "  \n"})
+        self.assertIsNotNone(report.hard_failure)
+
+    def test_unknown_language_is_reviewed(self):
+        """
+        Code in a language missing from SOURCE_LANGUAGES is reviewed with a warning
+        :return:
+        """
+        report = self.analyzer.analyze({"Main.scala": "object Main extends App { println(1) }\n"})
+        self.assertIsNone(report.hard_failure)
+        self.assertIn("languages", [finding.check for finding in report.findings])
+
+    def test_python_syntax_error(self):
+        """
+        A submission whose only checkable file doesn't compile is not reviewed
+        :return:
+        """
+        report = self.analyzer.analyze({"main.py": "def main(:\n    pass\n"})
+        self.assertEqual(report.hard_failure, "Код не компілюється.")
+
+    def test_error_next_to_unchecked_code(self):
+        """
+        A broken file next to code without a check is passed to the review as a finding
+        :return:
+        """
+        report = self.analyzer.analyze({
+            "helper.py": "def main(:\n    pass\n",
+            "Program.cs": "class Program { static void Main() { System.Console.WriteLine(1); } }\n",
+        })
+        self.assertIsNone(report.hard_failure)
+        self.assertEqual([finding.path for finding in report.errors], ["helper.py"])
+
+    def test_valid_python(self):
+        """
+        Valid code has no hard failure
+        :return:
+        """
+        report = self.analyzer.analyze({"main.py": "print(1)\n"})
+        self.assertIsNone(report.hard_failure)
+        self.assertEqual(report.errors, [])
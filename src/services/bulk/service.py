@@ -0,0 +1,188 @@
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Iterator
+
+import pandas as pd
+from loguru import logger
+
+from configs.bulk import BulkConfig
+from models.bulk.entity import BulkFilter, BulkTarget, CheckpointEntry
+from models.scheduler.entity import ReviewJob
+from services.git.service import GitHub
+from services.google.service import GoogleSheet
+from services.scheduler.service import ReviewScheduler
+
+
+class CheckpointJournal:
+    """
+    Append-only JSONL journal of bulk runs.
+    The last entry of a repository wins, so a rerun resumes where the previous one stopped.
+    """
+
+    def __init__(self, path: Path | None = None):
+        self.__path = path or BulkConfig().get_shard_root() / "journal.jsonl"
+        self.entries: dict[str, CheckpointEntry] = {}
+        self.__lock = Lock()
+        self.__load()
+
+    def __load(self) -> None:
+        if not self.__path.exists():
+            return
+        with open(self.__path, encoding="utf-8") as journal_file:
+            for line in journal_file:
+                if not line.strip():
+                    continue
+                try:
+                    entry = CheckpointEntry.model_validate_json(line)
+                except ValueError:
+                    # A crash while writing leaves a truncated last line
+                    logger.warning(f"Skipping a corrupted journal line: {line[:80]}")
+                    continue
+                self.entries[entry.key] = entry
+        logger.info(f"Loaded {len(self.entries)} checkpoints from {self.__path}")
+
+    def get(self, key: str) -> CheckpointEntry | None:
+        return self.entries.get(key)
+
+    def is_reviewed(self, key: str, head_sha: str) -> bool:
+        entry = self.entries.get(key)
+        return entry is not None and entry.status == "done" and entry.head_sha == head_sha
+
+    def record(self, target: BulkTarget, head_sha: str | None, status: str) -> CheckpointEntry:
+        entry = CheckpointEntry(
+            timestamp=pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
+            key=target.key,
+            lab_name=target.lab_name,
+            head_sha=head_sha,
+            status=status,
+        )
+        with self.__lock, open(self.__path, "a", encoding="utf-8") as journal_file:
+            journal_file.write(entry.model_dump_json() + "\n")
+            journal_file.flush()
+            self.entries[entry.key] = entry
+        return entry
+
+
+class BulkRunner:
+    """
+    Re-grades repositories listed in the lab sheets.
+    Labs are read one at a time and repositories are queued in the review scheduler as they are read,
+    so labs close to their deadline go first and live reviews are not starved.
+    Every result is checkpointed so an interrupted run can be resumed.
+    """
+
+    def __init__(
+            self,
+            run: Callable[..., bool],
+            google_client: GoogleSheet | None = None,
+            journal: CheckpointJournal | None = None
+    ):
+        """
+        :param run: Reviews one repository, takes owner, repository name and the Google Sheets service
+        """
+        self.__run = run
+        self.__google_client = google_client or GoogleSheet()
+        self.__journal = journal or CheckpointJournal()
+        self.__deadlines: dict[str, datetime | None] = {}
+        self.__lock = Lock()
+        self.stats: dict[str, int] = {"done": 0, "failed": 0, "skipped": 0}
+
+    def get_lab_names(self, bulk_filter: BulkFilter) -> list[str]:
+        lab_names = self.__google_client.get_all_lab_names()
+        if bulk_filter.labs:
+            unknown = set(bulk_filter.labs) - set(lab_names)
+            if unknown:
+                logger.warning(f"Unknown labs in the filter: {sorted(unknown)}")
+            lab_names = [name for name in lab_names if name in bulk_filter.labs]
+        return lab_names
+
+    def matches(self, target: BulkTarget, bulk_filter: BulkFilter) -> bool:
+        """
+        Check the filters that don't need GitHub.
+        """
+        if bulk_filter.students:
+            students = {student.lower() for student in bulk_filter.students}
+            if (target.student or "").lower() not in students and not any(
+                    target.repository.lower().endswith(f"-{student}") for student in students
+            ):
+                return False
+
+        if bulk_filter.since:
+            attempt_time = pd.to_datetime(target.attempt_time, errors="coerce")
+            if pd.isna(attempt_time) or attempt_time < pd.Timestamp(bulk_filter.since):
+                return False
+
+        if bulk_filter.only == "unreviewed" and target.reviewed:
+            return False
+        if bulk_filter.only == "failed":
+            entry = self.__journal.get(target.key)
+            if entry is None or entry.status != "failed":
+                return False
+        return True
+
+    def iter_targets(self, bulk_filter: BulkFilter) -> Iterator[BulkTarget]:
+        seen = set()
+        for lab_name in self.get_lab_names(bulk_filter):
+            for target in self.__google_client.get_bulk_targets(sheet_name=lab_name):
+                if target.key in seen or not self.matches(target, bulk_filter):
+                    continue
+                seen.add(target.key)
+                yield target
+
+    def get_deadline(self, lab_name: str) -> datetime | None:
+        if lab_name not in self.__deadlines:
+            self.__deadlines[lab_name] = self.__google_client.get_lab_settings(lab_name).deadline
+        return self.__deadlines[lab_name]
+
+    def process(self, target: BulkTarget, force: bool = False) -> str:
+        """
+        Review one repository unless its head SHA was already reviewed.
+        :return: done, failed or skipped
+        """
+        try:
+            head_sha = GitHub(owner=target.owner, repo=target.repository).get_head_sha()
+        except Exception as e:
+            logger.error(f"Failed to get the head SHA of {target.key}: {e}")
+            self.__journal.record(target, None, "failed")
+            return "failed"
+
+        if not force and self.__journal.is_reviewed(target.key, head_sha):
+            logger.info(f"Skipping {target.key}: {head_sha[:7]} was already reviewed")
+            return "skipped"
+
+        reviewed = self.__run(target.owner, target.repository, google_client=self.__google_client)
+        status = "done" if reviewed else "failed"
+        self.__journal.record(target, head_sha, status)
+        return status
+
+    def __process_scheduled(self, target: BulkTarget, force: bool) -> None:
+        status = self.process(target, force=force)
+        with self.__lock:
+            self.stats[status] += 1
+            logger.info(f"{target.key}: {status} ({self.stats})")
+
+    def run(self, bulk_filter: BulkFilter | None = None) -> dict[str, int]:
+        """
+        Review every repository matching the filter.
+        :return: Number of done, failed and skipped repositories
+        """
+        bulk_filter = bulk_filter or BulkFilter()
+        scheduler = ReviewScheduler()
+        scheduler.start()
+        try:
+            for target in self.iter_targets(bulk_filter):
+                job = ReviewJob(
+                    key=target.key,
+                    lab_name=target.lab_name,
+                    deadline=self.get_deadline(target.lab_name)
+                )
+                scheduler.submit(job, partial(self.__process_scheduled, target, bulk_filter.force))
+        finally:
+            scheduler.close()
+            scheduler.join()
+        if not self.__google_client.flush():
+            logger.error("Some sheet rows were not written, they will be written by the next run")
+        logger.info(f"Bulk run finished: {self.stats}")
+        return self.stats
@@ -0,0 +1,302 @@
+import os
+import re
+import socket
+from json import dumps, loads
+from multiprocessing import get_context
+from pathlib import Path
+from threading import Event, Thread
+from time import time
+from typing import Callable
+from uuid import uuid4
+
+import pandas as pd
+from loguru import logger
+
+from configs.bulk import BulkConfig
+from models.bulk.entity import BulkFilter, ShardFailure, ShardMetrics
+from services.bulk.service import BulkRunner, CheckpointJournal
+from services.google.service import GoogleSheet
+from utils.helpers.logging import setup_logging
+
+Run = Callable[..., bool]
+
+
+class ShardLeases:
+    """
+    Lease files of one bulk run in a shared directory.
+    A shard is one lab sheet, its lease is created with O_EXCL so only one worker owns the sheet writes.
+    Owners refresh the lease modification time, a lease without a heartbeat for LEASE_TTL is taken over.
+    A shard that raises gets a failure marker with its attempt count and isn't claimed after max_attempts.
+    """
+
+    def __init__(self, run_dir: Path, worker: str, lease_ttl: float, max_attempts: int = 3):
+        self.run_dir = run_dir
+        self.worker = worker
+        self.lease_ttl = lease_ttl
+        self.max_attempts = max_attempts
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        self.__skipped: set[str] = set()
+
+    @staticmethod
+    def get_file_name(lab_name: str) -> str:
+        return re.sub(r"[^\w.-]", "_", lab_name)
+
+    def lease_path(self, lab_name: str) -> Path:
+        return self.run_dir / f"{self.get_file_name(lab_name)}.lease"
+
+    def done_path(self, lab_name: str) -> Path:
+        return self.run_dir / f"{self.get_file_name(lab_name)}.done"
+
+    def failed_path(self, lab_name: str) -> Path:
+        return self.run_dir / f"{self.get_file_name(lab_name)}.failed"
+
+    def __create_lease(self, path: Path) -> bool:
+        try:
+            descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(descriptor, "w", encoding="utf-8") as lease_file:
+            lease_file.write(self.worker)
+        return True
+
+    def __take_over(self, path: Path) -> bool:
+        try:
+            if time() - path.stat().st_mtime < self.lease_ttl:
+                return False
+            # Only one worker wins the rename of an expired lease
+            os.rename(path, path.with_name(f"{path.name}.expired-{self.worker}"))
+        except FileNotFoundError:
+            pass
+        return self.__create_lease(path)
+
+    def get_failure(self, lab_name: str) -> ShardFailure | None:
+        try:
+            return ShardFailure.model_validate_json(self.failed_path(lab_name).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+
+    def __skip_done(self, lab_name: str) -> bool:
+        if self.done_path(lab_name).exists():
+            reason = "is already done"
+        elif (failure := self.get_failure(lab_name)) and failure.attempts >= self.max_attempts:
+            reason = f"failed {failure.attempts} times"
+        else:
+            return False
+        if lab_name not in self.__skipped:
+            self.__skipped.add(lab_name)
+            logger.info(f"Shard {lab_name} {reason} in run {self.run_dir.name}, skipping it")
+        return True
+
+    def claim(self, lab_name: str) -> bool:
+        if self.__skip_done(lab_name):
+            return False
+        path = self.lease_path(lab_name)
+        if self.__create_lease(path) or self.__take_over(path):
+            # The shard could have been finished between the check and the claim
+            if self.__skip_done(lab_name):
+                self.release(lab_name)
+                return False
+            logger.info(f"Worker {self.worker} claimed shard {lab_name}")
+            return True
+        return False
+
+    def claim_next(self, lab_names: list[str]) -> str | None:
+        for lab_name in lab_names:
+            if self.claim(lab_name):
+                return lab_name
+        return None
+
+    def heartbeat(self, lab_name: str) -> None:
+        try:
+            os.utime(self.lease_path(lab_name))
+        except FileNotFoundError:
+            logger.warning(f"Lease of shard {lab_name} disappeared")
+
+    def release(self, lab_name: str) -> None:
+        self.lease_path(lab_name).unlink(missing_ok=True)
+
+    def complete(self, metrics: ShardMetrics) -> None:
+        self.done_path(metrics.lab_name).write_text(metrics.model_dump_json(), encoding="utf-8")
+        self.release(metrics.lab_name)
+
+    def fail(self, lab_name: str, error: Exception) -> ShardFailure:
+        """
+        Count a failed attempt of a shard and release its lease.
+        Only the lease owner writes the marker, so the count isn't lost to a concurrent writer.
+        """
+        previous = self.get_failure(lab_name)
+        failure = ShardFailure(
+            lab_name=lab_name,
+            worker=self.worker,
+            attempts=previous.attempts + 1 if previous else 1,
+            error=f"{type(error).__name__}: {error}",
+        )
+        path = self.failed_path(lab_name)
+        temporary_path = path.with_name(f"{path.name}.{self.worker}")
+        temporary_path.write_text(failure.model_dump_json(), encoding="utf-8")
+        os.replace(temporary_path, path)
+        self.release(lab_name)
+        return failure
+
+    def get_failures(self) -> list[ShardFailure]:
+        """
+        Get failure markers of shards that aren't done.
+        """
+        return [
+            ShardFailure.model_validate_json(path.read_text(encoding="utf-8"))
+            for path in sorted(self.run_dir.glob("*.failed"))
+            if not path.with_suffix(".done").exists()
+        ]
+
+    def get_metrics(self) -> list[ShardMetrics]:
+        return [
+            ShardMetrics.model_validate_json(path.read_text(encoding="utf-8"))
+            for path in sorted(self.run_dir.glob("*.done"))
+        ]
+
+
+def run_worker(
+        worker: str,
+        run_dir: Path,
+        lab_names: list[str],
+        bulk_filter: BulkFilter,
+        run: Run,
+        journal_path: Path,
+        lease_ttl: float,
+        max_attempts: int,
+        run_id: str | None = None
+) -> None:
+    """
+    Worker process: claim shards until none is left.
+    A worker that finishes early takes the next unclaimed or expired shard, which rebalances the run.
+    A shard that raises is claimed again until it has used up max_attempts.
+    """
+    # Spawned processes start with the default sink
+    setup_logging(run_id=run_id, bulk=True)
+    leases = ShardLeases(run_dir, worker, lease_ttl, max_attempts)
+    google_client = GoogleSheet(buffered=True)
+    while (lab_name := leases.claim_next(lab_names)) is not None:
+        stopped = Event()
+
+        def heartbeat() -> None:
+            while not stopped.wait(lease_ttl / 3):
+                leases.heartbeat(lab_name)
+
+        heartbeat_thread = Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+        started = time()
+        try:
+            bulk_runner = BulkRunner(run=run, google_client=google_client, journal=CheckpointJournal(journal_path))
+            stats = bulk_runner.run(bulk_filter.model_copy(update={"labs": [lab_name]}))
+            leases.complete(ShardMetrics(
+                lab_name=lab_name,
+                worker=worker,
+                started=started,
+                finished=time(),
+                **stats
+            ))
+        except Exception as e:
+            failure = leases.fail(lab_name, e)
+            logger.exception(
+                f"Worker {worker} failed on shard {lab_name} (attempt {failure.attempts}/{max_attempts}): {e}"
+            )
+        finally:
+            stopped.set()
+            heartbeat_thread.join()
+
+
+class ShardCoordinator:
+    """
+    Splits a bulk run by lab sheet across worker processes.
+    Machines sharing SHARD_DIR and the run id cooperate through lease files,
+    shards are handed out longest first by the durations of the previous run.
+    Without a run id every invocation is a new run, pass the id of an interrupted run to resume it.
+    """
+
+    def __init__(self, workers: int | None = None, shard_dir: Path | None = None, run_id: str | None = None):
+        self.__config = BulkConfig()
+        self.workers = workers or self.__config.WORKERS
+        self.shard_root = shard_dir or self.__config.get_shard_root()
+        self.shard_root.mkdir(parents=True, exist_ok=True)
+        # Timestamp first, so run directories sort by start time
+        self.run_id = run_id or f"{pd.Timestamp.now().strftime('%Y%m%d-%H%M%S')}-{uuid4().hex[:6]}"
+        self.run_dir = self.shard_root / "runs" / self.run_id
+        self.worker_prefix = f"{socket.gethostname()}-{os.getpid()}"
+        self.failures: list[ShardFailure] = []
+
+    def get_previous_durations(self) -> dict[str, float]:
+        """
+        Get shard durations of the latest other run with finished shards.
+        """
+        runs = sorted((path for path in (self.shard_root / "runs").glob("*") if path != self.run_dir), reverse=True)
+        for run_dir in runs:
+            metrics = ShardLeases(run_dir, self.worker_prefix, self.__config.LEASE_TTL).get_metrics()
+            if metrics:
+                return {shard.lab_name: shard.duration for shard in metrics}
+        return {}
+
+    def get_plan(self, lab_names: list[str]) -> list[str]:
+        """
+        Get the shard order of the run, the first machine writes it and the others reuse it.
+        """
+        plan_path = self.run_dir / "plan.json"
+        if plan_path.exists():
+            return loads(plan_path.read_text(encoding="utf-8"))
+
+        durations = self.get_previous_durations()
+        plan = sorted(lab_names, key=lambda name: -durations.get(name, float("inf")))
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        temporary_path = plan_path.with_suffix(f".{self.worker_prefix}")
+        temporary_path.write_text(dumps(plan, ensure_ascii=False), encoding="utf-8")
+        os.replace(temporary_path, plan_path)
+        return plan
+
+    def run(self, run: Run, bulk_filter: BulkFilter, lab_names: list[str]) -> list[ShardMetrics]:
+        """
+        Run the workers and gather per-shard metrics.
+        :param run: Reviews one repository, must be a module-level function
+        :param lab_names: Lab sheets to process
+        :return: Metrics of all finished shards of the run, shards that used up their attempts are in `failures`
+        """
+        plan = self.get_plan(lab_names)
+        logger.info(f"Bulk run {self.run_id}: {len(plan)} shards, {self.workers} workers")
+        done = [shard.lab_name for shard in ShardLeases(self.run_dir, self.worker_prefix, 0).get_metrics()]
+        if done:
+            logger.info(f"Bulk run {self.run_id}: skipping {len(done)} shards already done: {sorted(done)}")
+        arguments = (
+            self.run_dir,
+            plan,
+            bulk_filter,
+            run,
+            self.shard_root / "journal.jsonl",
+            self.__config.LEASE_TTL,
+            self.__config.SHARD_ATTEMPTS,
+            self.run_id,
+        )
+        context = get_context("spawn")
+        processes = [
+            context.Process(target=run_worker, args=(f"{self.worker_prefix}-{index}", *arguments))
+            for index in range(self.workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        metrics = ShardLeases(self.run_dir, self.worker_prefix, self.__config.LEASE_TTL).get_metrics()
+        for shard in metrics:
+            logger.info(
+                f"Shard {shard.lab_name} ({shard.worker}): {shard.duration:.1f}s, "
+                f"done {shard.done}, failed {shard.failed}, skipped {shard.skipped}"
+            )
+        failures = ShardLeases(self.run_dir, self.worker_prefix, self.__config.LEASE_TTL).get_failures()
+        for failure in failures:
+            logger.error(
+                f"Shard {failure.lab_name} failed {failure.attempts}/{self.__config.SHARD_ATTEMPTS} attempts, "
+                f"last on {failure.worker}: {failure.error}"
+            )
+        self.failures = failures
+        unfinished = set(plan) - {shard.lab_name for shard in metrics} - {failure.lab_name for failure in failures}
+        if unfinished:
+            logger.warning(f"Shards not finished in this run: {sorted(unfinished)}")
+        return metrics
@@ -0,0 +1,179 @@
+"""
+This module contains tests for sharded bulk runs
+"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from contextlib import contextmanager
+from time import time
+from typing import Iterator
+from unittest.mock import Mock
+
+from loguru import logger
+
+from models.bulk.entity import BulkFilter, BulkTarget, ShardMetrics
+from services.bulk.service import BulkRunner, CheckpointJournal
+from services.bulk.shard import ShardCoordinator, ShardLeases
+from services.google.service import GoogleSheet
+
+
+@contextmanager
+def capture_logs() -> Iterator[list[str]]:
+    messages: list[str] = []
+    sink = logger.add(messages.append, level="INFO", format="{message}")
+    try:
+        yield messages
+    finally:
+        logger.remove(sink)
+
+
+def make_metrics(lab_name: str, duration: float) -> ShardMetrics:
+    return ShardMetrics(lab_name=lab_name, worker="test", started=0.0, finished=duration)
+
+
+class ShardLeasesTest(unittest.TestCase):
+    """
+    Testing shard leases of one run
+    """
+
+    def setUp(self):
+        """
+        Create two workers sharing a run directory
+        :return:
+        """
+        self.run_dir = Path(tempfile.mkdtemp()) / "run"
+        self.first = ShardLeases(self.run_dir, "first", lease_ttl=60)
+        self.second = ShardLeases(self.run_dir, "second", lease_ttl=60)
+
+    def test_one_owner_per_shard(self):
+        """
+        A leased shard can't be claimed by another worker
+        :return:
+        """
+        self.assertTrue(self.first.claim("lab 1"))
+        self.assertFalse(self.second.claim("lab 1"))
+        self.assertEqual(self.second.claim_next(["lab 1", "lab 2"]), "lab 2")
+
+    def test_expired_lease_is_taken_over(self):
+        """
+        A lease without a heartbeat for the TTL goes to another worker
+        :return:
+        """
+        self.assertTrue(self.first.claim("lab 1"))
+        expired = time() - 120
+        os.utime(self.first.lease_path("lab 1"), (expired, expired))
+        self.assertTrue(self.second.claim("lab 1"))
+
+    def test_done_shard_is_skipped(self):
+        """
+        A finished shard is never claimed again in the same run
+        :return:
+        """
+        self.assertTrue(self.first.claim("lab 1"))
+        self.first.complete(make_metrics("lab 1", 5.0))
+        with capture_logs() as messages:
+            self.assertFalse(self.second.claim("lab 1"))
+        self.assertTrue(any("already done" in message for message in messages))
+        self.assertEqual([shard.lab_name for shard in self.second.get_metrics()], ["lab 1"])
+
+    def test_failed_shard_is_retried_until_attempts_are_used(self):
+        """
+        A shard that raises is claimed again until it has used up its attempts, then it is reported
+        :return:
+        """
+        leases = ShardLeases(self.run_dir, "first", lease_ttl=60, max_attempts=2)
+        self.assertEqual(leases.claim_next(["lab 1", "lab 2"]), "lab 1")
+        self.assertEqual(leases.fail("lab 1", ValueError("bad date")).attempts, 1)
+        self.assertEqual(leases.claim_next(["lab 1", "lab 2"]), "lab 1")
+        self.assertEqual(leases.fail("lab 1", ValueError("bad date")).attempts, 2)
+        with capture_logs() as messages:
+            self.assertEqual(leases.claim_next(["lab 1", "lab 2"]), "lab 2")
+        self.assertTrue(any("failed 2 times" in message for message in messages))
+
+        failures = leases.get_failures()
+        self.assertEqual([(failure.lab_name, failure.attempts) for failure in failures], [("lab 1", 2)])
+        self.assertEqual(failures[0].error, "ValueError: bad date")
+
+    def test_failure_of_done_shard_is_not_reported(self):
+        """
+        A shard that succeeded after a failed attempt isn't reported as failed
+        :return:
+        """
+        self.assertTrue(self.first.claim("lab 1"))
+        self.first.fail("lab 1", RuntimeError("network"))
+        self.assertTrue(self.second.claim("lab 1"))
+        self.second.complete(make_metrics("lab 1", 5.0))
+        self.assertEqual(self.first.get_failures(), [])
+
+
+class ShardCoordinatorTest(unittest.TestCase):
+    """
+    Testing run ids and shard plans of the coordinator
+    """
+
+    def setUp(self):
+        """
+        Create a shard directory
+        :return:
+        """
+        self.shard_dir = Path(tempfile.mkdtemp())
+
+    def test_run_id_is_unique_per_invocation(self):
+        """
+        Two runs started in the same second don't share leases
+        :return:
+        """
+        first = ShardCoordinator(workers=1, shard_dir=self.shard_dir)
+        second = ShardCoordinator(workers=1, shard_dir=self.shard_dir)
+        self.assertNotEqual(first.run_id, second.run_id)
+        self.assertEqual(ShardCoordinator(workers=1, shard_dir=self.shard_dir, run_id="resume").run_id, "resume")
+
+    def test_plan_is_longest_first(self):
+        """
+        Shards are ordered by the durations of the previous run, unknown shards first
+        :return:
+        """
+        previous = ShardLeases(self.shard_dir / "runs" / "20260101-000000-aaaaaa", "test", 60)
+        previous.complete(make_metrics("short", 1.0))
+        previous.complete(make_metrics("long", 10.0))
+        coordinator = ShardCoordinator(workers=1, shard_dir=self.shard_dir)
+        self.assertEqual(coordinator.get_plan(["short", "long", "new"]), ["new", "long", "short"])
+        self.assertEqual(coordinator.get_plan(["short"]), ["new", "long", "short"])
+
+
+class BulkFilterTest(unittest.TestCase):
+    """
+    Testing the filters of a bulk run
+    """
+
+    def setUp(self):
+        """
+        Create a runner with an empty journal, the filters don't touch the sheets
+        :return:
+        """
+        journal = CheckpointJournal(Path(tempfile.mkdtemp()) / "journal.jsonl")
+        self.runner = BulkRunner(run=lambda **_: True, google_client=Mock(spec=GoogleSheet), journal=journal)
+
+    def test_since_is_validated_up_front(self):
+        """
+        An unparseable or timezone-aware date is rejected when the filter is made
+        :return:
+        """
+        with self.assertRaises(ValueError):
+            BulkFilter(since="last week")
+        with self.assertRaises(ValueError):
+            BulkFilter(since="2025-09-01T12:00+02:00")
+
+    def test_since(self):
+        """
+        Repositories attempted before the date or without an attempt time are left out
+        :return:
+        """
+        bulk_filter = BulkFilter(since="2025-09-01")
+        target = BulkTarget(lab_name="lab 1", owner="org", repository="lab1-alice")
+        self.assertFalse(self.runner.matches(target, bulk_filter))
+        self.assertFalse(self.runner.matches(target.model_copy(update={"attempt_time": "2025-08-31"}), bulk_filter))
+        attempted = target.model_copy(update={"attempt_time": "2025-09-02 10:00"})
+        self.assertTrue(self.runner.matches(attempted, bulk_filter))
@@ -0,0 +1,133 @@
+import os
+import shutil
+import subprocess
+from base64 import b64encode
+from functools import cache
+from pathlib import Path
+from typing import Iterator
+
+from loguru import logger
+
+from configs.storage import StorageConfig
+
+FETCH_REFSPECS = [
+    "+refs/heads/*:refs/heads/*",
+    "+refs/pull/*/head:refs/pull/*/head",
+]
+
+
+class GitMirror:
+    """
+    Local bare clone of a GitHub repository, refreshed with incremental fetches.
+    File listings and contents are read from git objects instead of the REST API.
+    """
+
+    def __init__(self, full_name: str, cache_dir: Path | None = None):
+        """
+        :param full_name: Repository name in the owner/name form
+        """
+        self.full_name = full_name
+        cache_dir = cache_dir or StorageConfig().CACHE_DIR / "mirrors"
+        self.path = cache_dir / f"{full_name}.git"
+        self.url = f"https://github.com/{full_name}.git"
+        self.__batch: subprocess.Popen | None = None
+
+    @staticmethod
+    @cache
+    def is_available() -> bool:
+        """
+        Check once per process that the git executable exists.
+        """
+        if shutil.which("git") is None:
+            logger.warning("git is not installed, repositories are read through the API")
+            return False
+        return True
+
+    def __git(self, *args: str, token: str | None = None, **kwargs) -> subprocess.CompletedProcess:
+        env = {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+        if token:
+            # Passed through the environment, so the token is neither stored in the repository config
+            # nor visible in the process arguments
+            credentials = b64encode(f"x-access-token:{token}".encode("utf-8")).decode("ascii")
+            env.update({
+                "GIT_CONFIG_COUNT": "1",
+                "GIT_CONFIG_KEY_0": "http.extraHeader",
+                "GIT_CONFIG_VALUE_0": f"Authorization: Basic {credentials}",
+            })
+        return subprocess.run(
+            ["git", "--git-dir", str(self.path), *args],
+            env=env,
+            capture_output=True,
+            check=True,
+            **kwargs
+        )
+
+    def sync(self, token: str) -> None:
+        """
+        Create the bare clone on first use, then fetch only new objects of branches and PR heads.
+        :param token: Installation access token
+        """
+        if not self.path.exists():
+            logger.info(f"Creating mirror of {self.full_name} in {self.path}")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            subprocess.run(["git", "init", "--bare", "--quiet", str(self.path)], capture_output=True, check=True)
+            self.__git("remote", "add", "origin", self.url)
+
+        self.__git("fetch", "--prune", "--no-tags", "--quiet", "origin", *FETCH_REFSPECS, token=token)
+        logger.debug("Mirror of {} is up to date", self.full_name)
+
+    def has_commit(self, ref: str) -> bool:
+        try:
+            self.__git("cat-file", "-e", f"{ref}^{{commit}}")
+            return True
+        except subprocess.CalledProcessError:
+            return False
+
+    def list_tree(self, ref: str) -> Iterator[tuple[str, str, int]]:
+        """
+        List the blobs of a commit.
+        :return: Path, blob SHA and size of every file
+        """
+        output = self.__git("ls-tree", "-r", "-l", "-z", ref).stdout.decode("utf-8")
+        for line in output.split("\0"):
+            if not line:
+                continue
+            info, path = line.split("\t", 1)
+            _, object_type, sha, size = info.split()
+            if object_type == "blob":
+                yield path, sha, int(size)
+
+    def read_blob(self, sha: str) -> bytes:
+        """
+        Read a blob through one long-running `git cat-file --batch` process.
+        """
+        if self.__batch is None:
+            self.__batch = subprocess.Popen(
+                ["git", "--git-dir", str(self.path), "cat-file", "--batch"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+            )
+        stdin, stdout = self.__batch.stdin, self.__batch.stdout
+        assert stdin is not None and stdout is not None, "cat-file is started with both pipes"
+        stdin.write(f"{sha}\n".encode("ascii"))
+        stdin.flush()
+        line = stdout.readline()
+        if not line:
+            raise OSError(f"git cat-file of the mirror of {self.full_name} exited")
+        header = line.decode("ascii").split()
+        if len(header) < 3 or header[1] != "blob":
+            raise KeyError(f"Blob {sha} not found in the mirror of {self.full_name}")
+        data = stdout.read(int(header[2]))
+        stdout.read(1)
+        return data
+
+    def close(self) -> None:
+        if self.__batch is not None:
+            try:
+                if self.__batch.stdin is not None:
+                    self.__batch.stdin.close()
+            except OSError:
+                # The batch process already exited
+                pass
+            self.__batch.wait()
+            self.__batch = None
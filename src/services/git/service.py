@@ -1,10 +1,15 @@
-from typing import List, Dict, Union, Optional
+import subprocess
+from base64 import b64decode
+from typing import List, Dict, Union, Optional, Iterator, Iterable, Callable
 
 from loguru import logger
 from github.File import File
 from github.Repository import Repository
 
 from clients.github import GithubClient
+from models.git.entity import SourceFile
+from services.git.mirror import GitMirror
+from utils.helpers.files import PREFIX_SIZE, decode, has_binary_extension, is_binary
 
 GithubEntity = Union[Repository, File]
 
@@ -25,35 +30,129 @@ class GitHub:
         self.__repo = repo
 
         self.repository = self.github_client.get_repo(owner, repo)
+        self.skipped_files: List[SourceFile] = []
+        self.blob_shas: Dict[str, str] = dict()
         self.last_pr_number = self.get_last_pr_number()
 
-    def get_pr_files_content(self) -> Dict[str, str]:
+    def read_files(
+            self,
+            entries: Iterable[tuple[str, str, int]],
+            read_blob: Callable[[str], bytes]
+    ) -> Iterator[SourceFile]:
         """
-        Get content of the files in the last PR
-        :return: Dictionary with file paths as keys and file contents as values
+        Lazily read files of a tree listing.
+        Sizes come with the listing, so binary, oversized and over-budget files are skipped without reading them.
+        Every file is decoded once, binary content is detected from its first bytes.
+        :param entries: Path, blob SHA and size of every file
+        :param read_blob: Returns the content of a blob by its SHA
+        :return: Files in tree order, skipped files have no content
         """
-
-        def get_files_recursively(path: str, ref: str) -> Dict[str, str]:
-            logger.debug(f"Getting files recursively from path: {path}, ref: {ref}")
-            files = self.repository.get_contents(path, ref=ref)
-            context = dict()
-            encodings = ['utf-8', 'latin-1', 'cp1252']
-            for file in files:
-                if file.type == "dir":
-                    context.update(get_files_recursively(file.path, ref))
+        config = self.github_client.config
+        total_size = 0
+        for path, sha, size in entries:
+            file = SourceFile(path=path, sha=sha, size=size)
+            if has_binary_extension(file.path):
+                file.skipped = "binary"
+            elif file.size > config.MAX_FILE_SIZE:
+                file.skipped = "too large"
+            elif total_size + file.size > config.MAX_TOTAL_SIZE:
+                file.skipped = "repository size limit"
+            else:
+                data = read_blob(sha)
+                if is_binary(data[:PREFIX_SIZE]):
+                    file.skipped = "binary"
                 else:
-                    for encoding in encodings:
-                        try:
-                            content = file.decoded_content.decode(encoding)
-                            context[file.path] = content
-                            break
-                        except UnicodeDecodeError:
-                            continue
-            return context
+                    file.content, file.encoding = decode(data)
+                    total_size += file.size
+
+            if file.skipped:
+                logger.opt(lazy=True).debug("Skipping file: {}", file.summary)
+            yield file
+
+    def iter_files(self, repository: Repository, ref: str) -> Iterator[SourceFile]:
+        """
+        Lazily read the files of a repository at the given ref.
+        With MIRROR_ENABLED files are read from a local bare clone, otherwise
+        the whole tree is listed with one request and blobs are downloaded one at a time.
+        :param repository: Repository to read
+        :param ref: Branch, tag or commit SHA
+        """
+        # Files already read from the mirror are not read again if it fails midway
+        yielded: set[str] = set()
+        if self.github_client.config.MIRROR_ENABLED and GitMirror.is_available():
+            mirror = GitMirror(repository.full_name)
+            try:
+                mirror.sync(self.github_client.get_installation_token())
+                if mirror.has_commit(ref):
+                    for file in self.read_files(mirror.list_tree(ref), mirror.read_blob):
+                        yielded.add(file.path)
+                        yield file
+                    return
+                logger.warning(f"{ref} not found in the mirror of {repository.full_name}, using the API")
+            except subprocess.CalledProcessError as e:
+                logger.error(f"Mirror of {repository.full_name} failed, using the API: {e.stderr}")
+            except (OSError, LookupError, ValueError) as e:
+                logger.error(f"Mirror of {repository.full_name} failed, using the API: {e}")
+            finally:
+                mirror.close()
+
+        tree = repository.get_git_tree(ref, recursive=True)
+        if tree.raw_data.get("truncated"):
+            logger.warning(f"Tree of {repository.full_name}@{ref} is truncated, some files are missing")
+        entries = (
+            (element.path, element.sha, element.size or 0)
+            for element in tree.tree
+            if element.type == "blob" and element.path not in yielded
+        )
+        yield from self.read_files(
+            entries,
+            lambda sha: b64decode(repository.get_git_blob(sha).content)
+        )
+
+    def get_files_content(self, repository: Repository, ref: str) -> Dict[str, str]:
+        """
+        Get content of all text files of a repository at the given ref
+        :param repository: Repository to read
+        :param ref: Branch, tag or commit SHA
+        :return: Dictionary with file paths as keys and file contents as values
+        """
+        return {
+            file.path: file.content
+            for file in self.iter_files(repository, ref)
+            if file.content is not None
+        }
 
+    def get_pr_files_content(self) -> Dict[str, str]:
+        """
+        Get content of the files in the last PR.
+        Skipped files are kept in `skipped_files`, blob SHAs of read files in `blob_shas`.
+        :return: Dictionary with file paths as keys and file contents as values
+        """
         last_pr = self.repository.get_pull(self.last_pr_number)
         logger.info(f"Last PR number: {self.last_pr_number}")
-        return get_files_recursively("", last_pr.head.ref)
+        files = dict()
+        self.skipped_files = []
+        self.blob_shas = dict()
+        for file in self.iter_files(self.repository, last_pr.head.sha):
+            if file.content is None:
+                self.skipped_files.append(file)
+                continue
+            files[file.path] = file.content
+            self.blob_shas[file.path] = file.sha
+        if self.skipped_files:
+            logger.info(f"{len(self.skipped_files)} files skipped")
+        return files
+
+    def get_template_repository(self) -> Optional[Repository]:
+        """
+        Get the template repository the student repository was created from.
+        :return: Template repository or None if the repository wasn't created from a template
+        """
+        template = self.repository.template_repository
+        if template is None:
+            logger.info(f"Repository {self.repository.full_name} has no template repository")
+            return None
+        return template
 
     def get_last_pr_number(self) -> int:
         """
@@ -65,6 +164,13 @@ class GitHub:
         logger.info(f"Last PR number: {pr_number[0].number}")
         return pr_number[0].number
 
+    def get_head_sha(self) -> str:
+        """
+        Get the head commit SHA of the last PR.
+        :return:
+        """
+        return self.repository.get_pull(self.last_pr_number).head.sha
+
     def comment_pr(
             self,
             comment: str,
@@ -90,9 +196,9 @@ class GitHub:
         logger.debug("Getting student username from repository name")
         repository_name = self.repository.full_name
         _lab_name = repository_name.split("/")[-1]
-        logger.debug(f"Repository name: {repository_name}")
-        logger.debug(f"Extracted repo suffix: {_lab_name}")
-        logger.debug(f"Lab name to remove: {lab_name}")
+        logger.debug("Repository name: {}", repository_name)
+        logger.debug("Extracted repo suffix: {}", _lab_name)
+        logger.debug("Lab name to remove: {}", lab_name)
         student = _lab_name.replace(f"{lab_name}-", "")
         logger.info(f"Extracted student username: {student}")
         return student
@@ -105,13 +211,13 @@ class GitHub:
         logger.debug("Getting lab name")
         repository_name = self.repository.full_name
         lab_name = repository_name.split("/")[-1]
-        logger.debug(f"Repository full name: {repository_name}")
-        logger.debug(f"Initial lab_name from repo: {lab_name}")
-        logger.debug(f"Available lab names: {all_lab_names}")
+        logger.debug("Repository full name: {}", repository_name)
+        logger.debug("Initial lab_name from repo: {}", lab_name)
+        logger.debug("Available lab names: {}", all_lab_names)
         
         for _lab_name in all_lab_names:
             if _lab_name in lab_name:
-                logger.debug(f"Found matching lab name: {_lab_name}")
+                logger.debug("Found matching lab name: {}", _lab_name)
                 lab_name = _lab_name
                 break
         
@@ -2,3 +2,96 @@
 Git service tests
 """
 
+import unittest
+from base64 import b64encode
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from services.git.service import GitHub
+
+FILES = {"a.py": b"print('a')\n", "b.py": b"print('b')\n"}
+
+
+class FakeRepository:
+    """
+    Repository read through the API
+    """
+    full_name = "owner/repo"
+
+    def get_git_tree(self, ref, recursive=False):
+        elements = [
+            SimpleNamespace(path=path, sha=path, size=len(data), type="blob")
+            for path, data in FILES.items()
+        ]
+        return SimpleNamespace(raw_data={}, tree=elements)
+
+    def get_git_blob(self, sha):
+        return SimpleNamespace(content=b64encode(FILES[sha]).decode("ascii"))
+
+
+class FailingMirror:
+    """
+    Mirror that fails with the given error while reading the second blob
+    """
+    error: Exception = OSError("git: not found")
+
+    def __init__(self, full_name):
+        self.read = 0
+
+    def sync(self, token):
+        pass
+
+    def has_commit(self, ref):
+        return True
+
+    def list_tree(self, ref):
+        return [(path, path, len(data)) for path, data in FILES.items()]
+
+    def read_blob(self, sha):
+        self.read += 1
+        if self.read > 1:
+            raise self.error
+        return FILES[sha]
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def is_available():
+        return True
+
+
+class IterFilesTest(unittest.TestCase):
+    """
+    Testing the fallback from the mirror to the API
+    """
+
+    def setUp(self):
+        """
+        Create the service without connecting to GitHub
+        :return:
+        """
+        self.github = GitHub.__new__(GitHub)
+        config = SimpleNamespace(MIRROR_ENABLED=True, MAX_FILE_SIZE=1000, MAX_TOTAL_SIZE=10000)
+        self.github.github_client = SimpleNamespace(config=config, get_installation_token=lambda: "token")
+
+    def read(self) -> list[str]:
+        return [file.path for file in self.github.iter_files(FakeRepository(), "main")]
+
+    def test_os_error_falls_back_to_api(self):
+        """
+        A missing git executable doesn't fail the review
+        :return:
+        """
+        FailingMirror.error = OSError("git: not found")
+        with patch("services.git.service.GitMirror", FailingMirror):
+            self.assertEqual(self.read(), ["a.py", "b.py"])
+
+    def test_missing_blob_falls_back_to_api(self):
+        """
+        A blob missing from the mirror is read through the API, files already read aren't repeated
+        :return:
+        """
+        FailingMirror.error = KeyError("blob not found")
+        with patch("services.git.service.GitMirror", FailingMirror):
+            self.assertEqual(self.read(), ["a.py", "b.py"])
@@ -0,0 +1,273 @@
+import re
+from json import dumps, loads
+from pathlib import Path
+from threading import RLock
+from time import monotonic, sleep
+
+import pandas as pd
+from gspread.utils import absolute_range_name, rowcol_to_a1
+from loguru import logger
+
+from clients.google import GoogleSheetsClient
+from configs.storage import StorageConfig
+
+
+class SheetWriteBuffer:
+    """
+    Write-back buffer of student rows for bulk runs.
+    Every worksheet is read once, row updates and inserts are applied to that snapshot
+    and written back when the size or time threshold is reached: updates as one batched values update,
+    inserts appended after the last row of the sheet, so rows added by others since the snapshot are not overwritten.
+    Updates go to the rows of their keys in the live key column, read again on every flush,
+    so a sheet rewritten meanwhile by a live review gets them in the right rows.
+    Keys no longer in the sheet stay pending. A sheet is read again after rows were appended to it.
+
+    Pending rows are also spilled to a local file until they are written,
+    so a failed flush or a crash doesn't lose results: they are retried on the next flush or run.
+    Reviews scheduled concurrently share one buffer, so its methods are serialised.
+    """
+    KEY_COLUMN = "ПІБ"
+
+    def __init__(
+            self,
+            client: GoogleSheetsClient,
+            default_columns: list[str],
+            cache_dir: Path | None = None
+    ):
+        """
+        :param default_columns: Header of a sheet that has no rows yet
+        """
+        self.__client = client
+        self.__config = client.config
+        self.__default_columns = default_columns
+        self.__cache_dir = cache_dir or StorageConfig().CACHE_DIR / "sheets"
+        self.__cache_dir.mkdir(parents=True, exist_ok=True)
+        self.__data: dict[str, pd.DataFrame] = {}
+        self.__pending: dict[str, dict[str, set[str]]] = {}
+        self.__pending_since: dict[str, float] = {}
+        self.__inserted: dict[str, set[str]] = {}
+        self.__header_changed: set[str] = set()
+        self.__lock = RLock()
+
+    def __spill_path(self, sheet_name: str) -> Path:
+        file_name = re.sub(r"[^\w.-]", "_", sheet_name)
+        return self.__cache_dir / f"pending-{file_name}.json"
+
+    def __spill(self, sheet_name: str) -> None:
+        data = self.__data[sheet_name]
+        rows = []
+        for key, columns in self.__pending[sheet_name].items():
+            index = self.__find_row(data, key)
+            if index is None:
+                continue
+            rows.append({column: data.at[index, column] for column in columns} | {self.KEY_COLUMN: key})
+        self.__spill_path(sheet_name).write_text(dumps(rows, ensure_ascii=False, default=str), encoding="utf-8")
+
+    @classmethod
+    def __find_row(cls, data: pd.DataFrame, key: str) -> int | None:
+        if data.empty or cls.KEY_COLUMN not in data.columns:
+            return None
+        matches = data.index[data[cls.KEY_COLUMN] == key]
+        return int(matches[0]) if len(matches) else None
+
+    def is_loaded(self, sheet_name: str) -> bool:
+        return sheet_name in self.__data
+
+    def get_data(self, sheet_name: str) -> pd.DataFrame:
+        """
+        Get the snapshot of a sheet with buffered updates applied, the sheet is read on first use only.
+        Rows left by a failed run are restored into the buffer.
+        """
+        with self.__lock:
+            return self.__get_data(sheet_name)
+
+    def __get_data(self, sheet_name: str) -> pd.DataFrame:
+        if sheet_name not in self.__data:
+            data = self.__client.get_sheet_data(sheet_name)
+            if data.empty:
+                data = pd.DataFrame(columns=self.__default_columns)
+                self.__header_changed.add(sheet_name)
+            self.__data[sheet_name] = data
+            self.__pending[sheet_name] = {}
+            self.__inserted[sheet_name] = set()
+
+            spill_path = self.__spill_path(sheet_name)
+            if spill_path.exists():
+                rows = loads(spill_path.read_text(encoding="utf-8"))
+                logger.warning(f"Restoring {len(rows)} unwritten rows of sheet '{sheet_name}'")
+                for row in rows:
+                    self.put(sheet_name, row, flush=False)
+        return self.__data[sheet_name]
+
+    def put(self, sheet_name: str, values: dict, flush: bool = True) -> None:
+        """
+        Buffer an update of the row with the same ПІБ, or an insert if there is no such row.
+        :param values: Column values, other columns of an existing row are kept
+        :param flush: Flush the sheet if a threshold is reached
+        """
+        with self.__lock:
+            self.__put(sheet_name, values, flush)
+
+    def __put(self, sheet_name: str, values: dict, flush: bool) -> None:
+        data = self.__get_data(sheet_name)
+        key = values[self.KEY_COLUMN]
+        index = self.__find_row(data, key)
+        changed = set(values.keys())
+        if index is None:
+            index = len(data)
+            data.loc[index] = {column: values.get(column, "") for column in data.columns}
+            self.__inserted[sheet_name].add(key)
+        for column, value in values.items():
+            if column not in data.columns:
+                data[column] = ""
+                self.__header_changed.add(sheet_name)
+            data[column] = data[column].astype(object)
+            data.at[index, column] = value
+
+        self.__pending[sheet_name].setdefault(key, set()).update(changed)
+        self.__pending_since.setdefault(sheet_name, monotonic())
+        self.__spill(sheet_name)
+
+        if flush and (
+                len(self.__pending[sheet_name]) >= self.__config.WRITE_BUFFER_SIZE
+                or monotonic() - self.__pending_since[sheet_name] >= self.__config.WRITE_BUFFER_INTERVAL
+        ):
+            self.flush(sheet_name)
+
+    @staticmethod
+    def __get_values(data: pd.DataFrame, index: int, first: int, last: int) -> list:
+        return [
+            value.item() if hasattr(value, "item") else value
+            for value in data.iloc[index, first:last + 1].tolist()
+        ]
+
+    def __get_live_rows(self, worksheet, sheet_name: str) -> dict[str, int]:
+        """
+        Get sheet row numbers by key from the live key column.
+        """
+        columns = list(self.__data[sheet_name].columns)
+        if self.KEY_COLUMN not in columns:
+            return {}
+        values = worksheet.col_values(columns.index(self.KEY_COLUMN) + 1)
+        if not values:
+            return {}
+        if values[0] != self.KEY_COLUMN:
+            raise ValueError(f"Column {self.KEY_COLUMN} of sheet '{sheet_name}' moved since the snapshot")
+        rows: dict[str, int] = {}
+        for row, key in enumerate(values[1:], start=2):
+            rows.setdefault(key, row)
+        return rows
+
+    def __get_writes(self, sheet_name: str, rows: dict[str, int]) -> tuple[list[dict], list[list], set[str]]:
+        """
+        Get the writes of the pending rows.
+        :param rows: Sheet row numbers by key
+        :return: Value ranges of updated rows, from the first to the last changed column,
+            values of inserted rows and keys of updated rows missing from the sheet
+        """
+        data = self.__data[sheet_name].fillna("")
+        columns = list(data.columns)
+        ranges = []
+        inserted = []
+        missing = set()
+        if sheet_name in self.__header_changed:
+            ranges.append({
+                "range": absolute_range_name(sheet_name, f"A1:{rowcol_to_a1(1, len(columns))}"),
+                "values": [columns],
+            })
+
+        for key, changed in self.__pending[sheet_name].items():
+            index = self.__find_row(data, key)
+            row = rows.get(key)
+            if index is None:
+                missing.add(key)
+                continue
+            if row is None:
+                if key in self.__inserted[sheet_name]:
+                    inserted.append(self.__get_values(data, index, 0, len(columns) - 1))
+                else:
+                    missing.add(key)
+                continue
+
+            # An inserted key already in the sheet was added by someone else, only its changed cells are written
+            positions = [columns.index(column) for column in changed if column in columns]
+            first, last = min(positions), max(positions)
+            ranges.append({
+                "range": absolute_range_name(
+                    sheet_name,
+                    f"{rowcol_to_a1(row, first + 1)}:{rowcol_to_a1(row, last + 1)}"
+                ),
+                "values": [self.__get_values(data, index, first, last)],
+            })
+        return ranges, inserted, missing
+
+    def flush(self, sheet_name: str | None = None) -> bool:
+        """
+        Write pending rows with one values update per sheet.
+        A failed write is retried with backoff, pending rows stay buffered if all attempts fail.
+        :param sheet_name: Sheet to flush, all sheets if None
+        :return: True if nothing is left pending
+        """
+        with self.__lock:
+            return self.__flush(sheet_name)
+
+    def __flush(self, sheet_name: str | None) -> bool:
+        sheet_names = [sheet_name] if sheet_name else list(self.__pending)
+        flushed = True
+        for name in sheet_names:
+            if not self.__pending.get(name):
+                continue
+            # Dropped after an append, rows left pending are restored from the spill file
+            self.__get_data(name)
+
+            inserted: list[list] = []
+            missing: set[str] = set()
+            written = False
+            for attempt in range(1, self.__config.WRITE_RETRIES + 1):
+                try:
+                    worksheet = self.__client.spreadsheet.worksheet(name)
+                    columns = len(self.__data[name].columns)
+                    if columns > worksheet.col_count:
+                        worksheet.add_cols(columns - worksheet.col_count)
+                    # Written parts are not repeated by a retry, an append is not idempotent
+                    if not written:
+                        ranges, inserted, missing = self.__get_writes(name, self.__get_live_rows(worksheet, name))
+                        if ranges:
+                            self.__client.spreadsheet.values_batch_update({
+                                "valueInputOption": "RAW",
+                                "data": ranges,
+                            })
+                        written = True
+                    if inserted:
+                        worksheet.append_rows(
+                            inserted,
+                            value_input_option="RAW",
+                            insert_data_option="INSERT_ROWS",
+                            table_range="A1",
+                        )
+                    break
+                except Exception as e:
+                    logger.warning(f"Flush of sheet '{name}' failed (attempt {attempt}): {e}")
+                    if attempt < self.__config.WRITE_RETRIES:
+                        sleep(2 ** attempt)
+            else:
+                logger.error(f"{len(self.__pending[name])} rows of sheet '{name}' stay buffered")
+                flushed = False
+                continue
+
+            logger.info(f"Flushed {len(self.__pending[name]) - len(missing)} rows to sheet '{name}'")
+            self.__header_changed.discard(name)
+            self.__client.invalidate_header(name)
+            if missing:
+                logger.warning(f"Rows {sorted(missing)} are no longer in sheet '{name}', they stay buffered")
+                self.__pending[name] = {key: self.__pending[name][key] for key in missing}
+                self.__spill(name)
+                flushed = False
+            else:
+                self.__pending[name].clear()
+                self.__pending_since.pop(name, None)
+                self.__spill_path(name).unlink(missing_ok=True)
+            if inserted:
+                # Appended rows may not be where the snapshot has them
+                del self.__data[name]
+        return flushed
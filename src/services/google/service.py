@@ -1,12 +1,19 @@
+from hashlib import sha256
+from threading import Lock
+
 import gspread
 import pandas as pd
+from gspread.utils import absolute_range_name
+from pydantic import ValidationError
 
 from loguru import logger
 
 from services.student_variant.service import StudentVariant
 
 from clients.google import GoogleSheetsClient
-from models.google.entity import ReviewModel
+from services.google.buffer import SheetWriteBuffer
+from models.bulk.entity import BulkTarget
+from models.google.entity import ReviewModel, LabSettingsModel
 from utils.enums.sheets import SheetsNamingEnum
 
 
@@ -23,30 +30,88 @@ class GoogleSheet:
         "Підсумок",
         "Кнопка перевірки ще раз"
     ]
+    SIMILARITY_COLUMN = "Схожість"
+    PROMPT_REGISTRY_COLUMNS = ["key", "prompt", "created_at"]
+    PROMPT_KEY_PREFIX = "prompt:"
+    # Registry keys known to the process by spreadsheet and sheet, shared by all instances and scheduler threads
+    _prompt_keys: dict[str, set[str]] = {}
+    _prompt_keys_lock = Lock()
 
-    def __init__(self):
+    def __init__(self, buffered: bool = False):
+        """
+        :param buffered: Collect student rows in a write-back buffer instead of rewriting the sheet per response,
+            `flush` must be called at the end
+        """
         self.__client = GoogleSheetsClient()
         self.__config = self.__client.config
+        self.__write_buffer = SheetWriteBuffer(self.__client, self.ALL_COLUMNS) if buffered else None
+        self.__prompts_sheet: pd.DataFrame | None = None
 
-    def get_teacher_prompts(self, name: str) -> list[str]:
+    def get_prompts_sheet(self) -> pd.DataFrame:
         """
-        Get teacher prompts for a specific lab.
+        Get the prompts sheet, it is read once per instance.
         """
-        try:
-            sheet = self.__client.get_sheet_data(
+        if self.__prompts_sheet is None:
+            self.__prompts_sheet = self.__client.get_sheet_data(
                 self.__config.get_sheet_name(
                     SheetsNamingEnum.PROMPTS
                 )
             )
-            matching_prompts = sheet.loc[sheet['lab_name'] == name, 'Prompt']
-            if matching_prompts.empty:
+        return self.__prompts_sheet
+
+    def flush(self) -> bool:
+        """
+        Write buffered student rows.
+        :return: True if nothing is left pending
+        """
+        if self.__write_buffer is None:
+            return True
+        return self.__write_buffer.flush()
+
+    def get_lab_settings(self, name: str) -> LabSettingsModel:
+        """
+        Get teacher prompts and optional per-lab settings from the prompts sheet.
+        Empty cells fall back to the global configuration.
+        """
+        try:
+            sheet = self.get_prompts_sheet()
+            matching_rows = sheet.loc[sheet['lab_name'] == name]
+            if matching_rows.empty:
                 logger.warning(f"No prompts found for lab name: {name}")
-                return []
-            prompts = matching_prompts.values[0]
-            return prompts.split(";;")
+                return LabSettingsModel(lab_name=name)
+            return self.parse_lab_settings(name, matching_rows.iloc[0].to_dict())
         except Exception as e:
-            logger.error(f"An error occurred while getting teacher prompts: {e}")
-            return []
+            logger.error(f"An error occurred while getting lab settings: {e}")
+            return LabSettingsModel(lab_name=name)
+
+    @staticmethod
+    def parse_lab_settings(name: str, row: dict) -> LabSettingsModel:
+        """
+        Parse a row of the prompts sheet.
+        Optional settings are validated one by one, an invalid cell is logged and falls back to the global configuration
+        instead of dropping the prompts and the other settings of the lab.
+        :raises AttributeError: If the prompt cell is empty
+        """
+        settings = LabSettingsModel(lab_name=name, prompts=row['Prompt'].split(";;"))
+        values = {}
+        for column in LabSettingsModel.model_fields.keys() - {"lab_name", "prompts"}:
+            value = row.get(column)
+            if value is None or pd.isna(value) or not str(value).strip():
+                continue
+            value = str(value).strip()
+            try:
+                LabSettingsModel.model_validate({"lab_name": name, column: value})
+            except ValidationError as e:
+                logger.warning(f"Ignoring invalid {column} {value!r} of lab {name}: {e.errors()[0]['msg']}")
+                continue
+            values[column] = value
+        return LabSettingsModel.model_validate({**settings.model_dump(), **values})
+
+    def get_teacher_prompts(self, name: str) -> list[str]:
+        """
+        Get teacher prompts for a specific lab.
+        """
+        return self.get_lab_settings(name).prompts
 
     def get_variants_sheet(self) -> pd.DataFrame:
         """
@@ -74,13 +139,13 @@ class GoogleSheet:
         """
 
         try:
-            data = self.__client.get_sheet_data(
+            rows = self.__client.get_columns(
                 self.__config.get_sheet_name(
                     SheetsNamingEnum.ROSTER
-                )
+                ),
+                {"nickname": "github_username"}
             )
-            nicknames = data["github_username"].dropna().tolist()
-            nicknames = [nick for nick in nicknames if nick.strip()]
+            nicknames = [row["nickname"] for row in rows if row["nickname"].strip()]
             return nicknames
         except Exception as e:
             logger.error(f"An error occurred while getting all nicknames: {e}")
@@ -89,29 +154,33 @@ class GoogleSheet:
     def get_all_lab_names(self) -> list[str]:
         """
         Get all lab names from the Google Sheet.
+        The loaded prompts sheet is reused, otherwise only the lab name column is read.
         :return:
         """
         try:
-            data = self.__client.get_sheet_data(
+            if self.__prompts_sheet is not None and "lab_name" in self.__prompts_sheet.columns:
+                lab_names = self.__prompts_sheet["lab_name"].dropna().astype(str).tolist()
+                return [name for name in lab_names if name.strip()]
+
+            rows = self.__client.get_columns(
                 self.__config.get_sheet_name(
                     SheetsNamingEnum.PROMPTS
-                )
+                ),
+                {"lab_name": "lab_name"}
             )
-            lab_names = data["lab_name"].dropna().tolist()
-            lab_names = [name for name in lab_names if name.strip()]
+            lab_names = [row["lab_name"] for row in rows if row["lab_name"].strip()]
             return lab_names
         except Exception as e:
             logger.error(f"An error occurred while getting all lab names: {e}")
             return []
 
-    def get_all_repositories(self, sheet_name: str) -> list[str]:
+    def get_all_repositories(self, sheet_name: str) -> list[tuple[str, str]]:
         """
         Get all repositories from the Google Sheet.
         """
         try:
-            data = self.__client.get_sheet_data(sheet_name)
-            repositories = data["Лінк на останній PR"].dropna().tolist()
-            repositories = [repo for repo in repositories if repo.strip()]
+            rows = self.__client.get_columns(sheet_name, {"link": "Лінк на останній PR"})
+            repositories = [row["link"] for row in rows if row["link"].strip()]
 
             result = []
             for repo in repositories:
@@ -123,6 +192,195 @@ class GoogleSheet:
             logger.error(f"An error occurred while getting all repositories: {e}")
             return []
 
+    def get_bulk_targets(self, sheet_name: str) -> list[BulkTarget]:
+        """
+        Get repositories of a lab sheet with their last attempt time and review state.
+        Only the needed columns are read, long comment and prompt cells are not downloaded.
+        """
+        try:
+            rows = self.__client.get_columns(sheet_name, {
+                "student": "github nickname",
+                "attempt_time": "Час здачі",
+                "link": "Лінк на останній PR",
+                "summary": "Підсумок",
+            })
+        except Exception as e:
+            logger.error(f"An error occurred while getting bulk targets: {e}")
+            return []
+
+        targets = []
+        for row in rows:
+            parts = row["link"].strip().split("/")
+            if len(parts) < 5:
+                continue
+            targets.append(BulkTarget(
+                lab_name=sheet_name,
+                owner=parts[3],
+                repository=parts[4],
+                student=row["student"].strip() or None,
+                attempt_time=row["attempt_time"].strip() or None,
+                reviewed=bool(row["summary"].strip()),
+            ))
+        return targets
+
+    def provision_lab_sheets(self, lab_names: list[str] | None = None) -> list[str]:
+        """
+        Create the missing lab sheets from the template sheet in one batch update.
+        :param lab_names: Labs to provision, all labs of the prompts sheet by default
+        :return: Names of the created sheets
+        """
+        if lab_names is None:
+            lab_names = self.get_all_lab_names()
+        return self.__client.provision_sheets(
+            sheet_names=lab_names,
+            template_name=self.__config.get_sheet_name(
+                SheetsNamingEnum.TEMPLATE,
+                default=SheetsNamingEnum.TEMPLATE.value
+            ),
+            header=self.ALL_COLUMNS
+        )
+
+    @classmethod
+    def get_prompt_key(cls, prompt: str) -> str:
+        """
+        Get the content-addressed key of a prompt.
+        """
+        digest = sha256(prompt.encode("utf-8")).hexdigest()
+        return f"{cls.PROMPT_KEY_PREFIX}{digest[:16]}"
+
+    def __get_prompt_registry_name(self) -> str:
+        return self.__config.get_sheet_name(SheetsNamingEnum.PROMPT_REGISTRY, default="PromptRegistry")
+
+    def __get_prompt_registry(self) -> gspread.Worksheet:
+        """
+        Get the prompt registry sheet, creating it if it doesn't exist.
+        """
+        return self.__client.get_or_create_sheet(self.__get_prompt_registry_name(), header=self.PROMPT_REGISTRY_COLUMNS)
+
+    def __read_prompt_keys(self, sheet_name: str) -> set[str]:
+        """
+        Read only the key column of the registry, without looking the worksheet up first.
+        """
+        try:
+            values = self.__client.spreadsheet.values_get(absolute_range_name(sheet_name, "A2:A")).get("values", [])
+        except gspread.exceptions.APIError:
+            # Most likely the registry doesn't exist yet
+            return {str(key) for key in self.__get_prompt_registry().col_values(1)[1:] if key}
+        return {row[0] for row in values if row}
+
+    def register_prompts(self, prompts: list[str]) -> dict[str, str]:
+        """
+        Store prompts in the registry sheet once, keyed by their hash.
+        Known keys are cached per process, the registry is read again only for a key the process hasn't seen.
+        :param prompts: Full prompt texts
+        :return: Mapping of prompt text to its registry key
+        """
+        keys = {prompt: self.get_prompt_key(prompt) for prompt in prompts}
+        sheet_name = self.__get_prompt_registry_name()
+        cache_key = f"{self.__config.SPREADSHEET_URL}#{sheet_name}"
+        # Held over the read and the append, so concurrent reviews don't register the same key twice
+        with GoogleSheet._prompt_keys_lock:
+            known = GoogleSheet._prompt_keys.get(cache_key)
+            if known is None or not known.issuperset(keys.values()):
+                # Another process may have registered the key meanwhile
+                known = GoogleSheet._prompt_keys[cache_key] = self.__read_prompt_keys(sheet_name)
+
+            date = pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
+            new_rows = [[key, prompt, date] for prompt, key in keys.items() if key not in known]
+            if new_rows:
+                self.__client.spreadsheet.values_append(
+                    absolute_range_name(sheet_name, "A1"),
+                    params={"valueInputOption": "RAW", "insertDataOption": "INSERT_ROWS"},
+                    body={"values": new_rows},
+                )
+                known.update(row[0] for row in new_rows)
+                logger.info(f"Registered {len(new_rows)} new prompts")
+        return keys
+
+    def register_prompt(self, prompt: str) -> str:
+        """
+        Store a prompt in the registry sheet and return its key.
+        """
+        return self.register_prompts([prompt])[prompt]
+
+    def migrate_prompts(self, sheet_names: list[str] | None = None) -> int:
+        """
+        Replace full prompts in lab sheets with registry keys.
+        All prompts are registered in one append, then every sheet is rewritten once.
+        :param sheet_names: Lab sheets to migrate, all labs by default
+        :return: Number of migrated cells
+        """
+        if sheet_names is None:
+            sheet_names = self.get_all_lab_names()
+
+        sheets: dict[str, pd.DataFrame] = {}
+        prompts: set[str] = set()
+        for sheet_name in sheet_names:
+            data = self.__client.get_sheet_data(sheet_name)
+            if data.empty or "Промт" not in data.columns:
+                continue
+            values = data["Промт"].astype(str)
+            legacy = values[(values.str.strip() != "") & ~values.str.startswith(self.PROMPT_KEY_PREFIX)]
+            if legacy.empty:
+                continue
+            sheets[sheet_name] = data
+            prompts.update(legacy.tolist())
+
+        if not prompts:
+            logger.info("No prompts to migrate")
+            return 0
+
+        keys = self.register_prompts(sorted(prompts))
+        migrated = 0
+        for sheet_name, data in sheets.items():
+            mask = data["Промт"].astype(str).isin(keys.keys())
+            data.loc[mask, "Промт"] = data.loc[mask, "Промт"].astype(str).map(keys)
+            self.__client.write_dataframe_to_sheet(sheet_name, data)
+            migrated += int(mask.sum())
+            logger.info(f"Migrated {int(mask.sum())} prompts in sheet '{sheet_name}'")
+        return migrated
+
+    def write_usage_summary(self, summary: pd.DataFrame) -> None:
+        """
+        Write the aggregated token usage summary to the usage sheet in one batched write.
+        Called once per bulk run, live reviews only append to the ledger.
+        """
+        sheet_name = self.__config.get_sheet_name(SheetsNamingEnum.USAGE, default="Usage")
+        self.__client.get_or_create_sheet(sheet_name, header=summary.columns.tolist())
+        self.__client.write_dataframe_to_sheet(sheet_name, summary)
+        logger.info(f"Usage summary with {len(summary)} rows written to sheet '{sheet_name}'")
+
+    def write_similarity(self, sheet_name: str, matches: dict[str, tuple[str, float]]) -> None:
+        """
+        Write the most similar submission of every student into the lab sheet in one batched update.
+        :param sheet_name: Lab sheet
+        :param matches: GitHub username -> (most similar username, similarity)
+        """
+        sheet = self.__client.spreadsheet.worksheet(sheet_name)
+        header = self.__client.get_headers([sheet_name])[sheet_name]
+        if "github nickname" not in header:
+            logger.warning(f"Sheet '{sheet_name}' has no 'github nickname' column, skipping similarity")
+            return
+
+        nicknames = [row["nickname"] for row in self.__client.get_columns(sheet_name, {"nickname": "github nickname"})]
+        if self.SIMILARITY_COLUMN in header:
+            column = header.index(self.SIMILARITY_COLUMN) + 1
+        else:
+            column = len(header) + 1
+            if column > sheet.col_count:
+                sheet.add_cols(column - sheet.col_count)
+
+        values = [[self.SIMILARITY_COLUMN]]
+        for nickname in nicknames:
+            match = matches.get(nickname)
+            values.append([f"{match[1]:.0%} ({match[0]})" if match else ""])
+
+        start = gspread.utils.rowcol_to_a1(1, column)
+        end = gspread.utils.rowcol_to_a1(len(values), column)
+        sheet.update(values, f"{start}:{end}")
+        self.__client.invalidate_header(sheet_name)
+        logger.info(f"Similarity of {len(matches)} students written to sheet '{sheet_name}'")
+
     def leave_response(
             self,
             student_variant: StudentVariant,
@@ -135,12 +393,32 @@ class GoogleSheet:
     ) -> bool:
         """
         Leave response in the Google Sheet.
+        The prompt is stored in the prompt registry and only its key is written to the row.
         """
+        if prompt:
+            try:
+                prompt = self.register_prompt(prompt)
+            except Exception as e:
+                logger.error(f"An error occurred while registering prompt, storing it inline: {e}")
+
+        if self.__write_buffer is not None and self.__write_buffer.is_loaded(sheet_name):
+            return self.__buffer_response(
+                self.__write_buffer,
+                student_variant, student_name, sheet_name, ai_response, last_pr_link, prompt, summary
+            )
+
         try:
             sheet = self.__client.spreadsheet.worksheet(sheet_name)
         except gspread.exceptions.WorksheetNotFound:
             logger.info(f"Sheet {sheet_name} not found, creating a new one")
-            sheet = self.__client.copy_template_to_new_sheet(sheet_name)
+            self.provision_lab_sheets([sheet_name])
+            sheet = self.__client.spreadsheet.worksheet(sheet_name)
+
+        if self.__write_buffer is not None:
+            return self.__buffer_response(
+                self.__write_buffer,
+                student_variant, student_name, sheet_name, ai_response, last_pr_link, prompt, summary
+            )
 
         try:
             records = sheet.get_all_records()
@@ -149,7 +427,7 @@ class GoogleSheet:
                 records = sheet.get_all_records()
 
             data = pd.DataFrame(records)
-            logger.debug(data.to_string())
+            logger.opt(lazy=True).debug("{}", data.to_string)
             found, row_number = self.__get_student_row(data, student_name)
             if not found:
                 logger.warning(f"Student '{student_name}' not found in sheet '{sheet_name}', inserting...")
@@ -179,6 +457,54 @@ class GoogleSheet:
             logger.error(f"An error occurred while leaving response: {e}")
             return False
 
+    def __buffer_response(
+            self,
+            write_buffer: SheetWriteBuffer,
+            student_variant: StudentVariant,
+            student_name: str,
+            sheet_name: str,
+            ai_response: str,
+            last_pr_link: str,
+            prompt: str,
+            summary: str,
+    ) -> bool:
+        """
+        Put the response into the write-back buffer, a new student row is inserted with it.
+        """
+        try:
+            data = write_buffer.get_data(sheet_name)
+            found, _ = self.__get_student_row(data, student_name)
+            values = {}
+            if not found:
+                logger.info(f"Student '{student_name}' not found in sheet '{sheet_name}', buffering an insert")
+                model = ReviewModel(
+                    variant_number=student_variant.student_variant,
+                    student_name=student_name,
+                    student_github_username=student_variant.student_username,
+                    comment=None,
+                    attempt_number=0,
+                    attempt_time=None,
+                    last_pr_link=None,
+                    prompt=None,
+                    summary=None,
+                    retry_button=None
+                )
+                values = {column: value[0] for column, value in model.to_pd_dict().items()}
+            values.update({
+                "ПІБ": student_name,
+                "Коментар бота": ai_response,
+                "№ Спроби": self.__get_student_attempts(data, student_name) + 1,
+                "Час здачі": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "Лінк на останній PR": last_pr_link,
+                "Промт": prompt,
+                "Підсумок": summary,
+            })
+            write_buffer.put(sheet_name, values)
+            return True
+        except Exception as e:
+            logger.error(f"An error occurred while buffering response: {e}")
+            return False
+
     @staticmethod
     def __get_student_row(data: pd.DataFrame, student_name: str) -> tuple[bool, int]:
         """
@@ -191,11 +517,11 @@ class GoogleSheet:
                 return False, 1
 
             students = data['ПІБ'].tolist()
-            logger.debug(f"Looking for student '{student_name}' in {len(students)} rows")
+            logger.debug("Looking for student '{}' in {} rows", student_name, len(students))
             
             if student_name in students:
                 row_number = students.index(student_name) + 1
-                logger.debug(f"Found student '{student_name}' at row {row_number}")
+                logger.debug("Found student '{}' at row {}", student_name, row_number)
                 return True, row_number
             else:
                 row_number = len(students) + 1
@@ -284,7 +610,7 @@ class GoogleSheet:
                 return True
 
             data = pd.DataFrame(sheet.get_all_records())
-            logger.debug(f"Current sheet has {len(data)} rows")
+            logger.debug("Current sheet has {} rows", len(data))
             
             model = ReviewModel(
                 variant_number=student_variant.student_variant,
@@ -300,7 +626,7 @@ class GoogleSheet:
             )
             new_student = pd.DataFrame(model.to_pd_dict())
             data = pd.concat([data, new_student], ignore_index=True)
-            logger.debug(f"After concat, sheet has {len(data)} rows")
+            logger.debug("After concat, sheet has {} rows", len(data))
             
             self.__client.write_dataframe_to_sheet(sheet_name, data)
             logger.info(f"Successfully appended student '{student_variant.student_real_name}' to sheet")
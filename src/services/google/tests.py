@@ -0,0 +1,302 @@
+"""
+This module contains tests for the Google Sheets service
+"""
+
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from uuid import uuid4
+from unittest.mock import patch
+
+import pandas as pd
+from gspread.utils import a1_to_rowcol
+
+from services.google.buffer import SheetWriteBuffer
+from configs.google import GoogleSheetsConfig
+from services.google.service import GoogleSheet
+
+
+class LabSettingsTest(unittest.TestCase):
+    """
+    Testing parsing of per-lab settings from the prompts sheet
+    """
+
+    def test_valid_row(self):
+        """
+        All settings of a valid row are parsed
+        :return:
+        """
+        settings = GoogleSheet.parse_lab_settings("lab1", {
+            "Prompt": "first;;second",
+            "triage_threshold": "0.8",
+            "rubric_mode": "TRUE",
+            "deadline": "20.10.2026",
+        })
+        self.assertEqual(settings.prompts, ["first", "second"])
+        self.assertEqual(settings.triage_threshold, 0.8)
+        self.assertTrue(settings.rubric_mode)
+        self.assertEqual(settings.deadline.date(), datetime(2026, 10, 20).date())
+
+    def test_invalid_cell_drops_only_that_setting(self):
+        """
+        A malformed optional cell falls back to the global configuration, the rest of the row is kept
+        :return:
+        """
+        settings = GoogleSheet.parse_lab_settings("lab1", {
+            "Prompt": "first",
+            "triage_threshold": "0,8",
+            "deadline": "next friday",
+            "review_model": "gpt-5",
+        })
+        self.assertEqual(settings.prompts, ["first"])
+        self.assertIsNone(settings.triage_threshold)
+        self.assertIsNone(settings.deadline)
+        self.assertEqual(settings.review_model, "gpt-5")
+
+    def test_empty_cells(self):
+        """
+        Empty cells are not settings
+        :return:
+        """
+        settings = GoogleSheet.parse_lab_settings("lab1", {
+            "Prompt": "first",
+            "review_model": "  ",
+            "rubric_mode": None,
+        })
+        self.assertIsNone(settings.review_model)
+        self.assertIsNone(settings.rubric_mode)
+
+
+class FakeWorksheet:
+    """
+    Worksheet of a fake spreadsheet, rows are lists of cell values with the header first
+    """
+
+    def __init__(self, rows: list[list]):
+        self.rows = rows
+        self.col_count = 26
+        self.appends = 0
+
+    @property
+    def row_count(self) -> int:
+        return len(self.rows)
+
+    def add_cols(self, count: int):
+        self.col_count += count
+
+    def col_values(self, column: int) -> list:
+        return [row[column - 1] for row in self.rows if len(row) >= column]
+
+    def append_rows(self, values, value_input_option=None, insert_data_option=None, table_range=None):
+        self.appends += 1
+        self.rows.extend(values)
+
+
+class FakeSpreadsheet:
+    """
+    Spreadsheet with one worksheet that applies A1 value ranges of one row
+    """
+
+    def __init__(self, worksheet: FakeWorksheet):
+        self.sheet = worksheet
+        self.failures = 0
+
+    def worksheet(self, name: str) -> FakeWorksheet:
+        return self.sheet
+
+    def values_batch_update(self, body: dict):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("quota exceeded")
+        for value_range in body["data"]:
+            start, _ = value_range["range"].split("!")[1].split(":")
+            row, column = a1_to_rowcol(start)
+            cells = self.sheet.rows[row - 1]
+            for offset, value in enumerate(value_range["values"][0]):
+                cells[column - 1 + offset] = value
+
+
+class FakeSheetsClient:
+    """
+    Sheets client reading and writing a fake spreadsheet
+    """
+
+    def __init__(self, rows: list[list]):
+        self.spreadsheet = FakeSpreadsheet(FakeWorksheet(rows))
+        self.config = SimpleNamespace(WRITE_BUFFER_SIZE=100, WRITE_BUFFER_INTERVAL=3600, WRITE_RETRIES=2)
+
+    def get_sheet_data(self, sheet_name: str) -> pd.DataFrame:
+        header, *rows = self.spreadsheet.sheet.rows
+        return pd.DataFrame([dict(zip(header, row)) for row in rows], columns=header)
+
+    def invalidate_header(self, sheet_name: str):
+        pass
+
+
+class SheetWriteBufferTest(unittest.TestCase):
+    """
+    Testing updates and inserts of the write-back buffer
+    """
+
+    def setUp(self):
+        """
+        Create a buffer over a sheet with one student
+        :return:
+        """
+        self.client = FakeSheetsClient([["ПІБ", "Оцінка"], ["Student A", "1"]])
+        self.buffer = SheetWriteBuffer(self.client, ["ПІБ", "Оцінка"], cache_dir=Path(tempfile.mkdtemp()))
+
+    def test_update_existing_row(self):
+        """
+        An update is written to the row of the student
+        :return:
+        """
+        self.buffer.put("lab", {"ПІБ": "Student A", "Оцінка": "5"})
+        self.assertTrue(self.buffer.flush())
+        self.assertEqual(self.client.spreadsheet.sheet.rows, [["ПІБ", "Оцінка"], ["Student A", "5"]])
+
+    def test_insert_doesnt_overwrite_rows_added_since_the_snapshot(self):
+        """
+        A new student is appended after rows another writer added since the sheet was read
+        :return:
+        """
+        self.buffer.get_data("lab")
+        self.client.spreadsheet.sheet.rows.append(["Student B", "3"])
+        self.buffer.put("lab", {"ПІБ": "Student C", "Оцінка": "4"})
+        self.assertTrue(self.buffer.flush())
+        self.assertEqual(
+            self.client.spreadsheet.sheet.rows,
+            [["ПІБ", "Оцінка"], ["Student A", "1"], ["Student B", "3"], ["Student C", "4"]]
+        )
+        self.assertIn("Student B", self.buffer.get_data("lab")["ПІБ"].tolist())
+
+    def test_update_follows_rewritten_sheet(self):
+        """
+        An update goes to the row of its key after the sheet was rewritten since the snapshot
+        :return:
+        """
+        self.buffer.get_data("lab")
+        self.client.spreadsheet.sheet.rows[1:] = [["Student B", "3"], ["Student A", "1"]]
+        self.buffer.put("lab", {"ПІБ": "Student A", "Оцінка": "5"})
+        self.assertTrue(self.buffer.flush())
+        self.assertEqual(self.client.spreadsheet.sheet.rows[1:], [["Student B", "3"], ["Student A", "5"]])
+
+    def test_removed_row_stays_pending(self):
+        """
+        An update of a row removed from the sheet is kept instead of being written over another row
+        :return:
+        """
+        self.buffer.get_data("lab")
+        self.client.spreadsheet.sheet.rows[1:] = [["Student B", "3"]]
+        self.buffer.put("lab", {"ПІБ": "Student A", "Оцінка": "5"})
+        self.assertFalse(self.buffer.flush())
+        self.assertEqual(self.client.spreadsheet.sheet.rows[1:], [["Student B", "3"]])
+        self.client.spreadsheet.sheet.rows.append(["Student A", "1"])
+        self.assertTrue(self.buffer.flush())
+        self.assertEqual(self.client.spreadsheet.sheet.rows[2], ["Student A", "5"])
+
+    def test_retry_doesnt_repeat_append(self):
+        """
+        A retried flush writes every inserted row once
+        :return:
+        """
+        self.client.spreadsheet.failures = 1
+        self.buffer.put("lab", {"ПІБ": "Student A", "Оцінка": "5"})
+        self.buffer.put("lab", {"ПІБ": "Student C", "Оцінка": "4"})
+        with patch("services.google.buffer.sleep"):
+            self.assertTrue(self.buffer.flush())
+        self.assertEqual(self.client.spreadsheet.sheet.appends, 1)
+        self.assertEqual(self.client.spreadsheet.sheet.rows[1:], [["Student A", "5"], ["Student C", "4"]])
+
+    def test_failed_flush_is_restored(self):
+        """
+        Rows of a flush that failed every attempt are restored by a new buffer
+        :return:
+        """
+        cache_dir = Path(tempfile.mkdtemp())
+        buffer = SheetWriteBuffer(self.client, ["ПІБ", "Оцінка"], cache_dir=cache_dir)
+        self.client.spreadsheet.failures = 2
+        buffer.put("lab", {"ПІБ": "Student A", "Оцінка": "5"})
+        with patch("services.google.buffer.sleep"):
+            self.assertFalse(buffer.flush())
+        restored = SheetWriteBuffer(self.client, ["ПІБ", "Оцінка"], cache_dir=cache_dir)
+        restored.get_data("lab")
+        self.assertTrue(restored.flush())
+        self.assertEqual(self.client.spreadsheet.sheet.rows[1], ["Student A", "5"])
+
+
+class FakeRegistrySpreadsheet:
+    """
+    Spreadsheet with a prompt registry that counts reads and appends
+    """
+
+    def __init__(self):
+        self.rows = [["key", "prompt", "created_at"]]
+        self.reads = 0
+        self.appends = 0
+
+    def values_get(self, range_name: str) -> dict:
+        self.reads += 1
+        return {"values": [row[:1] for row in self.rows[1:]]}
+
+    def values_append(self, range_name: str, params: dict, body: dict):
+        self.appends += 1
+        self.rows.extend(body["values"])
+
+
+class PromptRegistryTest(unittest.TestCase):
+    """
+    Testing registration of prompts by key
+    """
+
+    def setUp(self):
+        """
+        Create a sheets service over a registry unique to the test, known keys are cached per process
+        :return:
+        """
+        self.spreadsheet = FakeRegistrySpreadsheet()
+        config = GoogleSheetsConfig.model_construct(
+            SPREADSHEET_URL=f"https://sheets.test/{uuid4().hex}",
+            SHEETS_NAMING={"prompt_registry": "Registry"},
+        )
+        client = SimpleNamespace(spreadsheet=self.spreadsheet, config=config)
+        with patch("services.google.service.GoogleSheetsClient", return_value=client):
+            self.first = GoogleSheet()
+            self.second = GoogleSheet()
+
+    def test_known_key_is_not_read_again(self):
+        """
+        A key registered by one instance is known to the others of the process
+        :return:
+        """
+        key = self.first.register_prompt("prompt")
+        self.assertEqual(self.second.register_prompt("prompt"), key)
+        self.assertEqual((self.spreadsheet.reads, self.spreadsheet.appends), (1, 1))
+
+    def test_concurrent_registration_appends_once(self):
+        """
+        Concurrent reviews with the same prompt register it once
+        :return:
+        """
+        threads = [
+            threading.Thread(target=service.register_prompt, args=("prompt",))
+            for service in (self.first, self.second) * 4
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.spreadsheet.rows), 2)
+
+    def test_key_registered_by_another_process(self):
+        """
+        A key already in the registry is not appended again
+        :return:
+        """
+        self.spreadsheet.rows.append([GoogleSheet.get_prompt_key("prompt"), "prompt", ""])
+        self.first.register_prompts(["prompt", "other"])
+        self.assertEqual([row[1] for row in self.spreadsheet.rows[1:]], ["prompt", "other"])
+
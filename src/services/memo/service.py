@@ -0,0 +1,201 @@
+import re
+import sqlite3
+from contextlib import contextmanager
+from json import dumps, loads
+from pathlib import Path
+from time import time
+from typing import Callable, Iterator
+
+from loguru import logger
+
+from configs.memo import MemoConfig
+from configs.storage import StorageConfig
+
+DEFINITION_PATTERN = re.compile(
+    r"^\s*(?:(?:export\s+)?(?:async\s+)?(?:def|class|function|interface|struct|enum)\s+\w+"
+    r"|(?:[\w<>\[\],:*&]+\s+)+[\w:~]+\s*\([^;{}]*\)\s*(?:const\s*)?\{?\s*$)"
+)
+CONTROL_PATTERN = re.compile(r"^\s*(?:if|for|while|switch|return|else|catch|do)\b")
+
+Summarize = Callable[[str, str], str]
+
+
+class FileMemo:
+    """
+    Summaries of files keyed by lab and git blob SHA.
+    A file is summarised with a static outline the first time it is seen.
+    When the same student pushes it again unchanged, or it is a template file every student starts from,
+    the summary is sent instead of the full text, upgraded once to a model summary if a summariser is given.
+    A file first submitted by another student is sent in full and reported in `shared_files`.
+
+    Entries live in a local SQLite database, the least recently used ones are evicted above MAX_ENTRIES.
+    The default path is inside the cache directory, set FILE_MEMO_PATH to keep the memo between fresh containers.
+    """
+    OUTLINE_DEFINITIONS = 30
+
+    def __init__(self, lab_name: str, path: Path | None = None, config: MemoConfig | None = None):
+        self.lab_name = lab_name
+        self.__config = config or MemoConfig()
+        self.__path = path or self.__config.PATH or StorageConfig().get_path("memo", "files.sqlite")
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        self.shared_files: dict[str, list[str]] = {}
+        with self.__connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS file_memo (
+                    lab_name TEXT NOT NULL,
+                    blob_sha TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    students TEXT NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (lab_name, blob_sha)
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS file_memo_last_used ON file_memo (last_used)")
+
+    @contextmanager
+    def __connect(self) -> Iterator[sqlite3.Connection]:
+        # Bulk workers share the database, writers wait for each other instead of failing
+        connection = sqlite3.connect(self.__path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @classmethod
+    def get_outline(cls, path: str, content: str) -> str:
+        """
+        Get a static summary: size and the first top-level definitions of the file.
+        """
+        lines = content.splitlines()
+        definitions = [
+            line.strip()[:120] for line in lines
+            if DEFINITION_PATTERN.match(line) and not CONTROL_PATTERN.match(line)
+        ]
+        outline = f"{path}: {len(lines)} lines"
+        if definitions:
+            outline += ", definitions:\n" + "\n".join(f"  {line}" for line in definitions[:cls.OUTLINE_DEFINITIONS])
+            if len(definitions) > cls.OUTLINE_DEFINITIONS:
+                outline += f"\n  ... {len(definitions) - cls.OUTLINE_DEFINITIONS} more"
+        return outline
+
+    def get_summaries(
+            self,
+            student: str,
+            files: dict[str, str],
+            blob_shas: dict[str, str],
+            summarize: Summarize | None = None,
+            template_paths: set[str] | None = None
+    ) -> dict[str, str]:
+        """
+        Record the files of a submission and get summaries of the files this student submitted before.
+        Summaries are only returned when the submission also has new content,
+        so a resubmission without changes is reviewed in full.
+        Files first submitted by another student are sent in full, their paths and students are kept in `shared_files`.
+        :param files: File contents by path
+        :param blob_shas: Git blob SHAs by path
+        :param summarize: Model summary of a file, takes the path and the content
+        :param template_paths: Paths of files identical to the lab template, reused whoever submitted them first
+        :return: Summaries by path of the files that can be sent as a summary
+        """
+        template_paths = template_paths or set()
+        self.shared_files = {}
+        now = time()
+        reused: dict[str, tuple[str, str]] = {}
+        new_content = False
+        with self.__connect() as connection:
+            for path, content in files.items():
+                sha = blob_shas.get(path)
+                if not sha:
+                    new_content = True
+                    continue
+
+                row = connection.execute(
+                    "SELECT source, students FROM file_memo WHERE lab_name = ? AND blob_sha = ?",
+                    (self.lab_name, sha)
+                ).fetchone()
+                if row is None:
+                    new_content = True
+                    connection.execute(
+                        "INSERT OR IGNORE INTO file_memo "
+                        "(lab_name, blob_sha, path, summary, source, students, last_used) "
+                        "VALUES (?, ?, ?, ?, 'static', ?, ?)",
+                        (self.lab_name, sha, path, self.get_outline(path, content), dumps([student]), now)
+                    )
+                    continue
+
+                source, students = row[0], set(loads(row[1]))
+                if student not in students:
+                    connection.execute(
+                        "UPDATE file_memo SET students = ? WHERE lab_name = ? AND blob_sha = ?",
+                        (dumps(sorted(students | {student})), self.lab_name, sha)
+                    )
+                    # Another student's file is reviewed in full, its summary would hide the copy
+                    if path not in template_paths:
+                        new_content = True
+                        self.shared_files[path] = sorted(students)
+                        continue
+                if len(content) >= self.__config.MIN_SIZE:
+                    reused[path] = (sha, source)
+
+        if self.shared_files:
+            logger.warning(
+                f"File memo: {len(self.shared_files)} files are identical to other students' submissions: "
+                + "; ".join(f"{path} ({', '.join(students)})" for path, students in self.shared_files.items())
+            )
+        if reused and not new_content:
+            logger.info(f"File memo: all {len(reused)} reusable files are unchanged, sending full text")
+            return {}
+
+        # Model summaries are made outside the transaction, so other workers aren't blocked meanwhile
+        upgrades = {}
+        if summarize is not None:
+            for path, (sha, source) in reused.items():
+                if source != "static":
+                    continue
+                try:
+                    upgrades[sha] = summarize(path, files[path])
+                except Exception as e:
+                    logger.error(f"Failed to summarise {path}, keeping the outline: {e}")
+
+        summaries = {}
+        with self.__connect() as connection:
+            for sha, summary in upgrades.items():
+                connection.execute(
+                    "UPDATE file_memo SET summary = ?, source = 'model' WHERE lab_name = ? AND blob_sha = ?",
+                    (summary, self.lab_name, sha)
+                )
+            for path, (sha, _) in reused.items():
+                connection.execute(
+                    "UPDATE file_memo SET hits = hits + 1, last_used = ? WHERE lab_name = ? AND blob_sha = ?",
+                    (now, self.lab_name, sha)
+                )
+                row = connection.execute(
+                    "SELECT summary FROM file_memo WHERE lab_name = ? AND blob_sha = ?",
+                    (self.lab_name, sha)
+                ).fetchone()
+                if row:
+                    summaries[path] = row[0]
+            # Evicted after the reused entries are touched, so they aren't dropped while being sent
+            self.evict(connection)
+
+        if summaries:
+            saved = sum(len(files[path]) - len(summary) for path, summary in summaries.items())
+            logger.info(f"File memo: {len(summaries)} files sent as summaries, ~{saved} characters saved")
+        return summaries
+
+    def evict(self, connection: sqlite3.Connection) -> None:
+        """
+        Delete the least recently used entries above MAX_ENTRIES.
+        """
+        deleted = connection.execute(
+            "DELETE FROM file_memo WHERE rowid IN "
+            "(SELECT rowid FROM file_memo ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.__config.MAX_ENTRIES,)
+        ).rowcount
+        if deleted:
+            logger.debug("File memo: evicted {} entries", deleted)
@@ -0,0 +1,124 @@
+"""
+This module contains tests for the file memo
+"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("OPENAI_MODEL", "test-model")
+
+from configs.memo import MemoConfig
+from services.memo.service import FileMemo
+
+LONG_FILE = "def main():\n" + "    print('hello')\n" * 20
+OTHER_FILE = "class Solution:\n" + "    value = 1\n" * 20
+
+
+class FileMemoTest(unittest.TestCase):
+    """
+    Testing which files are sent as summaries
+    """
+
+    def setUp(self):
+        """
+        Create a memo in a temporary database
+        :return:
+        """
+        self.path = Path(tempfile.mkdtemp()) / "files.sqlite"
+        self.memo = FileMemo("lab1", path=self.path, config=MemoConfig(FILE_MEMO_MIN_SIZE=10))
+
+    def test_outline(self):
+        """
+        The outline lists the size and the definitions of the file
+        :return:
+        """
+        outline = FileMemo.get_outline("main.py", LONG_FILE)
+        self.assertIn("main.py: 21 lines", outline)
+        self.assertIn("def main():", outline)
+        self.assertNotIn("print", outline)
+
+    def test_reuse_own_file(self):
+        """
+        A file the student pushed before is sent as a summary when the submission has new content
+        :return:
+        """
+        self.memo.get_summaries("alice", {"main.py": LONG_FILE}, {"main.py": "a"})
+        summaries = self.memo.get_summaries(
+            "alice", {"main.py": LONG_FILE, "new.py": OTHER_FILE}, {"main.py": "a", "new.py": "b"}
+        )
+        self.assertEqual(list(summaries), ["main.py"])
+        self.assertEqual(self.memo.shared_files, {})
+
+    def test_unchanged_resubmission(self):
+        """
+        A resubmission without changes is reviewed in full
+        :return:
+        """
+        self.memo.get_summaries("alice", {"main.py": LONG_FILE}, {"main.py": "a"})
+        self.assertEqual(self.memo.get_summaries("alice", {"main.py": LONG_FILE}, {"main.py": "a"}), {})
+
+    def test_other_student_file(self):
+        """
+        A file first submitted by another student is sent in full and reported
+        :return:
+        """
+        self.memo.get_summaries("alice", {"main.py": LONG_FILE}, {"main.py": "a"})
+        summaries = self.memo.get_summaries(
+            "bob", {"main.py": LONG_FILE, "new.py": OTHER_FILE}, {"main.py": "a", "new.py": "b"}
+        )
+        self.assertEqual(summaries, {})
+        self.assertEqual(self.memo.shared_files, {"main.py": ["alice"]})
+
+    def test_template_file(self):
+        """
+        A template file is reused whoever submitted it first
+        :return:
+        """
+        self.memo.get_summaries("alice", {"main.py": LONG_FILE}, {"main.py": "a"})
+        summaries = self.memo.get_summaries(
+            "bob",
+            {"main.py": LONG_FILE, "new.py": OTHER_FILE},
+            {"main.py": "a", "new.py": "b"},
+            template_paths={"main.py"}
+        )
+        self.assertEqual(list(summaries), ["main.py"])
+        self.assertEqual(self.memo.shared_files, {})
+
+    def test_model_summary(self):
+        """
+        A reused file is summarised by the model once
+        :return:
+        """
+        calls = []
+
+        def summarize(path: str, content: str) -> str:
+            calls.append(path)
+            return f"summary of {path}"
+
+        self.memo.get_summaries("alice", {"main.py": LONG_FILE}, {"main.py": "a"})
+        files = {"main.py": LONG_FILE, "new.py": OTHER_FILE}
+        summaries = self.memo.get_summaries("alice", files, {"main.py": "a", "new.py": "b"}, summarize)
+        self.assertEqual(summaries, {"main.py": "summary of main.py"})
+        files["other.py"] = OTHER_FILE + "\n"
+        self.memo.get_summaries("alice", files, {"main.py": "a", "new.py": "b", "other.py": "c"}, summarize)
+        self.assertEqual(calls, ["main.py", "new.py"])
+
+    def test_eviction(self):
+        """
+        The least recently used entries are evicted above MAX_ENTRIES
+        :return:
+        """
+        memo = FileMemo("lab1", path=self.path, config=MemoConfig(FILE_MEMO_MAX_ENTRIES=1, FILE_MEMO_MIN_SIZE=10))
+        memo.get_summaries("alice", {"main.py": LONG_FILE}, {"main.py": "a"})
+        memo.get_summaries("alice", {"new.py": OTHER_FILE}, {"new.py": "b"})
+        summaries = memo.get_summaries(
+            "alice", {"main.py": LONG_FILE, "other.py": OTHER_FILE}, {"main.py": "a", "other.py": "c"}
+        )
+        self.assertEqual(summaries, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
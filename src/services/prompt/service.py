@@ -1,32 +1,110 @@
+from hashlib import sha256
 from random import choice
 
 from loguru import logger
 
+from models.llm.tools import RubricCriterion
+from utils.helpers.bm25 import BM25Index
+from utils.helpers.compaction import SourceCompactor
+
 
 class PromptGenerator:
+    RUBRIC_INSTRUCTION = (
+        "Grade the student submission against one rubric criterion at a time. "
+        "The criterion is given in the last message, evaluate only that criterion."
+    )
+
     def __init__(
             self,
             student_assignment: str | None = None,
             context_prompt: dict[str, str] | None = None,
-            teacher_prompts: list[str] | None = None
+            teacher_prompts: list[str] | None = None,
+            seed: str | None = None,
+            cache_friendly: bool = False,
+            unchanged_files: list[str] | None = None,
+            rank_files: bool = False,
+            context_budget: int | None = None,
+            analysis_summary: str | None = None,
+            skipped_files: list[str] | None = None,
+            compact_sources: bool = False,
+            file_summaries: dict[str, str] | None = None
     ):
+        """
+        :param seed: Makes teacher prompt selection deterministic, random choice if None
+        :param cache_friendly: Put the stable part of the prompt first and the per-student part last
+        :param unchanged_files: Files omitted because they are identical to the lab template
+        :param rank_files: Order files by BM25 relevance to the assignment and teacher prompts
+        :param context_budget: Maximum number of file characters in the prompt, no limit if None
+        :param analysis_summary: Findings of the local static analysis
+        :param skipped_files: Binary or oversized files that were not read, with the reason
+        :param compact_sources: Compact file contents before they are put into the prompt
+        :param file_summaries: Summaries sent instead of the full text of files seen before
+        """
         self.student_assignment: str | None = student_assignment
         self.context_prompt: dict[str, str] | None = context_prompt
         self.teacher_prompts: list[str] | None = teacher_prompts
+        self.seed: str | None = seed
+        self.cache_friendly: bool = cache_friendly
+        self.unchanged_files: list[str] | None = unchanged_files
+        self.rank_files: bool = rank_files
+        self.context_budget: int | None = context_budget
+        self.analysis_summary: str | None = analysis_summary
+        self.skipped_files: list[str] | None = skipped_files
+        self.compactor: SourceCompactor | None = SourceCompactor() if compact_sources else None
+        self.file_summaries: dict[str, str] = file_summaries or {}
+        self.omitted_files: list[str] = []
         self.context: str | None = None
 
+    def get_file_order(self, files: dict[str, str]) -> list[str]:
+        """
+        Get the order in which files are put into the prompt.
+        Ranked files go by relevance to the assignment and teacher prompts,
+        otherwise cache-friendly layout sorts them by path.
+        """
+        file_names = list(files.keys())
+        if self.rank_files:
+            query = " ".join([self.student_assignment or "", *(self.teacher_prompts or [])])
+            if query.strip():
+                ranking = BM25Index.from_files(files).rank(query)
+                logger.debug("File ranking: {}", ranking)
+                return [file_name for file_name, _ in ranking]
+        if self.cache_friendly:
+            return sorted(file_names)
+        return file_names
+
     def files_to_dict(self) -> list[dict[str, str]]:
         logger.debug("Converting files to dict")
         messages = []
+        self.omitted_files = []
         if self.context_prompt:
-            for file_name, file_content in self.context_prompt.items():
-                logger.debug(f"Processing file: {file_name}")
+            used = 0
+            for file_name in self.get_file_order(self.context_prompt):
+                file_content = self.context_prompt[file_name]
+                if file_name in self.file_summaries:
+                    file_content = f"[seen before, summary instead of the full text]\n{self.file_summaries[file_name]}"
+                elif self.compactor:
+                    file_content = self.compactor.compact(file_name, file_content)
+                if self.context_budget is not None and used + len(file_content) > self.context_budget:
+                    self.omitted_files.append(file_name)
+                    continue
+                used += len(file_content)
+
+                logger.debug("Processing file: {}", file_name)
                 content = f"File: {file_name}\n{file_content}"
                 context_prompt_message = {
                     "role": "user",
                     "content": content,
                 }
                 messages.append(context_prompt_message)
+
+        if self.compactor:
+            self.compactor.log_summary()
+        if self.omitted_files:
+            logger.info(f"{len(self.omitted_files)} files omitted by the context budget")
+            messages.append({
+                "role": "user",
+                "content": "Files omitted because of the context size limit: " + ", ".join(self.omitted_files),
+            })
         return messages
 
     def get_student_assignment(self) -> dict[str, str] | None:
@@ -37,27 +115,91 @@ class PromptGenerator:
             }
         return None
 
+    def get_unchanged_files(self) -> dict[str, str] | None:
+        if self.unchanged_files:
+            paths = ", ".join(sorted(self.unchanged_files))
+            return {
+                "role": "user",
+                "content": f"Files unchanged from the lab template (omitted): {paths}",
+            }
+        return None
+
+    def get_skipped_files(self) -> dict[str, str] | None:
+        if self.skipped_files:
+            return {
+                "role": "user",
+                "content": "Files not read (binary or too large): " + ", ".join(self.skipped_files),
+            }
+        return None
+
+    def get_analysis_summary(self) -> dict[str, str] | None:
+        if self.analysis_summary:
+            return {
+                "role": "user",
+                "content": f"Static analysis findings:\n{self.analysis_summary}",
+            }
+        return None
+
+    def select_teacher_prompt(self, teacher_prompts: list[str]) -> str:
+        """
+        Select one of the teacher prompts.
+        The same seed always selects the same prompt, so the prompt prefix stays byte-identical.
+        """
+        if self.seed is None:
+            return choice(teacher_prompts)
+
+        index = int(sha256(self.seed.encode("utf-8")).hexdigest(), 16) % len(teacher_prompts)
+        return teacher_prompts[index]
+
     def get_teacher_prompt(self) -> dict[str, str] | None:
         if self.teacher_prompts:
             return {
                 "role": "system",
-                "content": f"Teacher prompt: {choice(self.teacher_prompts)}",
+                "content": f"Teacher prompt: {self.select_teacher_prompt(self.teacher_prompts)}",
             }
         return None
 
-    def get_prompt(self) -> list[dict[str, str]]:
+    def get_rubric(self) -> list[RubricCriterion]:
+        return [RubricCriterion.parse(prompt) for prompt in self.teacher_prompts or [] if prompt.strip()]
+
+    def get_prompt(self, rubric: list[RubricCriterion] | None = None) -> list[dict[str, str]]:
+        """
+        :param rubric: Build the shared prefix of rubric criteria instead of a prompt with one teacher prompt,
+            every criterion message is appended to it separately
+        """
         logger.debug("Generating prompt messages")
         messages: list[dict[str, str]] = []
+        context: list[str] = []
 
-        teacher_prompt_message = self.get_teacher_prompt()
-        if teacher_prompt_message:
-            messages.append(teacher_prompt_message)
-            self.context = teacher_prompt_message["content"]
+        if rubric:
+            messages.append({"role": "system", "content": self.RUBRIC_INSTRUCTION})
+            context.append("Rubric:\n" + "\n".join(f"[{item.weight:g}] {item.text}" for item in rubric))
+        else:
+            teacher_prompt_message = self.get_teacher_prompt()
+            if teacher_prompt_message:
+                messages.append(teacher_prompt_message)
+                context.append(teacher_prompt_message["content"])
 
         student_assignment_message = self.get_student_assignment()
         if student_assignment_message:
-            messages.append(student_assignment_message)
-            self.context += f"\n{student_assignment_message['content']}"
+            context.append(student_assignment_message["content"])
+
+        notes = [
+            message for message in (self.get_unchanged_files(), self.get_skipped_files(), self.get_analysis_summary())
+            if message
+        ]
+        if self.cache_friendly:
+            # Only the system and teacher prompts are shared by every submission of the lab,
+            # files sorted by path keep the prefix stable across pushes of the same student.
+            messages.extend(self.files_to_dict())
+            messages.extend(notes)
+            if student_assignment_message:
+                messages.append(student_assignment_message)
+        else:
+            if student_assignment_message:
+                messages.append(student_assignment_message)
+            messages.extend(notes)
+            messages.extend(self.files_to_dict())
 
-        messages.extend(self.files_to_dict())
+        self.context = "\n".join(context) if context else None
         return messages
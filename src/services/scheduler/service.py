@@ -0,0 +1,330 @@
+import os
+import re
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from json import dumps, loads
+from pathlib import Path
+from threading import Condition, Event, Thread
+from time import monotonic, sleep, time
+from typing import Any, Callable, Iterator
+
+from loguru import logger
+
+from configs.scheduler import SchedulerConfig
+from models.scheduler.entity import QueueMetrics, ReviewJob
+
+
+def get_wait_metrics(waits: list[float]) -> dict[str, float]:
+    if not waits:
+        return {}
+    ordered = sorted(waits)
+    return {
+        "mean_wait": sum(ordered) / len(ordered),
+        "p95_wait": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max_wait": ordered[-1],
+    }
+
+
+class LiveSlots:
+    """
+    Slot files of live pull request reviews in the scheduler directory.
+    Every live review process waits for one of LIVE_CONCURRENCY slots, created with O_EXCL like shard leases,
+    and bulk schedulers sharing the directory yield while live reviews are waiting or running.
+    A held slot is refreshed, so only the slot of a crashed review expires after SLOT_TTL.
+
+    Live reviews usually run on separate CI runners, so slots only work in a directory they share:
+    without SCHEDULER_DIR live reviews don't wait and bulk runs don't yield.
+    """
+    POLL_INTERVAL = 1.0
+    WAITS_KEPT = 200
+
+    def __init__(self, config: SchedulerConfig | None = None):
+        self.__config = config or SchedulerConfig()
+        self.enabled = self.__config.DIR is not None and self.__config.LIVE_CONCURRENCY > 0
+        self.path = self.__config.get_scheduler_dir() / "live"
+        if self.enabled:
+            self.path.mkdir(parents=True, exist_ok=True)
+        self.waits_path = self.path.parent / "live_waits.jsonl"
+        self.owner = f"{socket.gethostname()}-{os.getpid()}"
+
+    def __is_fresh(self, path: Path) -> bool:
+        try:
+            return time() - path.stat().st_mtime < self.__config.SLOT_TTL
+        except FileNotFoundError:
+            return False
+
+    def __create(self, path: Path) -> bool:
+        try:
+            descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(descriptor, "w", encoding="utf-8") as slot_file:
+            slot_file.write(self.owner)
+        return True
+
+    def __claim(self) -> Path | None:
+        for index in range(self.__config.LIVE_CONCURRENCY):
+            path = self.path / f"slot-{index}.lease"
+            if self.__create(path):
+                return path
+            if not self.__is_fresh(path):
+                try:
+                    # Only one process wins the rename of a slot left by a crashed review
+                    os.rename(path, path.with_name(f"{path.name}.expired-{self.owner}"))
+                except FileNotFoundError:
+                    pass
+                if self.__create(path):
+                    return path
+        return None
+
+    def get_pressure(self) -> tuple[int, int]:
+        """
+        :return: Number of waiting and running live reviews
+        """
+        if not self.enabled:
+            return 0, 0
+        waiting = sum(self.__is_fresh(path) for path in self.path.glob("*.waiting"))
+        running = sum(self.__is_fresh(path) for path in self.path.glob("slot-*.lease"))
+        return waiting, running
+
+    def get_wait_metrics(self) -> dict[str, float]:
+        """
+        Get wait times of the latest live reviews of all processes.
+        """
+        if not self.waits_path.exists():
+            return {}
+        lines = self.waits_path.read_text(encoding="utf-8").splitlines()[-self.WAITS_KEPT:]
+        waits = []
+        for line in lines:
+            try:
+                waits.append(loads(line)["wait"])
+            except (ValueError, KeyError):
+                continue
+        return get_wait_metrics(waits)
+
+    @contextmanager
+    def hold(self, key: str) -> Iterator[float]:
+        """
+        Wait for a free live slot and hold it for the duration of the block.
+        :param key: owner/repository of the reviewed pull request
+        :return: Seconds spent waiting
+        """
+        if not self.enabled:
+            yield 0.0
+            return
+
+        file_name = re.sub(r"[^\w.-]", "_", key)
+        waiting_path = self.path / f"{file_name}.{self.owner}.waiting"
+        waiting_path.write_text(self.owner, encoding="utf-8")
+        started = monotonic()
+        try:
+            while (slot_path := self.__claim()) is None:
+                os.utime(waiting_path)
+                sleep(self.POLL_INTERVAL)
+        finally:
+            waiting_path.unlink(missing_ok=True)
+
+        wait = monotonic() - started
+        logger.info(f"Live review of {key} started after waiting {wait:.1f}s for a slot")
+        with open(self.waits_path, "a", encoding="utf-8") as waits_file:
+            waits_file.write(dumps({"timestamp": time(), "key": key, "wait": round(wait, 3)}) + "\n")
+
+        stopped = Event()
+
+        def heartbeat() -> None:
+            while not stopped.wait(self.__config.SLOT_TTL / 3):
+                try:
+                    os.utime(slot_path)
+                except FileNotFoundError:
+                    logger.warning(f"Live slot {slot_path.name} of {key} disappeared")
+
+        heartbeat_thread = Thread(target=heartbeat, name="live-slot-heartbeat", daemon=True)
+        heartbeat_thread.start()
+        try:
+            yield wait
+        finally:
+            stopped.set()
+            heartbeat_thread.join()
+            slot_path.unlink(missing_ok=True)
+
+
+class ReviewScheduler:
+    """
+    Priority queue in front of `runner.run` for the reviews of a bulk run, at most BULK_CONCURRENCY run at once.
+    The job with the lowest priority value starts first:
+    hours to the lab deadline, capped by DEADLINE_HORIZON, minus the time the job has waited multiplied by AGING_RATE.
+    Labs without a deadline or past it get DEADLINE_HORIZON, so a passed deadline doesn't keep a lab ahead for good.
+
+    Jobs yield to live reviews of other processes (see LiveSlots),
+    but at least one job starts every MAX_YIELD seconds, so a re-grade always finishes.
+    """
+    POLL_INTERVAL = 1.0
+    SNAPSHOT_INTERVAL = 5.0
+
+    def __init__(self, config: SchedulerConfig | None = None, live_slots: LiveSlots | None = None):
+        self.__config = config or SchedulerConfig()
+        self.__live_slots = live_slots or LiveSlots(self.__config)
+        self.__limit = max(1, self.__config.BULK_CONCURRENCY)
+        self.__queue: list[tuple[ReviewJob, Callable[[], Any]]] = []
+        self.__running = 0
+        self.__max_queued = 0
+        self.__waits: list[float] = []
+        self.__completed = 0
+        self.__condition = Condition()
+        self.__closed = False
+        self.__last_start = monotonic()
+        self.__snapshot_time = 0.0
+        self.__executor = ThreadPoolExecutor(max_workers=self.__limit)
+        self.__dispatcher: Thread | None = None
+
+    def get_priority(self, job: ReviewJob, now: float | None = None) -> float:
+        """
+        Get the priority of a job in hours, lower values start first.
+        """
+        now = monotonic() if now is None else now
+        distance = self.__config.DEADLINE_HORIZON
+        if job.deadline is not None:
+            remaining = (job.deadline - datetime.now(job.deadline.tzinfo)).total_seconds() / 3600
+            if remaining >= 0:
+                distance = min(remaining, distance)
+        waited = (now - job.enqueued) / 3600
+        return distance - waited * self.__config.AGING_RATE
+
+    def submit(self, job: ReviewJob, function: Callable[[], Any]) -> None:
+        """
+        Queue a job.
+        :param function: Runs the review, called in a worker thread
+        """
+        job.enqueued = monotonic()
+        with self.__condition:
+            self.__queue.append((job, function))
+            self.__max_queued = max(self.__max_queued, len(self.__queue))
+            self.__condition.notify_all()
+
+    def __can_start(self, now: float, pressure: tuple[int, int]) -> bool:
+        if self.__running >= self.__limit:
+            return False
+        if now - self.__last_start < self.__config.MAX_YIELD and any(pressure):
+            return False
+        return True
+
+    def __next_job(self, now: float, pressure: tuple[int, int]) -> tuple[ReviewJob, Callable[[], Any]] | None:
+        if not self.__queue or not self.__can_start(now, pressure):
+            return None
+        return min(self.__queue, key=lambda entry: self.get_priority(entry[0], now))
+
+    def __execute(self, job: ReviewJob, function: Callable[[], Any]) -> None:
+        try:
+            function()
+        except Exception as e:
+            logger.exception(f"Scheduled review of {job.key} failed: {e}")
+        finally:
+            with self.__condition:
+                self.__running -= 1
+                self.__completed += 1
+                self.__condition.notify_all()
+
+    def __dispatch(self) -> None:
+        while True:
+            # Slot files are globbed outside the lock, the directory can be on a slow shared filesystem
+            pressure = self.__live_slots.get_pressure()
+            with self.__condition:
+                if self.__closed and not self.__queue:
+                    break
+                now = monotonic()
+                entry = self.__next_job(now, pressure)
+                if entry is None:
+                    self.__condition.wait(self.POLL_INTERVAL)
+                else:
+                    job, function = entry
+                    self.__queue.remove(entry)
+                    self.__running += 1
+                    self.__waits.append(now - job.enqueued)
+                    self.__last_start = now
+                    logger.opt(lazy=True).debug(
+                        "Starting review of {} after {:.1f}s, priority {:.1f}",
+                        lambda: job.key,
+                        lambda: now - job.enqueued,
+                        lambda: self.get_priority(job, now)
+                    )
+                    self.__executor.submit(self.__execute, job, function)
+                snapshot = self.__take_snapshot()
+            if snapshot is not None:
+                self.__write_snapshot(snapshot)
+
+    def start(self) -> None:
+        self.__dispatcher = Thread(target=self.__dispatch, name="review-scheduler", daemon=True)
+        self.__dispatcher.start()
+
+    def close(self) -> None:
+        """
+        Stop accepting jobs, queued jobs still run.
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+    def join(self) -> QueueMetrics:
+        """
+        Wait for all jobs.
+        :return: Queue depths and wait times of the run
+        """
+        if self.__dispatcher is not None:
+            self.__dispatcher.join()
+        self.__executor.shutdown(wait=True)
+        with self.__condition:
+            snapshot = self.__take_snapshot(force=True)
+        if snapshot is not None:
+            self.__write_snapshot(snapshot)
+        metrics = self.get_metrics()
+        if metrics.completed:
+            logger.info(
+                f"Scheduler: {metrics.completed} reviews, max queue {metrics.max_queued}, "
+                f"wait mean {metrics.mean_wait:.1f}s, p95 {metrics.p95_wait:.1f}s, max {metrics.max_wait:.1f}s"
+            )
+        return metrics
+
+    def get_metrics(self) -> QueueMetrics:
+        with self.__condition:
+            return QueueMetrics(
+                queued=len(self.__queue),
+                running=self.__running,
+                max_queued=self.__max_queued,
+                completed=self.__completed,
+                **get_wait_metrics(self.__waits)
+            )
+
+    def __take_snapshot(self, force: bool = False) -> dict[str, Any] | None:
+        """
+        Copy queue depths and wait times, called with the lock held.
+        :return: None if the last snapshot is more recent than SNAPSHOT_INTERVAL
+        """
+        if not force and monotonic() - self.__snapshot_time < self.SNAPSHOT_INTERVAL:
+            return None
+        self.__snapshot_time = monotonic()
+        return {
+            "queued": len(self.__queue),
+            "running": self.__running,
+            "max_queued": self.__max_queued,
+            "completed": self.__completed,
+            **get_wait_metrics(self.__waits),
+        }
+
+    def __write_snapshot(self, bulk: dict[str, Any]) -> None:
+        """
+        Write queue depths, wait times and live slot usage to metrics.json of the scheduler directory,
+        so they can be watched. Called without the lock, so the file I/O doesn't block submit and completions.
+        """
+        waiting, running = self.__live_slots.get_pressure()
+        snapshot = {
+            "updated": datetime.now().isoformat(timespec="seconds"),
+            "owner": self.__live_slots.owner,
+            "bulk": bulk,
+            "live_slots": {"waiting": waiting, "running": running, **self.__live_slots.get_wait_metrics()},
+        }
+        path = self.__config.get_scheduler_dir() / "metrics.json"
+        temporary_path = path.with_suffix(f".{self.__live_slots.owner}")
+        temporary_path.write_text(dumps(snapshot, indent=2), encoding="utf-8")
+        os.replace(temporary_path, path)
@@ -0,0 +1,142 @@
+"""
+This module contains tests for the review scheduler
+"""
+
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from configs.scheduler import SchedulerConfig
+from models.scheduler.entity import ReviewJob
+from services.scheduler.service import LiveSlots, ReviewScheduler
+
+
+def make_config(**values) -> SchedulerConfig:
+    return SchedulerConfig(SCHEDULER_DIR=tempfile.mkdtemp(), **values)
+
+
+class PriorityTest(unittest.TestCase):
+    """
+    Testing deadline priorities
+    """
+
+    def setUp(self):
+        """
+        Setup a scheduler with a one week horizon
+        :return:
+        """
+        self.scheduler = ReviewScheduler(make_config(SCHEDULER_DEADLINE_HORIZON=168))
+
+    def priority(self, deadline: datetime | None) -> float:
+        return self.scheduler.get_priority(ReviewJob(key="a/b", deadline=deadline, enqueued=time.monotonic()))
+
+    def test_closer_deadline_goes_first(self):
+        """
+        A lab due tomorrow goes before a lab due in three days and a lab without a deadline
+        :return:
+        """
+        tomorrow = self.priority(datetime.now() + timedelta(days=1))
+        later = self.priority(datetime.now() + timedelta(days=3))
+        self.assertLess(tomorrow, later)
+        self.assertLess(later, self.priority(None))
+
+    def test_passed_deadline_is_not_urgent(self):
+        """
+        A lab past its deadline gets the horizon, not the distance to the deadline
+        :return:
+        """
+        overdue = self.priority(datetime.now() - timedelta(hours=1))
+        self.assertAlmostEqual(overdue, self.priority(None), places=3)
+        self.assertLess(self.priority(datetime.now() + timedelta(days=1)), overdue)
+
+
+class ReviewSchedulerTest(unittest.TestCase):
+    """
+    Testing the order and the live yield of scheduled reviews
+    """
+
+    def test_runs_by_deadline(self):
+        """
+        Queued jobs start in deadline order
+        :return:
+        """
+        started = []
+        scheduler = ReviewScheduler(make_config(SCHEDULER_BULK_CONCURRENCY=1))
+        for name, days in (("late", 5), ("none", None), ("soon", 1)):
+            deadline = datetime.now() + timedelta(days=days) if days else None
+            scheduler.submit(ReviewJob(key=name, deadline=deadline), lambda name=name: started.append(name))
+        scheduler.start()
+        scheduler.close()
+        metrics = scheduler.join()
+        self.assertEqual(started, ["soon", "late", "none"])
+        self.assertEqual(metrics.completed, 3)
+
+    def test_yields_to_live_reviews(self):
+        """
+        No job starts while a live review holds a slot, until MAX_YIELD has passed
+        :return:
+        """
+        config = make_config(SCHEDULER_MAX_YIELD=60)
+        live_slots = LiveSlots(config)
+        scheduler = ReviewScheduler(config, live_slots)
+        started = []
+        with live_slots.hold("owner/live"):
+            scheduler.submit(ReviewJob(key="bulk"), lambda: started.append("bulk"))
+            scheduler.start()
+            time.sleep(1.5)
+            self.assertEqual(started, [])
+        scheduler.close()
+        scheduler.join()
+        self.assertEqual(started, ["bulk"])
+
+    def test_submit_doesnt_wait_for_slot_directory(self):
+        """
+        Reading a slow slot directory doesn't block submitting jobs
+        :return:
+        """
+        config = make_config()
+        live_slots = LiveSlots(config)
+
+        def get_pressure() -> tuple[int, int]:
+            time.sleep(0.5)
+            return 0, 0
+
+        live_slots.get_pressure = get_pressure
+        scheduler = ReviewScheduler(config, live_slots)
+        scheduler.start()
+        # The first snapshot is written after one poll interval
+        time.sleep(ReviewScheduler.POLL_INTERVAL + 0.2)
+        started = time.monotonic()
+        scheduler.submit(ReviewJob(key="bulk"), lambda: None)
+        self.assertLess(time.monotonic() - started, 0.2)
+        scheduler.close()
+        self.assertEqual(scheduler.join().completed, 1)
+
+
+class LiveSlotsTest(unittest.TestCase):
+    """
+    Testing live slots
+    """
+
+    def test_disabled_without_shared_directory(self):
+        """
+        Without SCHEDULER_DIR live reviews don't wait and create no slots
+        :return:
+        """
+        live_slots = LiveSlots(SchedulerConfig(SCHEDULER_DIR=None))
+        with live_slots.hold("owner/repo") as wait:
+            self.assertEqual(wait, 0.0)
+            self.assertEqual(live_slots.get_pressure(), (0, 0))
+
+    def test_held_slot_is_refreshed(self):
+        """
+        A slot held longer than SLOT_TTL doesn't expire while its review runs
+        :return:
+        """
+        config = make_config(SCHEDULER_LIVE_CONCURRENCY=1, SCHEDULER_SLOT_TTL=0.6)
+        live_slots = LiveSlots(config)
+        with live_slots.hold("owner/first"):
+            time.sleep(1.2)
+            self.assertEqual(live_slots.get_pressure(), (0, 1))
+        self.assertEqual(live_slots.get_pressure(), (0, 0))
@@ -0,0 +1,162 @@
+import re
+from collections import defaultdict
+from json import dumps, loads
+from pathlib import Path
+from zlib import crc32
+
+import numpy as np
+from loguru import logger
+
+from configs.similarity import SimilarityConfig
+from configs.storage import StorageConfig
+
+TOKEN_PATTERN = re.compile(r"\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|[A-Za-z_]\w*|\d+(?:\.\d+)?|\S")
+COMMENT_PATTERN = re.compile(r"//[^\n]*|/\*.*?\*/|#[^\n]*", re.DOTALL)
+KEYWORDS = frozenset("""
+    and as assert async await break case catch char class const continue def default del do double elif else
+    enum except extends false final finally float for from function global if implements import in include
+    int interface is lambda let long new none not null or package pass private protected public raise
+    return self short static struct super switch this throw throws true try typedef unsigned var void
+    while with yield print printf scanf cout cin std string
+""".split())
+
+
+def normalize(content: str) -> list[str]:
+    """
+    Turn source code into a token stream that survives renaming and reformatting:
+    comments are dropped, identifiers become "V", numbers "N" and string literals "S".
+    Keywords and punctuation are kept.
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(COMMENT_PATTERN.sub(" ", content)):
+        if token[0] in "\"'":
+            tokens.append("S")
+        elif token[0].isdigit():
+            tokens.append("N")
+        elif token[0].isalpha() or token[0] == "_":
+            lower = token.lower()
+            tokens.append(lower if lower in KEYWORDS else "V")
+        else:
+            tokens.append(token)
+    return tokens
+
+
+class SimilarityIndex:
+    """
+    MinHash/LSH index of the submissions of one lab.
+    Signatures are stored locally and updated one submission at a time,
+    candidate pairs come from LSH buckets instead of comparing every pair.
+    """
+    SHINGLE_SIZE = 7
+    PERMUTATIONS = 128
+    BANDS = 32
+    PRIME = (1 << 31) - 1
+
+    _random = np.random.default_rng(20240901)
+    _a = _random.integers(1, PRIME, size=PERMUTATIONS, dtype=np.uint64)
+    _b = _random.integers(0, PRIME, size=PERMUTATIONS, dtype=np.uint64)
+
+    def __init__(self, lab_name: str, cache_dir: Path | None = None):
+        self.lab_name = lab_name
+        self.__config = SimilarityConfig()
+        cache_dir = cache_dir or StorageConfig().CACHE_DIR / "similarity"
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        file_name = re.sub(r"[^\w.-]", "_", lab_name)
+        self.__path = cache_dir / f"{file_name}.json"
+        self.signatures: dict[str, np.ndarray] = {}
+        self.__buckets: list[dict[int, set[str]]] = [defaultdict(set) for _ in range(self.BANDS)]
+        self.__load()
+
+    def __load(self) -> None:
+        if not self.__path.exists():
+            return
+        data = loads(self.__path.read_text(encoding="utf-8"))
+        for key, signature in data.items():
+            self.__add(key, np.array(signature, dtype=np.uint64))
+        logger.debug("Loaded {} signatures for lab {}", len(self.signatures), self.lab_name)
+
+    def save(self) -> None:
+        data = {key: signature.tolist() for key, signature in self.signatures.items()}
+        self.__path.write_text(dumps(data), encoding="utf-8")
+
+    def __band_hashes(self, signature: np.ndarray) -> list[int]:
+        rows = self.PERMUTATIONS // self.BANDS
+        return [crc32(signature[i * rows:(i + 1) * rows].tobytes()) for i in range(self.BANDS)]
+
+    def __add(self, key: str, signature: np.ndarray) -> None:
+        self.__remove(key)
+        self.signatures[key] = signature
+        for band, band_hash in enumerate(self.__band_hashes(signature)):
+            self.__buckets[band][band_hash].add(key)
+
+    def __remove(self, key: str) -> None:
+        signature = self.signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, band_hash in enumerate(self.__band_hashes(signature)):
+            self.__buckets[band][band_hash].discard(key)
+
+    def get_signature(self, files: dict[str, str]) -> np.ndarray | None:
+        tokens = []
+        for path in sorted(files):
+            tokens.extend(normalize(files[path]))
+        if len(tokens) < self.SHINGLE_SIZE:
+            return None
+
+        shingles = {
+            crc32(" ".join(tokens[i:i + self.SHINGLE_SIZE]).encode("utf-8")) & self.PRIME
+            for i in range(len(tokens) - self.SHINGLE_SIZE + 1)
+        }
+        values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        hashes = (self._a[:, None] * values[None, :] + self._b[:, None]) % self.PRIME
+        return hashes.min(axis=1)
+
+    def update(self, key: str, files: dict[str, str]) -> None:
+        """
+        Add or replace a submission and persist the index.
+        :param key: Student identifier, e.g. GitHub username
+        :param files: Submitted files
+        """
+        signature = self.get_signature(files)
+        if signature is None:
+            logger.debug("Submission {} is too short for the similarity index", key)
+            self.__remove(key)
+        else:
+            self.__add(key, signature)
+        self.save()
+
+    def similarity(self, first: str, second: str) -> float:
+        return float(np.mean(self.signatures[first] == self.signatures[second]))
+
+    def top_pairs(self, limit: int | None = None, threshold: float | None = None) -> list[tuple[str, str, float]]:
+        """
+        Get the most similar pairs of submissions.
+        Only pairs sharing an LSH bucket are compared.
+        :return: (first, second, estimated Jaccard similarity), most similar first
+        """
+        threshold = self.__config.THRESHOLD if threshold is None else threshold
+        candidates: set[tuple[str, str]] = set()
+        for buckets in self.__buckets:
+            for keys in buckets.values():
+                if len(keys) > 1:
+                    ordered = sorted(keys)
+                    candidates.update(
+                        (first, second)
+                        for index, first in enumerate(ordered)
+                        for second in ordered[index + 1:]
+                    )
+
+        pairs = [(first, second, self.similarity(first, second)) for first, second in candidates]
+        pairs = sorted((pair for pair in pairs if pair[2] >= threshold), key=lambda pair: -pair[2])
+        return pairs[:limit] if limit else pairs
+
+    def best_matches(self) -> dict[str, tuple[str, float]]:
+        """
+        Get the most similar other submission for every student with a match.
+        """
+        matches: dict[str, tuple[str, float]] = {}
+        for first, second, score in self.top_pairs():
+            for key, other in ((first, second), (second, first)):
+                if key not in matches or matches[key][1] < score:
+                    matches[key] = (other, score)
+        return matches
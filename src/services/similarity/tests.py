@@ -0,0 +1,107 @@
+"""
+This module contains tests for the similarity index
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from services.similarity.service import SimilarityIndex, normalize
+
+ORIGINAL = """
+def average(values):
+    # Average of a list
+    total = 0
+    for value in values:
+        total += value
+    return total / len(values)
+
+def maximum(values):
+    best = values[0]
+    for value in values:
+        if value > best:
+            best = value
+    return best
+"""
+
+RENAMED = """
+def mean(numbers):
+    s = 0
+    for n in numbers:
+        s += n
+    return s / len(numbers)
+
+
+def biggest(numbers):
+    result = numbers[0]
+    for n in numbers:
+        if n > result:
+            result = n
+    return result
+"""
+
+UNRELATED = """
+class Stack:
+    def __init__(self):
+        self.items = []
+
+    def push(self, item):
+        self.items.append(item)
+
+    def pop(self):
+        if not self.items:
+            raise IndexError("empty")
+        return self.items.pop()
+"""
+
+
+class SimilarityIndexTest(unittest.TestCase):
+    """
+    Testing normalization and candidate pairs of the similarity index
+    """
+
+    def setUp(self):
+        """
+        Create an index in a temporary directory
+        :return:
+        """
+        self.cache_dir = Path(tempfile.mkdtemp())
+        self.index = SimilarityIndex("lab1", cache_dir=self.cache_dir)
+
+    def test_normalize_ignores_names_and_comments(self):
+        """
+        Renaming identifiers and changing comments doesn't change the token stream
+        :return:
+        """
+        self.assertEqual(normalize("x = 1  # one"), normalize("total = 2 // two"))
+
+    def test_renamed_copy_is_found(self):
+        """
+        A renamed copy is the top pair, an unrelated submission isn't paired
+        :return:
+        """
+        self.index.update("alice", {"main.py": ORIGINAL})
+        self.index.update("bob", {"solution.py": RENAMED})
+        self.index.update("carol", {"main.py": UNRELATED})
+        pairs = self.index.top_pairs(threshold=0.5)
+        self.assertEqual([(first, second) for first, second, _ in pairs], [("alice", "bob")])
+        self.assertEqual(self.index.best_matches()["bob"][0], "alice")
+
+    def test_index_is_persisted(self):
+        """
+        Signatures are loaded by a new index of the same lab
+        :return:
+        """
+        self.index.update("alice", {"main.py": ORIGINAL})
+        self.index.update("bob", {"main.py": RENAMED})
+        loaded = SimilarityIndex("lab1", cache_dir=self.cache_dir)
+        self.assertEqual(loaded.similarity("alice", "bob"), self.index.similarity("alice", "bob"))
+
+    def test_short_submission_is_removed(self):
+        """
+        A resubmission too short to compare removes the student from the index
+        :return:
+        """
+        self.index.update("alice", {"main.py": ORIGINAL})
+        self.index.update("alice", {"main.py": "x = 1"})
+        self.assertNotIn("alice", self.index.signatures)
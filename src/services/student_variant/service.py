@@ -20,7 +20,7 @@ class StudentVariant:
             variants_sheet: pd.DataFrame,
             roster_sheet: pd.DataFrame
     ):
-        logger.debug(f"Initializing StudentVariant with username: {student_username}")
+        logger.debug("Initializing StudentVariant with username: {}", student_username)
         self.student_username = student_username
         self.readme_variants = readme_variants
         self.variants = self.__parse_readme()
@@ -57,9 +57,9 @@ class StudentVariant:
         """
         try:
             logger.debug("Getting student real name")
-            logger.debug(f"Looking for github_username: '{self.student_username}'")
+            logger.debug("Looking for github_username: '{}'", self.student_username)
             student_row = self.roster_sheet.loc[self.roster_sheet['github_username'] == self.student_username]
-            logger.debug(f"Found {len(student_row)} matching rows")
+            logger.debug("Found {} matching rows", len(student_row))
             
             if student_row.empty:
                 logger.warning(f"Student '{self.student_username}' not found in roster sheet!")
@@ -0,0 +1,143 @@
+import os
+from difflib import SequenceMatcher, unified_diff
+from hashlib import sha256
+from json import JSONDecodeError, dumps, loads
+from pathlib import Path
+from threading import Lock
+
+from loguru import logger
+
+from configs.prompt import PromptConfig
+from configs.storage import StorageConfig
+from services.git.service import GitHub
+
+
+def fingerprint(content: str) -> str:
+    return sha256(content.encode("utf-8")).hexdigest()
+
+
+class TemplateBaseline:
+    """
+    Subtracts the lab template repository from student files.
+    The template is fetched once per template commit and kept in a local cache.
+    Concurrent reviews of the process wait for one fetch of the same template.
+    """
+    _memory: dict[str, dict[str, dict[str, str]]] = {}
+    _locks: dict[str, Lock] = {}
+    _locks_lock = Lock()
+
+    def __init__(self, git_client: GitHub, cache_dir: Path | None = None):
+        self.__git_client = git_client
+        self.__config = PromptConfig()
+        self.__cache_dir = cache_dir or StorageConfig().CACHE_DIR / "templates"
+        self.__cache_dir.mkdir(parents=True, exist_ok=True)
+        self.unchanged_files: list[str] = []
+
+    def get_template_files(self) -> dict[str, dict[str, str]] | None:
+        """
+        Get fingerprints and contents of the template files.
+        :return: Dictionary with file paths as keys and {"hash", "content"} as values,
+            None if the repository has no template
+        """
+        template = self.__git_client.get_template_repository()
+        if template is None:
+            return None
+
+        commit_sha = template.get_branch(template.default_branch).commit.sha
+        cache_key = f"{template.full_name.replace('/', '__')}@{commit_sha}"
+        with TemplateBaseline._locks_lock:
+            lock = TemplateBaseline._locks.setdefault(cache_key, Lock())
+        with lock:
+            if cache_key in self._memory:
+                return self._memory[cache_key]
+
+            cache_file = self.__cache_dir / f"{cache_key}.json"
+            files = self.__read_cache(cache_file)
+            if files is not None:
+                logger.debug("Template {} loaded from cache", template.full_name)
+            else:
+                logger.info(f"Fetching template {template.full_name} at {commit_sha}")
+                contents = self.__git_client.get_files_content(template, commit_sha)
+                files = {
+                    path: {"hash": fingerprint(content), "content": content}
+                    for path, content in contents.items()
+                }
+                # Written to a temporary file first, so a crash or another process never leaves truncated JSON
+                temporary_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}")
+                temporary_file.write_text(dumps(files, ensure_ascii=False), encoding="utf-8")
+                os.replace(temporary_file, cache_file)
+
+            self._memory[cache_key] = files
+            return files
+
+    @staticmethod
+    def __read_cache(cache_file: Path) -> dict[str, dict[str, str]] | None:
+        try:
+            return loads(cache_file.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (JSONDecodeError, UnicodeDecodeError) as e:
+            logger.warning(f"Template cache {cache_file.name} is corrupted, fetching the template again: {e}")
+            return None
+
+    @staticmethod
+    def diff(template_content: str, content: str, path: str) -> str:
+        lines = unified_diff(
+            template_content.splitlines(keepends=True),
+            content.splitlines(keepends=True),
+            fromfile=f"template/{path}",
+            tofile=path,
+        )
+        return "".join(lines)
+
+    def subtract(
+            self,
+            files: dict[str, str],
+            template_files: dict[str, dict[str, str]] | None = None
+    ) -> dict[str, str]:
+        """
+        Drop files identical to the template and replace near-identical ones with a diff against it.
+        Paths of dropped files are kept in `unchanged_files`.
+        :param files: Dictionary with file paths as keys and file contents as values
+        :param template_files: Result of get_template_files if already loaded, loaded here if None
+        :return: Files that differ from the template
+        """
+        if template_files is None:
+            try:
+                template_files = self.get_template_files()
+            except Exception as e:
+                logger.warning(f"Couldn't load the template repository, sending all files: {e}")
+                return files
+
+        if not template_files:
+            return files
+
+        result = {}
+        self.unchanged_files = []
+        saved = 0
+        for path, content in files.items():
+            template_file = template_files.get(path)
+            if template_file is None:
+                result[path] = content
+                continue
+
+            if template_file["hash"] == fingerprint(content):
+                self.unchanged_files.append(path)
+                saved += len(content)
+                continue
+
+            matcher = SequenceMatcher(None, template_file["content"].splitlines(), content.splitlines())
+            if matcher.quick_ratio() >= self.__config.TEMPLATE_DIFF_THRESHOLD \
+                    and matcher.ratio() >= self.__config.TEMPLATE_DIFF_THRESHOLD:
+                diff = self.diff(template_file["content"], content, path)
+                if len(diff) < len(content):
+                    result[path] = f"Diff against the lab template:\n{diff}"
+                    saved += len(content) - len(result[path])
+                    continue
+            result[path] = content
+
+        logger.info(
+            f"Template baseline: {len(self.unchanged_files)} unchanged files dropped, "
+            f"{saved} characters saved"
+        )
+        return result
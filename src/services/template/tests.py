@@ -0,0 +1,95 @@
+"""
+This module contains tests for the template baseline
+"""
+
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from uuid import uuid4
+
+from services.template.service import TemplateBaseline
+
+TEMPLATE = {"main.py": "print('template')\n", "README.md": "# Lab\n"}
+
+
+class FakeGitHub:
+    """
+    GitHub client with a template repository that counts its fetches
+    """
+
+    def __init__(self, name: str):
+        self.fetches = 0
+        self.template = SimpleNamespace(
+            full_name=f"org/{name}",
+            default_branch="main",
+            get_branch=lambda _: SimpleNamespace(commit=SimpleNamespace(sha="abc")),
+        )
+
+    def get_template_repository(self):
+        return self.template
+
+    def get_files_content(self, _repository, _sha):
+        self.fetches += 1
+        return dict(TEMPLATE)
+
+
+class TemplateBaselineTest(unittest.TestCase):
+    """
+    Testing the template cache and subtraction
+    """
+
+    def setUp(self):
+        """
+        Create a cache directory and a template unique to the test, the in-memory cache is per process
+        :return:
+        """
+        self.cache_dir = Path(tempfile.mkdtemp())
+        self.name = f"template-{uuid4().hex}"
+        self.git_client = FakeGitHub(self.name)
+
+    def test_unchanged_files_are_dropped(self):
+        """
+        Files identical to the template are dropped and listed
+        :return:
+        """
+        baseline = TemplateBaseline(self.git_client, cache_dir=self.cache_dir)
+        files = baseline.subtract({"main.py": TEMPLATE["main.py"], "solution.py": "print(1)\n"})
+        self.assertEqual(files, {"solution.py": "print(1)\n"})
+        self.assertEqual(baseline.unchanged_files, ["main.py"])
+
+    def test_concurrent_fetch_once(self):
+        """
+        Concurrent reviews fetch the same template once
+        :return:
+        """
+        threads = [
+            threading.Thread(target=TemplateBaseline(self.git_client, cache_dir=self.cache_dir).get_template_files)
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.git_client.fetches, 1)
+
+    def test_corrupted_cache_is_a_miss(self):
+        """
+        A truncated cache file is fetched again and rewritten
+        :return:
+        """
+        cache_file = self.cache_dir / f"org__{self.name}@abc.json"
+        cache_file.write_text('{"main.py": {"hash"', encoding="utf-8")
+        files = TemplateBaseline(self.git_client, cache_dir=self.cache_dir).get_template_files()
+        self.assertEqual(self.git_client.fetches, 1)
+        self.assertEqual(set(files or {}), set(TEMPLATE))
+        self.assertEqual(list(self.cache_dir.iterdir()), [cache_file])
+
+        TemplateBaseline._memory.clear()
+        TemplateBaseline(self.git_client, cache_dir=self.cache_dir).get_template_files()
+        self.assertEqual(self.git_client.fetches, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+from collections import defaultdict, deque
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from time import time
+
+import pandas as pd
+from loguru import logger
+
+from configs.openai import OpenAIConfig
+from configs.storage import StorageConfig
+from models.llm.tools import LLMResponse
+from models.usage.entity import UsageRecord
+
+
+class LabTokenTotals:
+    """
+    Running token totals per lab of one ledger file.
+    Only lines appended since the previous call are read, so records of other processes are picked up as well.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.offset = 0
+        self.records: dict[str, deque[tuple[float, int]]] = defaultdict(deque)
+        self.totals: dict[str, int] = defaultdict(int)
+        self.lock = Lock()
+
+    def __read(self) -> None:
+        if not self.path.exists():
+            return
+        with open(self.path, "rb") as ledger_file:
+            ledger_file.seek(self.offset)
+            data = ledger_file.read()
+        # A line that is still being appended is read by the next call
+        complete = data[:data.rfind(b"\n") + 1]
+        self.offset += len(complete)
+        for line in complete.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = UsageRecord.model_validate_json(line)
+            except ValueError as e:
+                logger.warning(f"Skipping a malformed usage ledger line: {e}")
+                continue
+            if record.lab_name:
+                timestamp = datetime.strptime(record.timestamp, "%Y-%m-%d %H:%M:%S").timestamp()
+                self.records[record.lab_name].append((timestamp, record.total_tokens))
+                self.totals[record.lab_name] += record.total_tokens
+
+    def get(self, lab_name: str, window: float | None = None) -> int:
+        """
+        :param window: Only count tokens of the last N hours, all tokens if None
+        """
+        with self.lock:
+            self.__read()
+            if window:
+                records = self.records[lab_name]
+                since = time() - window * 3600
+                while records and records[0][0] < since:
+                    self.totals[lab_name] -= records.popleft()[1]
+            return self.totals[lab_name]
+
+
+_lab_tokens: dict[Path, LabTokenTotals] = {}
+_lab_tokens_lock = Lock()
+
+
+class UsageLedger:
+    """
+    JSONL ledger of LLM token usage and cost.
+    Token budgets are counted from this file, so they only span the runs that share it:
+    OPENAI_USAGE_LEDGER should point at persistent storage when runs happen in fresh containers.
+    """
+    SUMMARY_COLUMNS = [
+        "lab_name",
+        "student",
+        "calls",
+        "prompt_tokens",
+        "cached_tokens",
+        "completion_tokens",
+        "cost_usd",
+        "avg_latency_s",
+    ]
+
+    def __init__(self, path: Path | None = None):
+        self.__config = OpenAIConfig()  # type: ignore
+        self.__path = path or self.__config.USAGE_LEDGER or StorageConfig().get_path("usage.jsonl")
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        with _lab_tokens_lock:
+            self.__lab_tokens = _lab_tokens.setdefault(self.__path.resolve(), LabTokenTotals(self.__path))
+
+    def estimate_cost(self, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int) -> float:
+        """
+        Estimate the cost of a call in USD from the configured per-1M-token pricing.
+        """
+        pricing = self.__config.PRICING.get(model)
+        if pricing is None:
+            logger.debug("No pricing configured for model {}", model)
+            return 0.0
+
+        input_price = pricing.get("input", 0.0)
+        cached_price = pricing.get("cached_input", input_price)
+        output_price = pricing.get("output", 0.0)
+        cost = (
+                (prompt_tokens - cached_tokens) * input_price
+                + cached_tokens * cached_price
+                + completion_tokens * output_price
+        )
+        return cost / 1_000_000
+
+    def record(
+            self,
+            response: LLMResponse,
+            lab_name: str | None = None,
+            student: str | None = None,
+    ) -> UsageRecord | None:
+        """
+        Append the usage of one LLM call to the ledger.
+        """
+        if response.usage is None:
+            logger.warning("LLM response has no usage block, nothing to record")
+            return None
+
+        usage = response.usage
+        model = response.model or self.__config.MODEL
+        record = UsageRecord(
+            timestamp=pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
+            lab_name=lab_name,
+            student=student,
+            model=model,
+            backend=response.backend,
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            cached_tokens=usage.cached_tokens,
+            latency=response.latency or 0.0,
+            cost=self.estimate_cost(model, usage.prompt_tokens, usage.completion_tokens, usage.cached_tokens),
+        )
+        with open(self.__path, "a", encoding="utf-8") as ledger_file:
+            ledger_file.write(record.model_dump_json() + "\n")
+
+        logger.info(f"Recorded {record.total_tokens} tokens (${record.cost:.4f}) for {lab_name}/{student}")
+        return record
+
+    def get_records(self) -> list[UsageRecord]:
+        """
+        Read all records from the ledger.
+        """
+        if not self.__path.exists():
+            return []
+
+        records = []
+        with open(self.__path, "r", encoding="utf-8") as ledger_file:
+            for line in ledger_file:
+                if line.strip():
+                    records.append(UsageRecord.model_validate_json(line))
+        return records
+
+    def get_lab_tokens(self, lab_name: str) -> int:
+        """
+        Get the number of tokens spent on a lab so far, within LAB_TOKEN_BUDGET_WINDOW if set.
+        """
+        return self.__lab_tokens.get(lab_name, self.__config.LAB_TOKEN_BUDGET_WINDOW)
+
+    def summarize(self) -> pd.DataFrame:
+        """
+        Aggregate the ledger per lab and per student.
+        Per-lab totals have an empty student column.
+        """
+        records = self.get_records()
+        if not records:
+            return pd.DataFrame(columns=self.SUMMARY_COLUMNS)
+
+        data = pd.DataFrame([record.model_dump() for record in records])
+        data["lab_name"] = data["lab_name"].fillna("")
+        data["student"] = data["student"].fillna("")
+        aggregations = {
+            "calls": ("model", "count"),
+            "prompt_tokens": ("prompt_tokens", "sum"),
+            "cached_tokens": ("cached_tokens", "sum"),
+            "completion_tokens": ("completion_tokens", "sum"),
+            "cost_usd": ("cost", "sum"),
+            "avg_latency_s": ("latency", "mean"),
+        }
+        per_lab = data.groupby("lab_name", as_index=False).agg(**aggregations)
+        per_lab["student"] = ""
+        per_student = data.groupby(["lab_name", "student"], as_index=False).agg(**aggregations)
+
+        summary = pd.concat([per_lab, per_student], ignore_index=True)
+        summary = summary.sort_values(["lab_name", "student"], ignore_index=True)
+        summary["cost_usd"] = summary["cost_usd"].round(4)
+        summary["avg_latency_s"] = summary["avg_latency_s"].round(2)
+        return summary[self.SUMMARY_COLUMNS]
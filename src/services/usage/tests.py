@@ -0,0 +1,85 @@
+"""
+This module contains tests for the usage ledger
+"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("OPENAI_MODEL", "test-model")
+
+from models.usage.entity import UsageRecord
+from services.usage.service import LabTokenTotals
+
+
+def make_record(lab_name: str, tokens: int, hours_ago: float = 0.0) -> str:
+    timestamp = pd.Timestamp.now() - pd.Timedelta(hours=hours_ago)
+    record = UsageRecord(
+        timestamp=timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+        lab_name=lab_name,
+        model="test-model",
+        prompt_tokens=tokens,
+    )
+    return record.model_dump_json() + "\n"
+
+
+class LabTokenTotalsTest(unittest.TestCase):
+    """
+    Testing running token totals of the ledger
+    """
+
+    def setUp(self):
+        """
+        Create an empty ledger file
+        :return:
+        """
+        self.path = Path(tempfile.mkdtemp()) / "usage.jsonl"
+        self.path.write_text("", encoding="utf-8")
+        self.totals = LabTokenTotals(self.path)
+
+    def append(self, text: str):
+        with open(self.path, "a", encoding="utf-8") as ledger_file:
+            ledger_file.write(text)
+
+    def test_reads_only_appended_records(self):
+        """
+        Records appended after the first call are added to the total
+        :return:
+        """
+        self.append(make_record("lab1", 10))
+        self.assertEqual(self.totals.get("lab1"), 10)
+        self.append(make_record("lab1", 5) + make_record("lab2", 3))
+        self.assertEqual(self.totals.get("lab1"), 15)
+        self.assertEqual(self.totals.get("lab2"), 3)
+
+    def test_partial_line_is_read_later(self):
+        """
+        A line that is still being written is not counted until it is complete
+        :return:
+        """
+        line = make_record("lab1", 10)
+        self.append(line[:20])
+        self.assertEqual(self.totals.get("lab1"), 0)
+        self.append(line[20:])
+        self.assertEqual(self.totals.get("lab1"), 10)
+
+    def test_window(self):
+        """
+        Only tokens inside the budget window are counted
+        :return:
+        """
+        self.append(make_record("lab1", 100, hours_ago=3) + make_record("lab1", 7))
+        self.assertEqual(self.totals.get("lab1", window=1), 7)
+        self.assertEqual(self.totals.get("lab1"), 7)
+
+    def test_malformed_line_is_skipped(self):
+        """
+        A malformed line doesn't break the budget check
+        :return:
+        """
+        self.append("not json\n" + make_record("lab1", 4))
+        self.assertEqual(self.totals.get("lab1"), 4)
@@ -6,3 +6,5 @@ class SheetsNamingEnum(StrEnum):
     VARIANTS = "variants"
     TEMPLATE = "template"
     PROMPTS = "prompts"
+    PROMPT_REGISTRY = "prompt_registry"
+    USAGE = "usage"
@@ -0,0 +1,75 @@
+import re
+from collections import Counter
+from math import log
+
+WORD_PATTERN = re.compile(r"[^\W\d_][^\W_]*", re.UNICODE)
+CAMEL_CASE_PATTERN = re.compile(r"(?<=[a-zа-яіїєґ0-9])(?=[A-ZА-ЯІЇЄҐ])")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into lowercase terms.
+    Identifiers are kept whole and also split into their camelCase and snake_case parts,
+    so `getStudentName` matches both `getstudentname` and `student`.
+    """
+    tokens = []
+    for word in WORD_PATTERN.findall(text):
+        tokens.append(word.lower())
+        parts = CAMEL_CASE_PATTERN.split(word)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts)
+    return [token for token in tokens if len(token) > 1]
+
+
+def tokenize_file(path: str, content: str, path_weight: int = 3) -> list[str]:
+    """
+    Tokenize a file, path terms are repeated to weigh more than content terms.
+    """
+    path_terms = tokenize(re.sub(r"[/._\-]", " ", path))
+    return path_terms * path_weight + tokenize(content)
+
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 index over a small set of documents.
+    """
+
+    def __init__(self, documents: dict[str, list[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_frequencies = {name: Counter(tokens) for name, tokens in documents.items()}
+        self.lengths = {name: len(tokens) for name, tokens in documents.items()}
+        self.average_length = sum(self.lengths.values()) / len(documents) if documents else 0.0
+
+        document_frequencies: Counter = Counter()
+        for frequencies in self.term_frequencies.values():
+            document_frequencies.update(frequencies.keys())
+        count = len(documents)
+        self.idf = {
+            term: log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequencies.items()
+        }
+
+    @classmethod
+    def from_files(cls, files: dict[str, str]) -> "BM25Index":
+        return cls({path: tokenize_file(path, content) for path, content in files.items()})
+
+    def score(self, query: str) -> dict[str, float]:
+        terms = set(tokenize(query))
+        scores = {}
+        for name, frequencies in self.term_frequencies.items():
+            length_norm = self.k1 * (1 - self.b + self.b * self.lengths[name] / (self.average_length or 1))
+            score = 0.0
+            for term in terms:
+                frequency = frequencies.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + length_norm)
+            scores[name] = score
+        return scores
+
+    def rank(self, query: str) -> list[tuple[str, float]]:
+        """
+        Rank documents by relevance to the query, ties keep path order.
+        """
+        scores = self.score(query)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
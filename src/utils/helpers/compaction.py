@@ -0,0 +1,183 @@
+import re
+from pathlib import PurePosixPath
+
+from loguru import logger
+
+from utils.helpers.tokens import estimate_tokens
+
+# Tool and dependency directories and generated files, wherever they are
+GENERATED_PATH_PATTERN = re.compile(
+    r"(^|/)(\.idea|\.vscode|\.vs|\.gradle|node_modules|__pycache__)/"
+    r"|(^|/)(package-lock\.json|yarn\.lock|pnpm-lock\.yaml|poetry\.lock|\.DS_Store)$"
+    r"|(^|/)(gradlew|gradlew\.bat|mvnw|mvnw\.cmd)$"
+    r"|\.(min\.js|min\.css|iml|sln|suo|user|designer\.cs|g\.cs|g\.i\.cs)$"
+    r"|_pb2\.py$",
+    re.IGNORECASE,
+)
+# Build output at the repository root or in the layout of a known build tool.
+# Names like build/ or out/ are also used for packages, so files with source extensions are never matched.
+BUILD_OUTPUT_PATTERN = re.compile(
+    r"^(bin|obj|build|dist|target|out|cmake-build-[^/]*)/"
+    r"|(^|/)(bin|obj)/(debug|release)/"
+    r"|(^|/)target/(classes|test-classes|generated-sources)/"
+    r"|(^|/)build/(intermediates|generated|tmp)/",
+    re.IGNORECASE,
+)
+SOURCE_EXTENSIONS = frozenset("""
+    .py .c .h .cpp .cc .cxx .hpp .hh .java .cs .js .jsx .ts .tsx .mjs .go .rs .kt .kts .scala .php .rb
+    .swift .m .mm .dart .lua .r .hs .fs .pas .pl .sh .ps1 .html .css .scss .vue .svelte .sql .asm .s
+""".split())
+GENERATED_MARKER_PATTERN = re.compile(r"auto-?generated|generated by|do not edit", re.IGNORECASE)
+# Lines that hold only literal data: numbers, strings, constants and punctuation
+LITERAL_LINE_PATTERN = re.compile(
+    r"""^(?:\s|[-+]?(?:0[xX][\da-fA-F]+|\d+(?:\.\d*)?(?:[eE][-+]?\d+)?[fFlLuUdD]*)"""
+    r"""|"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|true|false|null|nullptr|None|True|False|[\[\]{}(),;:=])+$"""
+)
+# Trailing whitespace is a line break in Markdown
+KEEP_TRAILING_WHITESPACE = {".md", ".markdown"}
+
+
+class SourceCompactor:
+    """
+    Compacts source files before they are put into the prompt:
+    trailing whitespace is dropped, runs of blank lines, repeated blocks and long literal data are collapsed,
+    very long lines are cut and generated files are replaced with a one-line note.
+    Leading indentation is never changed, so indentation-sensitive languages keep their meaning.
+
+    When lines are removed every kept line is prefixed with its original number,
+    so review comments still point at the right lines.
+    """
+    LITERAL_RUN = 12
+    LITERAL_KEEP = 3
+    REPEAT_MIN = 3
+    MAX_BLOCK = 4
+    LONG_LINE = 400
+    LONG_LINE_KEEP = 160
+
+    def __init__(self):
+        self.savings: dict[str, tuple[int, int]] = {}
+
+    @property
+    def tokens_before(self) -> int:
+        return sum(before for before, _ in self.savings.values())
+
+    @property
+    def tokens_after(self) -> int:
+        return sum(after for _, after in self.savings.values())
+
+    @staticmethod
+    def get_generated_reason(path: str, lines: list[str]) -> str | None:
+        if GENERATED_PATH_PATTERN.search(path):
+            return "generated or IDE file"
+        if BUILD_OUTPUT_PATTERN.search(path) and PurePosixPath(path).suffix.lower() not in SOURCE_EXTENSIONS:
+            return "build output"
+        if any(GENERATED_MARKER_PATTERN.search(line) for line in lines[:5]):
+            return "file marked as generated"
+        return None
+
+    def __is_literal(self, line: str) -> bool:
+        return bool(LITERAL_LINE_PATTERN.match(line)) and bool(re.search(r"[\d\"']", line))
+
+    def __get_repeat(self, lines: list[str], start: int) -> tuple[int, int]:
+        """
+        Find a block of up to MAX_BLOCK lines repeated right after itself.
+        :return: Block size and number of repetitions, (1, 1) if nothing repeats
+        """
+        for size in range(1, self.MAX_BLOCK + 1):
+            block = lines[start:start + size]
+            if len(block) < size or not any(line.strip() for line in block):
+                break
+            count = 1
+            while lines[start + count * size:start + (count + 1) * size] == block:
+                count += 1
+            if count >= self.REPEAT_MIN:
+                return size, count
+        return 1, 1
+
+    def compact_lines(self, lines: list[str]) -> tuple[list[tuple[str, str]], bool]:
+        """
+        :return: (original line label, text) pairs and whether lines were removed
+        """
+        items: list[tuple[str, str]] = []
+        removed = False
+        index = 0
+        while index < len(lines):
+            line = lines[index]
+            if not line.strip():
+                end = index
+                while end < len(lines) and not lines[end].strip():
+                    end += 1
+                items.append((str(index + 1), ""))
+                removed = removed or end - index > 1
+                index = end
+                continue
+
+            if self.__is_literal(line):
+                end = index
+                while end < len(lines) and self.__is_literal(lines[end]):
+                    end += 1
+                if end - index >= self.LITERAL_RUN:
+                    keep = self.LITERAL_KEEP
+                    items.extend((str(number + 1), lines[number]) for number in range(index, index + keep))
+                    items.append((
+                        f"{index + keep + 1}-{end - 1}",
+                        f"... {end - 1 - index - keep} lines of literal data elided"
+                    ))
+                    items.append((str(end), lines[end - 1]))
+                    removed = True
+                    index = end
+                    continue
+
+            size, count = self.__get_repeat(lines, index)
+            if count > 1:
+                items.extend((str(number + 1), lines[number]) for number in range(index, index + size))
+                end = index + size * count
+                items.append((
+                    f"{index + size + 1}-{end}",
+                    f"... previous {size} line(s) repeated {count - 1} more times"
+                ))
+                removed = True
+                index = end
+                continue
+
+            if len(line) > self.LONG_LINE:
+                line = f"{line[:self.LONG_LINE_KEEP]} ... [{len(line) - self.LONG_LINE_KEEP} characters elided]"
+            items.append((str(index + 1), line))
+            index += 1
+        return items, removed
+
+    def compact(self, path: str, content: str) -> str:
+        """
+        Compact one file and record its token savings.
+        The original content is kept if compaction doesn't make it shorter.
+        """
+        keep_trailing = PurePosixPath(path).suffix.lower() in KEEP_TRAILING_WHITESPACE
+        lines = [line if keep_trailing else line.rstrip() for line in content.splitlines()]
+
+        reason = self.get_generated_reason(path, lines)
+        if reason:
+            compacted = f"[{reason}, {len(lines)} lines omitted]"
+        else:
+            items, removed = self.compact_lines(lines)
+            if removed:
+                compacted = "[compacted, lines are prefixed with their original numbers]\n" + "\n".join(
+                    f"{label}: {text}" for label, text in items
+                )
+            else:
+                compacted = "\n".join(text for _, text in items)
+        if len(compacted) >= len(content):
+            compacted = content
+
+        before, after = estimate_tokens(content), estimate_tokens(compacted)
+        self.savings[path] = (before, after)
+        if before > after:
+            logger.debug("Compacted {}: ~{} -> ~{} tokens", path, before, after)
+        return compacted
+
+    def log_summary(self) -> None:
+        saved = self.tokens_before - self.tokens_after
+        if self.tokens_before:
+            logger.info(
+                f"Source compaction saved ~{saved} of ~{self.tokens_before} tokens "
+                f"({saved / self.tokens_before:.0%}) in {len(self.savings)} files"
+            )
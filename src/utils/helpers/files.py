@@ -0,0 +1,57 @@
+from pathlib import PurePosixPath
+
+from charset_normalizer import from_bytes
+
+BINARY_EXTENSIONS = frozenset("""
+    .png .jpg .jpeg .gif .bmp .ico .webp .tiff .psd .svgz
+    .pdf .doc .docx .xls .xlsx .ppt .pptx .odt .ods
+    .zip .rar .7z .gz .tgz .bz2 .xz .tar .jar .war .apk
+    .exe .dll .so .dylib .o .obj .a .lib .class .pyc .pyo .pdb .bin .dat
+    .mp3 .mp4 .avi .mov .mkv .wav .flac .ogg .webm
+    .ttf .otf .woff .woff2 .eot .db .sqlite .mdf .ldf
+""".split())
+BINARY_SIGNATURES = (
+    b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"%PDF", b"PK\x03\x04", b"\x7fELF", b"MZ",
+    b"\xca\xfe\xba\xbe", b"\x1f\x8b", b"Rar!", b"7z\xbc\xaf",
+)
+TEXT_BOMS = (b"\xef\xbb\xbf", b"\xff\xfe", b"\xfe\xff")
+PREFIX_SIZE = 8192
+# Control characters other than \t, \n, \f, \r and ESC
+CONTROL_BYTES = bytes(set(range(32)) - {9, 10, 12, 13, 27})
+
+
+def has_binary_extension(path: str) -> bool:
+    return PurePosixPath(path).suffix.lower() in BINARY_EXTENSIONS
+
+
+def is_binary(prefix: bytes) -> bool:
+    """
+    Detect binary content from the first bytes of a file:
+    known file signatures, NUL bytes outside UTF-16 text, or too many control characters.
+    """
+    prefix = prefix[:PREFIX_SIZE]
+    if not prefix or prefix.startswith(TEXT_BOMS):
+        return False
+    if prefix.startswith(BINARY_SIGNATURES) or b"\x00" in prefix:
+        return True
+    control = len(prefix) - len(prefix.translate(None, CONTROL_BYTES))
+    return control / len(prefix) > 0.1
+
+
+def decode(data: bytes) -> tuple[str, str]:
+    """
+    Decode file content once.
+    UTF-8 is tried first, other encodings (e.g. cp1251 sources) are detected from the content.
+    :return: Decoded text and the encoding used
+    """
+    if data.startswith(b"\xef\xbb\xbf"):
+        return data[3:].decode("utf-8", errors="replace"), "utf-8-sig"
+    try:
+        return data.decode("utf-8"), "utf-8"
+    except UnicodeDecodeError:
+        pass
+
+    match = from_bytes(data).best()
+    if match is not None:
+        return str(match), match.encoding
+    return data.decode("utf-8", errors="replace"), "utf-8"
@@ -0,0 +1,129 @@
+import re
+from json import loads, JSONDecodeError
+
+CLOSERS = {"{": "}", "[": "]"}
+LITERALS = {"t": "true", "f": "false", "n": "null"}
+PARTIAL_LITERAL = re.compile(r"[:\[,]\s*(t(?:ru?)?|f(?:a(?:ls?)?)?|n(?:ul?)?)$")
+PARTIAL_NUMBER = re.compile(r"(?<=[\d\s:\[,])[.eE+-]+$")
+
+
+def strip_code_fence(text: str) -> str:
+    """
+    Remove a markdown code fence around JSON, e.g. ```json ... ```.
+    """
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text
+
+
+def close_json(text: str) -> str:
+    """
+    Fix common defects of LLM-generated JSON:
+    unescaped control characters in strings, trailing commas,
+    truncated strings, literals and numbers, and unclosed objects or arrays.
+    Anything after the top-level value is dropped.
+    """
+    out: list[str] = []
+    stack: list[str] = []
+    in_string = False
+    escape = False
+
+    def drop_trailing_comma():
+        while out and out[-1].isspace():
+            out.pop()
+        if out and out[-1] == ",":
+            out.pop()
+
+    for char in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                char = "\\n"
+            elif char == "\r":
+                char = "\\r"
+            elif char == "\t":
+                char = "\\t"
+            out.append(char)
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in CLOSERS:
+            stack.append(CLOSERS[char])
+        elif char in "}]":
+            drop_trailing_comma()
+            if stack:
+                stack.pop()
+            out.append(char)
+            if not stack:
+                break
+            continue
+        out.append(char)
+
+    if escape:
+        out.pop()
+    if in_string:
+        out.append('"')
+
+    result = "".join(out).rstrip()
+    if not in_string:
+        literal = PARTIAL_LITERAL.search(result)
+        if literal:
+            result = result[:literal.start(1)] + LITERALS[literal.group(1)[0]]
+        result = PARTIAL_NUMBER.sub("", result).rstrip()
+    if result.endswith(":"):
+        result += " null"
+    for closer in reversed(stack):
+        result = result.rstrip().rstrip(",") + closer
+    return result
+
+
+def repair_json(text: str, max_trims: int = 3) -> dict:
+    """
+    Parse a JSON object, repairing it if needed.
+    If the repaired text still doesn't parse, the last (most likely truncated) member is dropped.
+    :param text: Raw JSON text
+    :param max_trims: How many trailing members may be dropped
+    :return: Parsed object
+    :raises ValueError: If the text can't be repaired
+    """
+    try:
+        result = loads(text)
+        if isinstance(result, dict):
+            return result
+    except JSONDecodeError:
+        pass
+
+    candidate = strip_code_fence(text)
+    start = candidate.find("{")
+    if start == -1:
+        raise ValueError("No JSON object found")
+    candidate = candidate[start:]
+
+    for _ in range(max_trims + 1):
+        try:
+            result = loads(close_json(candidate))
+            if isinstance(result, dict):
+                return result
+        except JSONDecodeError:
+            pass
+
+        comma = candidate.rfind(",")
+        if comma != -1:
+            candidate = candidate[:comma]
+            continue
+        # The only member of the innermost object is truncated, keep the object empty
+        opening = candidate.rfind("{")
+        if opening == -1 or not candidate[opening + 1:].strip():
+            break
+        candidate = candidate[:opening + 1]
+
+    raise ValueError("Couldn't repair JSON")
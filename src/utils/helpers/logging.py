@@ -0,0 +1,135 @@
+import os
+import sys
+from collections import Counter
+from threading import Lock
+from time import perf_counter
+from typing import TYPE_CHECKING
+from uuid import uuid4
+
+from loguru import logger
+
+from configs.logging import LoggingConfig
+
+if TYPE_CHECKING:
+    # Only defined in the loguru type stubs
+    from loguru import Record
+
+TEXT_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan>"
+)
+
+
+class RecordFilter:
+    """
+    Counts written records and, in bulk runs, keeps only every N-th debug record of each call site.
+    """
+
+    def __init__(self, debug_sample: int = 1):
+        self.debug_sample = max(1, debug_sample)
+        self.written: Counter[str] = Counter()
+        self.sampled_out = 0
+        self.__calls: Counter[tuple[str | None, int]] = Counter()
+        self.__lock = Lock()
+
+    def __call__(self, record: "Record") -> bool:
+        if record["extra"].get("benchmark"):
+            return False
+        with self.__lock:
+            if record["level"].name == "DEBUG" and self.debug_sample > 1:
+                call_site = (record["name"], record["line"])
+                self.__calls[call_site] += 1
+                if (self.__calls[call_site] - 1) % self.debug_sample:
+                    self.sampled_out += 1
+                    return False
+            self.written[record["level"].name] += 1
+        return True
+
+
+def format_text(record: "Record") -> str:
+    fields = " ".join(f"{{extra[{field}]}}" for field in ("repo", "stage") if record["extra"].get(field))
+    context = f" | <magenta>{fields}</magenta>" if fields else ""
+    return f"{TEXT_FORMAT}{context} - <level>{{message}}</level>\n{{exception}}"
+
+
+_record_filter = RecordFilter()
+
+
+def setup_logging(run_id: str | None = None, bulk: bool = False) -> str:
+    """
+    Replace the default stderr sink.
+    Records below LOG_LEVEL are dropped before their message is formatted, use `logger.opt(lazy=True)`
+    or format arguments instead of f-strings for expensive messages.
+    Sinks write from a background thread, so a logging call only puts the record on a queue.
+    :param run_id: Identifier of the run added to every record, GITHUB_RUN_ID or a random one if None
+    :param bulk: Sample high-volume debug records
+    :return: The run identifier
+    """
+    global _record_filter
+    config = LoggingConfig()
+    run_id = run_id or os.environ.get("GITHUB_RUN_ID") or uuid4().hex[:8]
+    _record_filter = RecordFilter(config.BULK_DEBUG_SAMPLE if bulk else 1)
+
+    logger.remove()
+    logger.configure(extra={"run": run_id, "repo": "", "stage": ""})
+    logger.add(
+        sys.stderr,
+        level=config.LEVEL,
+        format=format_text,
+        serialize=config.FORMAT == "json",
+        enqueue=config.ENQUEUE,
+        filter=_record_filter,
+    )
+    if config.FILE:
+        config.FILE.parent.mkdir(parents=True, exist_ok=True)
+        logger.add(
+            config.FILE,
+            level=config.LEVEL,
+            serialize=True,
+            enqueue=config.ENQUEUE,
+            filter=_record_filter,
+        )
+    return run_id
+
+
+def log_summary() -> None:
+    written = sum(_record_filter.written.values())
+    logger.info(
+        f"Logging: {written} records written {dict(_record_filter.written)}, "
+        f"{_record_filter.sampled_out} debug records sampled out"
+    )
+
+
+def measure_overhead(iterations: int = 100000) -> dict[str, float]:
+    """
+    Measure the time a logging call takes in the calling thread with the current sinks.
+    Enabled records are marked as a benchmark and dropped by the filter, so nothing is written.
+    :return: Nanoseconds per call of an empty loop, a disabled debug call with a lazy argument
+        and an enabled call
+    """
+    def expensive() -> str:
+        return "x" * 10000
+
+    timings = {}
+    started = perf_counter()
+    for _ in range(iterations):
+        pass
+    timings["baseline"] = perf_counter() - started
+
+    started = perf_counter()
+    for _ in range(iterations):
+        logger.opt(lazy=True).trace("{}", expensive)
+    timings["disabled"] = perf_counter() - started
+
+    benchmark_logger = logger.bind(benchmark=True)
+    started = perf_counter()
+    for index in range(iterations):
+        benchmark_logger.critical("Benchmark record {}", index)
+    timings["enabled"] = perf_counter() - started
+
+    result = {name: timing / iterations * 1e9 for name, timing in timings.items()}
+    logger.info(
+        f"Logging overhead per call: disabled {result['disabled'] - result['baseline']:.0f} ns, "
+        f"enabled {result['enabled'] - result['baseline']:.0f} ns"
+    )
+    return result
@@ -0,0 +1,264 @@
+"""
+This module contains tests for the helpers
+"""
+
+import threading
+import unittest
+
+from utils.helpers.bm25 import BM25Index, tokenize
+from utils.helpers.compaction import SourceCompactor
+from utils.helpers.json_repair import repair_json
+from utils.helpers.stages import StageGraph
+
+
+class RepairJsonTest(unittest.TestCase):
+    """
+    Testing repair of truncated and malformed LLM JSON
+    """
+
+    def test_valid_json(self):
+        """
+        Valid JSON is parsed as is
+        :return:
+        """
+        self.assertEqual(repair_json('{"a": 1}'), {"a": 1})
+
+    def test_code_fence_and_trailing_text(self):
+        """
+        A markdown fence and text after the object are dropped
+        :return:
+        """
+        self.assertEqual(repair_json('```json\n{"a": [1, 2,]}\n```'), {"a": [1, 2]})
+        self.assertEqual(repair_json('Here it is: {"a": 1} hope it helps'), {"a": 1})
+
+    def test_truncated_string(self):
+        """
+        A truncated string is closed
+        :return:
+        """
+        self.assertEqual(repair_json('{"a": "line\nnext'), {"a": "line\nnext"})
+
+    def test_truncated_literal(self):
+        """
+        A member truncated inside true, false or null is completed
+        :return:
+        """
+        self.assertEqual(repair_json('{"a": tru'), {"a": True})
+        self.assertEqual(repair_json('{"a": 1, "b": fals'), {"a": 1, "b": False})
+        self.assertEqual(repair_json('{"a": [null, n'), {"a": [None, None]})
+        self.assertEqual(repair_json('{"a": "tru'), {"a": "tru"})
+
+    def test_truncated_number(self):
+        """
+        A number truncated after its sign, point or exponent is cut back to a valid number
+        :return:
+        """
+        self.assertEqual(repair_json('{"a": 1.'), {"a": 1})
+        self.assertEqual(repair_json('{"a": 2e'), {"a": 2})
+        self.assertEqual(repair_json('{"a": -'), {"a": None})
+
+    def test_truncated_key(self):
+        """
+        A member truncated in its key is dropped
+        :return:
+        """
+        self.assertEqual(repair_json('{"a": 1, "b'), {"a": 1})
+        self.assertEqual(repair_json('{"a": {"b"'), {"a": {}})
+
+    def test_no_object(self):
+        """
+        Text without an object can't be repaired
+        :return:
+        """
+        with self.assertRaises(ValueError):
+            repair_json("no json here")
+
+
+class SourceCompactorTest(unittest.TestCase):
+    """
+    Testing compaction of source files before they are put into the prompt
+    """
+
+    def setUp(self):
+        """
+        Setup the compactor
+        :return:
+        """
+        self.compactor = SourceCompactor()
+
+    def test_sources_in_build_like_packages_are_kept(self):
+        """
+        Packages named like build directories are not generated files
+        :return:
+        """
+        for path in ("src/build/Main.java", "com/example/out/Util.java", "build/Main.java", "app/bin/run.py"):
+            self.assertIsNone(SourceCompactor.get_generated_reason(path, []), path)
+
+    def test_build_output_is_omitted(self):
+        """
+        Non-source files in build output directories are omitted
+        :return:
+        """
+        for path in ("build/reports/index.txt", "App/bin/Debug/app.deps.json", "lib/target/classes/app.properties"):
+            self.assertIsNotNone(SourceCompactor.get_generated_reason(path, []), path)
+        self.assertIsNone(SourceCompactor.get_generated_reason("com/example/out/data.json", []))
+
+    def test_generated_files_are_omitted(self):
+        """
+        IDE files, dependencies and files marked as generated are replaced with a note
+        :return:
+        """
+        self.assertIsNotNone(SourceCompactor.get_generated_reason(".idea/workspace.xml", []))
+        self.assertIsNotNone(SourceCompactor.get_generated_reason("node_modules/x/index.js", []))
+        self.assertIsNotNone(SourceCompactor.get_generated_reason("Form.java", ["// Generated by the GUI designer"]))
+        content = "// <auto-generated/>\n" + "int x = 1;\n" * 50
+        self.assertTrue(self.compactor.compact("Form.cs", content).startswith("[file marked as generated"))
+
+    def test_literal_data_keeps_line_numbers(self):
+        """
+        Long literal data is elided and the kept lines are prefixed with their original numbers
+        :return:
+        """
+        content = "data = [\n" + "".join(f"    {index},\n" for index in range(40)) + "]\nprint(data)\n"
+        compacted = self.compactor.compact("main.py", content)
+        self.assertIn("lines of literal data elided", compacted)
+        self.assertIn("43: print(data)", compacted)
+
+    def test_indentation_is_kept(self):
+        """
+        Leading indentation is never changed
+        :return:
+        """
+        content = "def main():\n    if True:\n        print(1)          \n\nmain()\n"
+        compacted = self.compactor.compact("main.py", content)
+        self.assertIn("        print(1)", compacted)
+        self.assertNotIn("print(1)   ", compacted)
+
+    def test_short_file_is_not_made_longer(self):
+        """
+        A file that compaction can't shorten is sent as is
+        :return:
+        """
+        self.assertEqual(self.compactor.compact("build/a.txt", "x"), "x")
+
+
+class BM25IndexTest(unittest.TestCase):
+    """
+    Testing BM25 ranking of prompt files
+    """
+
+    def test_tokenize_identifiers(self):
+        """
+        camelCase identifiers are kept whole and split, snake_case ones are split,
+        digits and one-letter terms are dropped
+        :return:
+        """
+        tokens = tokenize("getStudentName x 42 student_list")
+        self.assertIn("getstudentname", tokens)
+        self.assertIn("student", tokens)
+        self.assertIn("list", tokens)
+        self.assertNotIn("x", tokens)
+        self.assertNotIn("42", tokens)
+
+    def test_relevant_file_ranks_first(self):
+        """
+        The file sharing terms with the query ranks above unrelated ones
+        :return:
+        """
+        index = BM25Index.from_files({
+            "src/utils.py": "def helper():\n    return 1\n",
+            "src/matrix.py": "def transpose(matrix):\n    return list(zip(*matrix))\n",
+        })
+        ranking = index.rank("Transpose the matrix")
+        self.assertEqual(ranking[0][0], "src/matrix.py")
+        self.assertGreater(ranking[0][1], 0)
+        self.assertEqual(ranking[1][1], 0)
+
+    def test_path_terms_count(self):
+        """
+        A query term only found in the path still ranks the file
+        :return:
+        """
+        index = BM25Index.from_files({"a/graph.py": "x = 1\n", "a/other.py": "y = 2\n"})
+        self.assertEqual(index.rank("graph")[0][0], "a/graph.py")
+
+    def test_ties_keep_path_order(self):
+        """
+        Documents with equal scores are ordered by path
+        :return:
+        """
+        index = BM25Index.from_files({"b.py": "print(1)", "a.py": "print(2)"})
+        self.assertEqual([name for name, _ in index.rank("unrelated")], ["a.py", "b.py"])
+
+    def test_empty_index(self):
+        """
+        An index without documents ranks nothing
+        :return:
+        """
+        self.assertEqual(BM25Index.from_files({}).rank("matrix"), [])
+
+
+class StageGraphTest(unittest.TestCase):
+    """
+    Testing concurrent pipeline stages
+    """
+
+    def test_dependencies(self):
+        """
+        A stage gets the results of its dependencies and the inputs
+        :return:
+        """
+        stages = StageGraph()
+        stages.add("sum", lambda a, b: a + b, "a", "b")
+        stages.add("a", lambda base: base + 1, "base")
+        stages.add("b", lambda: 10)
+        results = stages.run({"base": 1})
+        self.assertEqual(results, {"base": 1, "a": 2, "b": 10, "sum": 12})
+        self.assertEqual(set(stages.timings), {"a", "b", "sum"})
+
+    def test_independent_stages_run_concurrently(self):
+        """
+        Stages without dependencies between them run at the same time
+        :return:
+        """
+        barrier = threading.Barrier(2, timeout=5)
+        stages = StageGraph()
+        stages.add("first", barrier.wait)
+        stages.add("second", barrier.wait)
+        results = stages.run()
+        self.assertEqual(set(results), {"first", "second"})
+
+    def test_failure_is_raised(self):
+        """
+        A failed stage raises its exception and its dependents don't run
+        :return:
+        """
+        called = []
+
+        def fail():
+            raise RuntimeError("boom")
+
+        stages = StageGraph()
+        stages.add("fail", fail)
+        stages.add("after", lambda _: called.append(True), "fail")
+        with self.assertRaisesRegex(RuntimeError, "boom"):
+            stages.run()
+        self.assertEqual(called, [])
+
+    def test_unresolved_dependency(self):
+        """
+        A dependency that is neither a stage nor an input is an error
+        :return:
+        """
+        stages = StageGraph().add("stage", lambda missing: missing, "missing")
+        with self.assertRaisesRegex(ValueError, "unresolved"):
+            stages.run()
+
+    def test_duplicate_stage(self):
+        """
+        A stage can't be defined twice
+        :return:
+        """
+        stages = StageGraph().add("stage", lambda: 1)
+        with self.assertRaises(ValueError):
+            stages.add("stage", lambda: 2)
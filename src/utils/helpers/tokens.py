@@ -0,0 +1,5 @@
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count of a text: ~4 characters per token.
+    """
+    return len(text) // 4